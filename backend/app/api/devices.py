@@ -1,5 +1,5 @@
 # Device API endpoints for FortiGate Network Monitor Pro
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from typing import List, Optional
 from datetime import datetime
 import logging
@@ -10,20 +10,74 @@ from models.device import (
 )
 from core.device_intelligence import DeviceIntelligenceEngine
 from main import get_intelligence_engine
+from utils.fast_json import (
+    FAST_JSON_ENABLED, SerializedEntry, dumps, entry_response, etag_matches, not_modified, version_etag
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 @router.get("/", response_model=DeviceResponse)
 async def get_all_devices(
+    request: Request,
     skip: int = Query(0, ge=0, description="Number of devices to skip"),
     limit: int = Query(100, ge=1, le=1000, description="Maximum number of devices to return"),
     device_type: Optional[DeviceType] = Query(None, description="Filter by device type"),
     status: Optional[DeviceStatus] = Query(None, description="Filter by device status"),
+    encoding: Optional[str] = Query(
+        None, pattern="^dictionary$", description="'dictionary': categorical fields as codes plus lookup tables"
+    ),
     intelligence_engine: DeviceIntelligenceEngine = Depends(get_intelligence_engine)
 ):
     """Get all devices with optional filtering and pagination"""
     try:
+        if encoding:
+            # Dictionary-encoded rows: {"dictionaries": {...}, "devices": [...]} (not a DeviceResponse)
+            etag = version_etag(
+                "devices", intelligence_engine.store_version, skip, limit,
+                device_type.value if device_type else "", status.value if status else "", encoding
+            )
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+            devices = await intelligence_engine.get_all_devices(
+                skip=skip, limit=limit, device_type=device_type, status=status
+            )
+            encoded = intelligence_engine.encode_devices(devices)
+            payload = {
+                "success": True,
+                "message": f"Retrieved {len(devices)} devices",
+                "encoding": encoded["encoding"],
+                "dictionaries": encoded["dictionaries"],
+                "devices": encoded["rows"],
+                "count": len(devices),
+            }
+            return entry_response(request, SerializedEntry(dumps(payload), etag=etag))
+
+        if FAST_JSON_ENABLED:
+            # Fast path: ETag from the store version, so an unchanged store returns 304
+            # without querying or serializing; otherwise Pydantic's native JSON dump
+            # bypasses FastAPI's response_model re-validation and jsonable_encoder.
+            etag = version_etag(
+                "devices", intelligence_engine.store_version, skip, limit,
+                device_type.value if device_type else "", status.value if status else ""
+            )
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+            devices = await intelligence_engine.get_all_devices(
+                skip=skip, limit=limit, device_type=device_type, status=status
+            )
+            response = DeviceResponse(
+                success=True,
+                message=f"Retrieved {len(devices)} devices",
+                devices=devices,
+                count=len(devices)
+            )
+            return entry_response(
+                request, SerializedEntry(response.model_dump_json().encode("utf-8"), etag=etag)
+            )
+
         devices = await intelligence_engine.get_all_devices(
             skip=skip, 
             limit=limit,
@@ -1,6 +1,32 @@
-from fastapi import APIRouter, HTTPException
-from app.services.fortigate_service import get_interfaces
-from app.services.fortiswitch_service import get_fortiswitches
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+import asyncio
+import time
+from typing import Any, Dict, Optional
+from app.services.fortiswitch_service import switch_dicts, wan_ips_from_interfaces
+from app.services.connection_metrics import get_connection_metrics
+from app.services.fortigate_delta import get_delta_poller
+from app.services.fortiswitch_client import get_fortiswitch_poller
+from app.services.http_clients import get_http_clients
+from app.services.interface_poller import get_interface_poller
+from app.services.interface_snapshot import get_interface_snapshot
+from app.services.metrics_store import get_metrics_store
+from app.services.switch_snapshot import (
+    get_switch_snapshot,
+    is_snapshot_stale,
+    InvalidCursorError,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    PORT_CATEGORICAL,
+    DEVICE_CATEGORICAL,
+    CONTEXT_CATEGORICAL,
+)
+from app.utils.fast_json import (
+    FAST_JSON_ENABLED,
+    cached_json_response,
+    cached_json_response_async,
+    snapshot_headers,
+)
 import logging
 
 # Configure logging
@@ -10,22 +36,268 @@ router = APIRouter()
 
 
 @router.get("/fortigate/api/interfaces")
-async def get_fortigate_interfaces():
+async def get_fortigate_interfaces(
+    request: Request,
+    fresh: bool = Query(False, description="Refresh from the FortiGate instead of serving the cached snapshot"),
+):
+    """Interface table from the cached snapshot (async client); Cache-Age / X-Snapshot-Version tell its age."""
     try:
         logger.debug("API endpoint /fortigate/api/interfaces called")
-        interfaces = get_interfaces()
-        return interfaces
+        snapshot = await get_interface_snapshot(fresh=fresh)
+        headers = snapshot_headers(snapshot.version, snapshot.created_at)
+        if FAST_JSON_ENABLED:
+            return cached_json_response(request, snapshot.etag(), snapshot.serialized, headers)
+        return JSONResponse(content=snapshot.interfaces, headers=headers)
     except Exception as e:
         logger.error(f"Error in /fortigate/api/interfaces endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _switches_payload(snapshot, interfaces) -> Dict[str, Any]:
+    """The /fortigate/api/switches body: {"switches": [...], "wan_ips": [...]}."""
+    return {"switches": switch_dicts(snapshot), "wan_ips": wan_ips_from_interfaces(interfaces.interfaces)}
+
+
 @router.get("/fortigate/api/switches")
-async def get_fortigate_switches():
+async def get_fortigate_switches(
+    request: Request,
+    encoding: Optional[str] = Query(
+        None, pattern="^dictionary$", description="'dictionary': categorical fields as codes plus lookup tables"
+    ),
+    fresh: bool = Query(False, description="Rebuild the switch snapshot instead of serving the cached one"),
+):
+    """Switch tree from the cached snapshot; Cache-Age / X-Snapshot-Version tell its age."""
     try:
         logger.debug("API endpoint /fortigate/api/switches called")
-        switches = get_fortiswitches()
-        return switches
+        snapshot = await get_switch_snapshot(fresh=fresh)
+        headers = snapshot_headers(snapshot.version, snapshot.created_at, stale=is_snapshot_stale())
+        if encoding:
+            # Dictionary-encoded tree, serialized once per snapshot like the plain one
+            return await cached_json_response_async(
+                request,
+                snapshot.etag("tree:dictionary"),
+                lambda: snapshot.serialized_async("tree:dictionary", snapshot.encoded_tree),
+                headers,
+            )
+        interfaces = await get_interface_snapshot()
+        if FAST_JSON_ENABLED:
+            # Fast path: the same payload, serialized once per (switch, interface) snapshot pair, 304 if unchanged
+            key = f"tree:interfaces-{interfaces.version}"
+            return await cached_json_response_async(
+                request,
+                snapshot.etag(key),
+                lambda: snapshot.serialized_async(key, lambda: _switches_payload(snapshot, interfaces)),
+                headers,
+            )
+        payload = await asyncio.to_thread(_switches_payload, snapshot, interfaces)
+        return JSONResponse(content=payload, headers=headers)
     except Exception as e:
         logger.error(f"Error in /fortigate/api/switches endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# --- Paginated snapshot endpoints (served from the indexed, cached switch snapshot) ---
+
+
+def _page_or_400(snapshot, positions, row_builder, cursor, limit, categorical=None):
+    try:
+        return snapshot.paginate(positions, row_builder, cursor=cursor, limit=limit, categorical=categorical)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/fortigate/api/snapshot/switches")
+async def list_snapshot_switches(
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum switches per page"),
+    serial: Optional[str] = Query(None, description="Filter by switch serial"),
+    search: Optional[str] = Query(None, description="Case-insensitive text search"),
+):
+    """Switch summaries (without ports) with cursor pagination."""
+    try:
+        snapshot = await get_switch_snapshot()
+        positions = snapshot.filter_switches(serial=serial, search=search)
+        return _page_or_400(snapshot, positions, snapshot.switch_row, cursor, limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in /fortigate/api/snapshot/switches endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/fortigate/api/snapshot/ports")
+async def list_snapshot_ports(
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum ports per page"),
+    switch_serial: Optional[str] = Query(None, description="Filter by switch serial"),
+    vlan: Optional[str] = Query(None, description="Filter by port VLAN"),
+    status: Optional[str] = Query(None, description="Filter by port status (up/down)"),
+    search: Optional[str] = Query(None, description="Case-insensitive text search"),
+    encoding: Optional[str] = Query(
+        None, pattern="^dictionary$", description="'dictionary': categorical fields as codes plus lookup tables"
+    ),
+):
+    """Ports (without connected devices) with cursor pagination and filters."""
+    try:
+        snapshot = await get_switch_snapshot()
+        positions = snapshot.filter_ports(
+            switch_serial=switch_serial, vlan=vlan, status=status, search=search
+        )
+        categorical = PORT_CATEGORICAL + CONTEXT_CATEGORICAL if encoding else None
+        return _page_or_400(snapshot, positions, snapshot.port_row, cursor, limit, categorical)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in /fortigate/api/snapshot/ports endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/fortigate/api/snapshot/devices")
+async def list_snapshot_devices(
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum devices per page"),
+    switch_serial: Optional[str] = Query(None, description="Filter by switch serial"),
+    vlan: Optional[str] = Query(None, description="Filter by device VLAN"),
+    manufacturer: Optional[str] = Query(None, description="Filter by manufacturer"),
+    port_status: Optional[str] = Query(None, description="Filter by status of the attached port"),
+    search: Optional[str] = Query(None, description="Case-insensitive text search (MAC, IP, name, manufacturer)"),
+    encoding: Optional[str] = Query(
+        None, pattern="^dictionary$", description="'dictionary': categorical fields as codes plus lookup tables"
+    ),
+):
+    """Connected devices, flattened with switch/port context, with cursor pagination and filters."""
+    try:
+        snapshot = await get_switch_snapshot()
+        positions = snapshot.filter_devices(
+            switch_serial=switch_serial,
+            vlan=vlan,
+            manufacturer=manufacturer,
+            port_status=port_status,
+            search=search,
+        )
+        categorical = DEVICE_CATEGORICAL + CONTEXT_CATEGORICAL if encoding else None
+        return _page_or_400(snapshot, positions, snapshot.device_row, cursor, limit, categorical)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in /fortigate/api/snapshot/devices endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/fortigate/api/switches/{serial}/ports")
+async def get_switch_ports(
+    serial: str,
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum ports per page"),
+    status: Optional[str] = Query(None, description="Filter by port status (up/down)"),
+):
+    """Ports of a single switch without pulling the whole switch tree."""
+    try:
+        snapshot = await get_switch_snapshot()
+        if snapshot.switch_by_serial.get(serial.strip().lower()) is None:
+            raise HTTPException(status_code=404, detail=f"Switch {serial} not found")
+        positions = snapshot.filter_ports(switch_serial=serial, status=status)
+        return _page_or_400(snapshot, positions, snapshot.port_row, cursor, limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in /fortigate/api/switches/{serial}/ports endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --- Interface history (served from the background poller's ring buffers) ---
+
+
+@router.get("/fortigate/api/interfaces/history")
+async def get_interface_history(
+    name: str = Query(..., description="Interface name, e.g. wan1"),
+    minutes: float = Query(15, gt=0, le=1440, description="How far back to look"),
+    smooth: int = Query(1, ge=1, le=120, description="Moving-average window in samples"),
+):
+    """Throughput, packet and error rates for one interface over the last N minutes."""
+    poller = get_interface_poller()
+    history = poller.query(name, minutes=minutes, smooth=smooth)
+    if history is None:
+        raise HTTPException(status_code=404, detail=f"No history for interface {name}")
+    return history
+
+
+@router.get("/fortigate/api/interfaces/rates")
+async def get_interface_rates():
+    """Latest per-second rates for every polled interface."""
+    poller = get_interface_poller()
+    return {"poller": poller.status(), "interfaces": poller.current_rates()}
+
+
+# --- Long-range metrics (embedded time-series store) ---
+
+
+@router.get("/fortigate/api/metrics/series")
+async def list_metric_series(prefix: str = Query("", description="e.g. interface. or port.<serial>.")):
+    """Series with persisted rollups."""
+    store = get_metrics_store()
+    series = await asyncio.to_thread(store.list_series, "1h", prefix)
+    return {"series": series, "count": len(series), "store": store.status()}
+
+
+@router.get("/fortigate/api/metrics/history")
+async def get_metric_history(
+    series: str = Query(..., description="Series name, e.g. interface.wan1 or port.<serial>.port1"),
+    hours: float = Query(24, gt=0, le=24 * 400, description="How far back to look"),
+    resolution: str = Query("auto", pattern="^(auto|raw|1m|5m|1h)$"),
+):
+    """Rates for one series; resolution is picked from the range unless given."""
+    store = get_metrics_store()
+    end = time.time()
+    result = await asyncio.to_thread(store.query, series, end - hours * 3600, end, resolution)
+    if not result["rows"]:
+        raise HTTPException(status_code=404, detail=f"No data for series {series}")
+    return result
+
+
+@router.get("/fortigate/api/metrics/capacity")
+async def get_capacity_report(
+    prefix: str = Query("", description="Series prefix to include"),
+    days: int = Query(90, ge=1, le=400),
+):
+    """Peak, average and p95 throughput per series from hourly rollups."""
+    store = get_metrics_store()
+    report = await asyncio.to_thread(store.capacity_report, prefix, days)
+    return {"days": days, "series": report}
+
+
+# --- Outbound connection diagnostics ---
+
+
+@router.get("/fortigate/api/connections")
+async def get_connection_stats():
+    """Per-host connections opened/reused, TLS resumption, handshake time and TTFB."""
+    return {
+        "metrics": get_connection_metrics().snapshot(),
+        "pools": get_http_clients().status(),
+    }
+
+
+# --- Direct FortiSwitch polling (per-port counters, PoE, transceiver DOM, LLDP) ---
+
+
+@router.get("/fortigate/api/switches/{serial}/detail")
+async def get_switch_detail(serial: str):
+    """Latest direct-poll results for one switch, grouped by port."""
+    poller = get_fortiswitch_poller()
+    detail = poller.switch_detail(serial)
+    if detail is None:
+        raise HTTPException(status_code=404, detail=f"No direct poll data for switch {serial}")
+    return detail
+
+
+@router.get("/fortigate/api/fortiswitch-poller")
+async def get_fortiswitch_poller_status():
+    """Direct FortiSwitch poller state."""
+    return get_fortiswitch_poller().status()
+
+
+@router.get("/fortigate/api/delta-poller")
+async def get_delta_poller_status():
+    """Pages and rows changed per monitor table in the last delta poll."""
+    return get_delta_poller().status()
@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.services.startup import get_startup_state
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.get("/health/live")
+async def liveness():
+    """Liveness probe: the event loop is serving requests. Never touches the FortiGate."""
+    return {"status": "alive", "uptime_seconds": get_startup_state().status()["uptime_seconds"]}
+
+
+@router.get("/health/ready")
+async def readiness():
+    """Readiness probe: 200 once startup finished (503 while starting or shutting down)."""
+    state = get_startup_state()
+    status = state.status()
+    if not state.is_ready():
+        return JSONResponse(status_code=503, content=status)
+    return status
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import PlainTextResponse, Response
+from app.services.metrics_exporter import get_metrics_exporter
+from app.utils.telemetry import get_telemetry
+import asyncio
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Switch, port, interface, cache and latency metrics in Prometheus text format.
+    Rendered from cached data only; scraping never calls the FortiGate.
+    """
+    # Sections are rebuilt off the event loop when the snapshot or poll data changed
+    body = await asyncio.to_thread(get_metrics_exporter().render)
+    return Response(body, media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@router.get("/api/metrics/status")
+async def metrics_exporter_status():
+    """Cached exporter sections and cache hit ratios."""
+    return {"exporter": get_metrics_exporter().status(), "caches": get_telemetry().cache_stats()}
+
+
+@router.get("/api/traces")
+async def recent_traces(
+    pipeline: str = Query(None, description="Only traces of this pipeline, e.g. fortiswitches"),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """Most recent span trees (newest first) with per-phase durations."""
+    traces = [t for t in reversed(get_telemetry().traces) if pipeline is None or t["pipeline"] == pipeline]
+    return {"traces": traces[:limit]}
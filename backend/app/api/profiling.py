@@ -0,0 +1,70 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from app.utils.profiler import get_loop_watchdog, get_profiler, render_collapsed
+import asyncio
+import hmac
+import logging
+import os
+import threading
+
+router = APIRouter(prefix="/api/admin")
+logger = logging.getLogger(__name__)
+
+
+def require_admin(
+    x_admin_token: Optional[str] = Header(None),
+    authorization: Optional[str] = Header(None),
+):
+    """Admin endpoints need ADMIN_TOKEN in X-Admin-Token or as a Bearer token; disabled when unset."""
+    expected = os.environ.get("ADMIN_TOKEN", "")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    supplied = x_admin_token
+    if supplied is None and authorization and authorization.lower().startswith("bearer "):
+        supplied = authorization[7:].strip()
+    if not supplied or not hmac.compare_digest(supplied.encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@router.get("/profile", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def run_profile(
+    seconds: float = Query(10, ge=0.1, le=60, description="How long to sample"),
+    interval_ms: float = Query(10, ge=1, le=1000, description="Sampling interval"),
+    threads: str = Query("all", pattern="^(all|loop)$", description="'loop' samples only the event loop thread"),
+):
+    """
+    Sample every thread's stack for the given time and return collapsed stacks
+    (one "frame;frame;frame count" line per stack) for flamegraph.pl or speedscope.
+    """
+    profiler = get_profiler()
+    if profiler.busy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    thread_ids = None
+    if threads == "loop":
+        # Handlers run on the event loop thread
+        thread_ids = [threading.get_ident()]
+    try:
+        result = await asyncio.to_thread(profiler.profile, seconds, interval_ms / 1000, thread_ids)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        render_collapsed(result["collapsed"]),
+        headers={
+            "X-Profile-Samples": str(result["samples"]),
+            "X-Profile-Duration": str(result["duration"]),
+        },
+    )
+
+
+@router.get("/loop", dependencies=[Depends(require_admin)])
+async def loop_status(limit: int = Query(20, ge=1, le=100)):
+    """Event loop lag percentiles and the most recent stalls with the stack that blocked the loop."""
+    watchdog = get_loop_watchdog()
+    return {**watchdog.status(), "recent_stalls": watchdog.slow_callbacks(limit)}
+
+
+@router.get("/loop/flamegraph", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def loop_stall_flamegraph():
+    """Collapsed stacks of recorded loop stalls, weighted by blocked milliseconds."""
+    return PlainTextResponse(render_collapsed(get_loop_watchdog().stall_flamegraph()))
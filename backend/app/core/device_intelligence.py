@@ -15,9 +15,16 @@ from core.oui_database import OUIDatabase
 from core.advanced_detection import AdvancedDetection
 from services.power_automate_service import PowerAutomateService
 from config import settings
+from utils.categorical import CategoryTable, encode_rows
 
 logger = logging.getLogger(__name__)
 
+# Device fields with few distinct values; stored once per value and sent as codes with encoding=dictionary
+CATEGORICAL_FIELDS = (
+    "device_type", "status", "manufacturer", "model", "hardware_version",
+    "firmware_version", "software_version",
+)
+
 class DeviceIntelligenceEngine:
     """
     Core intelligence engine for device discovery, classification, and monitoring
@@ -32,6 +39,10 @@ class DeviceIntelligenceEngine:
         self.power_automate = PowerAutomateService()
         self.is_initialized = False
         self._running_scans: Dict[str, asyncio.Task] = {}
+        # Bumped on every device mutation; used for response ETags
+        self.store_version = 0
+        # Lookup tables for the categorical device fields (one instance per distinct value)
+        self.categories = CategoryTable()
         
     async def initialize(self) -> None:
         """Initialize the intelligence engine and its components"""
@@ -58,6 +69,27 @@ class DeviceIntelligenceEngine:
             logger.error(f"Failed to initialize Device Intelligence Engine: {str(e)}")
             raise
     
+    def mark_changed(self) -> None:
+        """Record that the device store changed (invalidates cached responses)"""
+        self.store_version += 1
+    
+    def _intern_categories(self, device: Device) -> None:
+        """Point the categorical fields of a stored device at the shared values"""
+        categories = self.categories
+        for field in CATEGORICAL_FIELDS:
+            value = getattr(device, field)
+            if value is not None:
+                setattr(device, field, categories.intern(field, value))
+        if device.operating_system:
+            device.operating_system.name = categories.intern("os_name", device.operating_system.name)
+            device.operating_system.family = categories.intern("os_family", device.operating_system.family)
+        device.services = [categories.intern("services", service) for service in device.services]
+        device.protocols = [categories.intern("protocols", protocol) for protocol in device.protocols]
+    
+    def encode_devices(self, devices: List[Device]) -> Dict[str, Any]:
+        """Devices as JSON rows with CATEGORICAL_FIELDS replaced by codes plus lookup tables"""
+        return encode_rows((device.model_dump(mode="json") for device in devices), CATEGORICAL_FIELDS)
+    
     def is_ready(self) -> bool:
         """Check if the engine is ready for operations"""
         return self.is_initialized
@@ -133,7 +165,9 @@ class DeviceIntelligenceEngine:
                 device.device_type = await self._classify_device_by_manufacturer(manufacturer)
         
         # Store device
+        self._intern_categories(device)
         self.devices[device_id] = device
+        self.mark_changed()
         
         logger.info(f"Created new device: {device_id} ({device_data.primary_ip})")
         
@@ -156,6 +190,8 @@ class DeviceIntelligenceEngine:
                 setattr(device, field, value)
         
         device.last_updated = datetime.utcnow()
+        self._intern_categories(device)
+        self.mark_changed()
         
         logger.info(f"Updated device: {device_id}")
         return device
@@ -164,6 +200,7 @@ class DeviceIntelligenceEngine:
         """Delete a device"""
         if device_id in self.devices:
             del self.devices[device_id]
+            self.mark_changed()
             logger.info(f"Deleted device: {device_id}")
             return True
         return False
@@ -206,6 +243,8 @@ class DeviceIntelligenceEngine:
             device.last_security_scan = datetime.utcnow()
             device.scan_count += 1
             device.last_updated = datetime.utcnow()
+            self._intern_categories(device)
+            self.mark_changed()
             
             logger.info(f"Scanned device: {device_id} - Found {len(device.open_ports)} open ports, {len(vulnerabilities)} vulnerabilities")
             
@@ -218,6 +257,7 @@ class DeviceIntelligenceEngine:
         except Exception as e:
             logger.error(f"Error scanning device {device_id}: {str(e)}")
             device.status = DeviceStatus.UNKNOWN
+            self.mark_changed()
             return device
     
     # Scanning Methods
@@ -336,6 +376,7 @@ class DeviceIntelligenceEngine:
             if device:
                 device.vulnerabilities.extend(vulnerabilities)
                 device.calculate_security_score()
+                self.mark_changed()
                 
                 # Trigger Power Automate for critical vulnerabilities
                 critical_vulns = [v for v in vulnerabilities if v.severity == "critical"]
@@ -430,6 +471,7 @@ class DeviceIntelligenceEngine:
             if success:
                 device.power_automate_triggered = True
                 device.power_automate_actions.append(f"{action}:{datetime.utcnow().isoformat()}")
+                self.mark_changed()
                 logger.info(f"Power Automate triggered for device {device_id}: {action}")
             else:
                 logger.error(f"Failed to trigger Power Automate for device {device_id}: {action}")
@@ -539,6 +581,8 @@ class DeviceIntelligenceEngine:
                 existing_device.open_ports = host_info["open_ports"]
             if "services" in host_info:
                 existing_device.services = host_info["services"]
+            self._intern_categories(existing_device)
+            self.mark_changed()
             
             return existing_device.device_id
         else:
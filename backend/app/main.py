@@ -3,30 +3,62 @@ from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from dotenv import load_dotenv
+from collections import Counter
+from contextlib import asynccontextmanager
 import os
 
 # Load environment variables from .env file
 load_dotenv()
 
+from app.utils.log_config import configure_logging
+
+configure_logging()
+
 from app.api import fortigate  # your existing fortigate routes
+from app.api import health, metrics, profiling
 from app.services.fortigate_service import (
     get_interfaces,
     get_cloud_status,
 )  # to get interfaces and cloud status for dashboard
 from app.services.fortiswitch_service import (
     get_fortiswitches,
+    switch_dicts,
 )  # to get FortiSwitch information
+from app.services.http_clients import get_http_clients
+from app.services.interface_snapshot import InterfaceSnapshot, get_interface_snapshot
+from app.services.startup import get_startup_state
+from app.services.switch_snapshot import SwitchSnapshot, get_switch_snapshot
+from app.services.topology_layout import get_layout_engine
+from app.utils.fast_json import (
+    FAST_JSON_ENABLED,
+    SerializedEntry,
+    dumps,
+    entry_response,
+    etag_matches,
+    not_modified,
+    version_etag,
+)
+from app.utils.blocking import call_async, run_sync, shutdown_sync_executor
+from app.utils.compression import PRECOMPRESS_ENABLED, precompress
+from app.utils.icon_resolver import get_icon_resolver
+from app.utils.profiler import get_loop_watchdog
+from app.utils.telemetry import install_http_metrics
+
+# Last serialized topology payload (fast JSON path)
+_topology_entry = None
 
 
 # Helper to aggregate device details for dashboard
-def get_all_device_details():
-    switches_data = get_fortiswitches()
+def get_all_device_details(switches_data=None):
+    if switches_data is None:
+        switches_data = get_fortiswitches()
     # If switches_data is a dict, extract the list
     if isinstance(switches_data, dict) and "switches" in switches_data:
         switches = switches_data["switches"]
     else:
         switches = switches_data
     devices = []
+    icon_resolver = get_icon_resolver()
     for switch in switches:
         if not isinstance(switch, dict):
             continue  # skip if not a dict (e.g., string or other type)
@@ -37,21 +69,32 @@ def get_all_device_details():
                 dev_copy["switch_serial"] = switch.get("serial")
                 dev_copy["switch_name"] = switch.get("name")
                 dev_copy["port_name"] = port.get("name")
-                # If icon_path not present, try to enrich from DB
-                if not dev_copy.get("icon_path"):
-                    from app.utils.icon_db import get_icon
-
-                    icon_info = get_icon(manufacturer=dev_copy.get("manufacturer"))
-                    if not icon_info:
-                        icon_info = get_icon(device_type=dev_copy.get("device_type"))
-                    if icon_info:
-                        dev_copy["icon_path"] = icon_info["icon_path"]
-                        dev_copy["icon_title"] = icon_info["title"]
+                # If icon_path not present, enrich from the in-memory icon index
+                icon_resolver.enrich(dev_copy)
                 devices.append(dev_copy)
     return devices
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Outbound HTTP pools are created on first use and closed on shutdown; the
+    switch snapshot is built in the background so startup never waits for the FortiGate.
+    """
+    loop_watchdog = get_loop_watchdog()
+    if os.environ.get("LOOP_WATCHDOG_ENABLED", "true").lower() == "true":
+        loop_watchdog.start()
+    startup_state = get_startup_state()
+    startup_state.start_warm_up(get_switch_snapshot)
+    startup_state.mark_ready()
+    yield
+    await startup_state.stop()
+    await loop_watchdog.stop()
+    shutdown_sync_executor()
+    await get_http_clients().close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
@@ -62,6 +105,16 @@ templates = Jinja2Templates(directory="app/templates")
 # Include Fortigate router
 app.include_router(fortigate.router)
 
+# Liveness/readiness probes
+app.include_router(health.router)
+
+# Prometheus metrics and per-route latency histograms
+app.include_router(metrics.router)
+install_http_metrics(app)
+
+# Admin-only sampling profiler and event loop diagnostics
+app.include_router(profiling.router)
+
 
 # 🏠 Route for Home "/"
 @app.get("/", response_class=HTMLResponse)
@@ -72,8 +125,9 @@ async def read_home(request: Request):
 # 📊 Route for Dashboard "/dashboard"
 @app.get("/dashboard", response_class=HTMLResponse)
 async def show_dashboard(request: Request):
-    interfaces = get_interfaces()
-    device_details = get_all_device_details()
+    # The fortigate/fortiswitch services are synchronous; keep them off the event loop
+    interfaces = await run_sync(get_interfaces)
+    device_details = await run_sync(get_all_device_details)
     return templates.TemplateResponse(
         "dashboard.html",
         {
@@ -94,7 +148,7 @@ async def api_cloud_status():
 # 🔄 Route for FortiSwitch Dashboard "/switches"
 @app.get("/switches", response_class=HTMLResponse)
 async def switches_page(request: Request):
-    switches = get_fortiswitches()  # Pulls live data
+    switches = await run_sync(get_fortiswitches)  # Pulls live data
     return templates.TemplateResponse(
         "switches.html", {"request": request, "switches": switches}
     )
@@ -108,16 +162,51 @@ async def topology_page(request: Request):
 
 # 📡 API endpoint for topology data
 @app.get("/api/topology_data")
-async def api_topology_data():
+async def api_topology_data(request: Request):
     """
     Returns real network topology data for the Security Fabric-style visualization
     """
-    from app.services.fortigate_service import get_interfaces
-    
-    # Get real data from your existing services
-    interfaces = get_interfaces()
-    switches_data = get_fortiswitches()
-    device_details = get_all_device_details()  # This has enriched manufacturer data!
+    # Both snapshots are TTL-gated, so this only reaches the FortiGate when they expire
+    switch_snapshot = await get_switch_snapshot()
+    interface_snapshot = await get_interface_snapshot()
+    if not FAST_JSON_ENABLED:
+        return await run_sync(build_topology_data, switch_snapshot, interface_snapshot)
+
+    # Fast path: the ETag comes from the input snapshot versions and the layout version,
+    # so an unchanged topology returns 304 before anything is built or serialized. The
+    # precompressed entry is reused for as long as those versions are unchanged.
+    global _topology_entry
+    layout_engine = get_layout_engine()
+    etag = _topology_etag(switch_snapshot, interface_snapshot, layout_engine.version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    if _topology_entry is None or _topology_entry.etag != etag:
+        topology_data = await run_sync(build_topology_data, switch_snapshot, interface_snapshot)
+        body = dumps(topology_data)
+        variants = precompress(body) if PRECOMPRESS_ENABLED else {}
+        # Building may have moved nodes (new layout version); tag the entry with the result
+        etag = _topology_etag(switch_snapshot, interface_snapshot, layout_engine.version)
+        _topology_entry = SerializedEntry(body, etag=etag, variants=variants)
+    return entry_response(request, _topology_entry)
+
+
+def _topology_etag(switch_snapshot: SwitchSnapshot, interface_snapshot: InterfaceSnapshot, layout_version: int) -> str:
+    return version_etag("topology", switch_snapshot.version, interface_snapshot.version, layout_version)
+
+
+def build_topology_data(switch_snapshot=None, interface_snapshot=None):
+    """
+    Build the topology graph (devices, connections, positions) from the switch and
+    interface snapshots (the current ones when not given).
+    """
+    if switch_snapshot is None:
+        switch_snapshot = call_async(get_switch_snapshot)
+    if interface_snapshot is None:
+        interface_snapshot = call_async(get_interface_snapshot)
+
+    interfaces = interface_snapshot.interfaces
+    switches_data = switch_dicts(switch_snapshot)
+    device_details = get_all_device_details(switches_data)  # This has enriched manufacturer data!
     
     # Transform data into topology format
     topology_data = {
@@ -133,7 +222,6 @@ async def api_topology_data():
         "ip": "192.168.0.254",
         "status": "online",
         "risk": "low",
-        "position": {"x": 400, "y": 100},
         "details": {
             "model": "FortiGate",
             "interfaces": len(interfaces) if interfaces else 0,
@@ -146,16 +234,22 @@ async def api_topology_data():
         switches = switches_data["switches"]
     else:
         switches = switches_data if switches_data else []
-    
-    switch_y = 300
+
+    # Count devices per switch once instead of rescanning device_details per switch
+    devices_per_switch = Counter(d.get("switch_serial") for d in device_details if d)
+    switch_ids_by_serial = {}
+
     for i, switch in enumerate(switches):
         if isinstance(switch, dict):
-            switch_id = f"switch_{i}"
-            
+            # Stable node IDs let the layout engine keep positions between polls
+            switch_id = f"switch_{switch.get('serial') or i}"
+            if switch.get("serial"):
+                switch_ids_by_serial.setdefault(switch.get("serial"), switch_id)
+
             # Determine switch status and risk
             switch_status = "online" if switch.get("status") == "Authorized" else "warning"
             switch_risk = "low" if switch.get("status") == "Authorized" else "medium"
-            
+
             topology_data["devices"].append({
                 "id": switch_id,
                 "type": "fortiswitch",
@@ -163,35 +257,37 @@ async def api_topology_data():
                 "ip": switch.get("mgmt_ip", "N/A"),
                 "status": switch_status,
                 "risk": switch_risk,
-                "position": {"x": 400, "y": switch_y},
                 "details": {
                     "serial": switch.get("serial", "Unknown"),
                     "model": switch.get("model", "FortiSwitch"),
                     "ports": len(switch.get("ports", [])),
                     "status": switch.get("status", "Unknown"),
-                    "connectedDevices": len([d for d in device_details if d.get("switch_serial") == switch.get("serial")])
+                    "connectedDevices": devices_per_switch.get(switch.get("serial"), 0)
                 }
             })
-            
+
             # Add connection from FortiGate to FortiSwitch
             topology_data["connections"].append({
                 "from": "fortigate_main",
                 "to": switch_id
             })
-            
-            switch_y += 200
-    
+
     # Now use the enriched device_details for connected devices
-    device_x_start = 150
-    device_y = 450
-    device_spacing = 120
     device_count = 0
-    
+    device_placements = []
+    used_device_ids = set()
+
     for device in device_details:
         if not device:
             continue
-            
-        device_id = f"device_{device_count}"
+
+        # MAC-derived IDs keep layout positions stable; rows without a MAC, or repeating
+        # one, fall back to the row index so every node ID is unique
+        mac = device.get("mac") or device.get("device_mac")
+        device_id = f"device_{mac.replace(':', '').lower()}" if mac else None
+        if device_id is None or device_id in used_device_ids:
+            device_id = f"device_row{device_count}"
+        used_device_ids.add(device_id)
         
         # Get enriched device information
         manufacturer = device.get("manufacturer", "Unknown Manufacturer")
@@ -235,10 +331,6 @@ async def api_topology_data():
             "mac": device.get("mac", "N/A"),
             "status": "online",
             "risk": risk_level,
-            "position": {
-                "x": device_x_start + (device_count * device_spacing),
-                "y": device_y
-            },
             "details": {
                 "manufacturer": manufacturer,
                 "port": device.get("port_name", "Unknown"),
@@ -251,19 +343,30 @@ async def api_topology_data():
             }
         })
         
-        # Connect device to its switch
+        # Connect device to its switch (devices without one are laid out as unattached)
         switch_serial = device.get("switch_serial")
-        if switch_serial:
-            # Find the switch this device is connected to
-            for j, switch in enumerate(switches):
-                if isinstance(switch, dict) and switch.get("serial") == switch_serial:
-                    switch_id = f"switch_{j}"
-                    topology_data["connections"].append({
-                        "from": switch_id,
-                        "to": device_id
-                    })
-                    break
-        
+        switch_id = switch_ids_by_serial.get(switch_serial) if switch_serial else None
+        if switch_id:
+            topology_data["connections"].append({
+                "from": switch_id,
+                "to": device_id
+            })
+        device_placements.append((device_id, switch_id, device.get("port_name")))
+
         device_count += 1
-    
+
+    # Server-side hierarchical layout; positions are cached by node ID between polls
+    layout_engine = get_layout_engine()
+    positions = layout_engine.layout(
+        "fortigate_main",
+        [d["id"] for d in topology_data["devices"] if d["type"] == "fortiswitch"],
+        device_placements,
+    )
+    for node in topology_data["devices"]:
+        node["position"] = positions[node["id"]]
+    topology_data["layout"] = {
+        "version": layout_engine.version,
+        "relaid_out": layout_engine.last_relayout_count,
+    }
+
     return topology_data
@@ -7,21 +7,33 @@ import os
 import asyncio
 import time
 import logging
+from collections.abc import Mapping
 from contextlib import asynccontextmanager
 from typing import Dict, Any
 
 # Load environment variables from .env file
 load_dotenv()
 
+from app.utils.log_config import configure_logging
+
+configure_logging()
+
 # Import optimized services
 from app.api import fortigate  # your existing fortigate routes
+from app.api import health, metrics, profiling
 from app.services.fortigate_service_optimized import (
-    get_interfaces_async,
     cleanup as cleanup_fortigate
 )
-from app.services.fortiswitch_service_optimized import (
-    get_fortiswitches_optimized,
-)
+from app.services.fortiswitch_client import get_fortiswitch_poller
+from app.services.interface_poller import get_interface_poller
+from app.services.interface_snapshot import get_interface_snapshot
+from app.services.metrics_store import get_metrics_recorder
+from app.services.startup import get_startup_state
+from app.services.switch_pipeline import get_switch_pipeline
+from app.services.http_clients import get_http_clients
+from app.utils.blocking import shutdown_sync_executor
+from app.utils.profiler import get_loop_watchdog
+from app.utils.telemetry import get_telemetry, install_http_metrics, span
 
 logger = logging.getLogger(__name__)
 
@@ -45,22 +57,46 @@ cache_ttl = 60  # 60 seconds TTL
 async def lifespan(app: FastAPI):
     """Application lifespan manager for startup and shutdown."""
     logger.info("Starting FortiSwitch Monitor with optimized performance")
-    
-    # Startup
-    try:
-        # Pre-warm the cache with initial data
-        logger.info("Pre-warming cache with initial data...")
-        await warm_cache()
-        logger.info("Cache pre-warming completed")
-    except Exception as e:
-        logger.error(f"Error during cache pre-warming: {e}")
+
+    # Watch for handlers that block the event loop (lag histogram + stall stacks)
+    loop_watchdog = get_loop_watchdog()
+    if os.environ.get("LOOP_WATCHDOG_ENABLED", "true").lower() == "true":
+        loop_watchdog.start()
+
+    # Start background interface counter polling (history for dashboards)
+    interface_poller = get_interface_poller()
+    if os.environ.get("INTERFACE_POLLER_ENABLED", "true").lower() == "true":
+        interface_poller.start()
+
+    # Persist interface and switch port rates for long-range history/capacity reports
+    metrics_recorder = get_metrics_recorder()
+    if os.environ.get("METRICS_STORE_ENABLED", "true").lower() == "true":
+        interface_poller.add_listener(metrics_recorder.on_interface_sample)
+        metrics_recorder.start()
+
+    # Per-port detail straight from the switches (needs FORTISWITCH_HOSTS and credentials)
+    fortiswitch_poller = get_fortiswitch_poller()
+    if os.environ.get("FORTISWITCH_DIRECT_POLL_ENABLED", "false").lower() == "true":
+        fortiswitch_poller.start()
+
+    # Serve immediately; the caches are warmed in the background (see /health/ready)
+    startup_state = get_startup_state()
+    startup_state.start_warm_up(warm_cache)
+    startup_state.mark_ready()
     
     yield
     
     # Shutdown
     logger.info("Shutting down FortiSwitch Monitor")
     try:
+        await startup_state.stop()
+        await interface_poller.stop()
+        await fortiswitch_poller.stop()
+        await metrics_recorder.stop()
+        await loop_watchdog.stop()
+        shutdown_sync_executor()
         await cleanup_fortigate()
+        await get_http_clients().close()
         logger.info("Cleanup completed successfully")
     except Exception as e:
         logger.error(f"Error during cleanup: {e}")
@@ -82,33 +118,56 @@ templates = Jinja2Templates(directory="app/templates")
 # Include Fortigate router
 app.include_router(fortigate.router)
 
+# Liveness/readiness probes
+app.include_router(health.router)
+
+# Prometheus metrics and per-route latency histograms
+app.include_router(metrics.router)
+install_http_metrics(app)
+
+# Admin-only sampling profiler and event loop diagnostics
+app.include_router(profiling.router)
+
+
+async def fetch_switches_snapshot(fresh: bool = False):
+    """
+    The shared switch snapshot (paged API and /metrics), rebuilt by the pipeline
+    only when older than its TTL or when fresh=True; concurrent callers share one
+    rebuild. Returns the snapshot's compact switch records so the page cache shares them.
+    """
+    snapshot = await get_switch_pipeline().snapshot(fresh=fresh)
+    return snapshot.switches
+
+
+async def fetch_interfaces_snapshot(fresh: bool = False):
+    """The shared interface snapshot (also served by /fortigate/api/interfaces), TTL-gated unless fresh=True."""
+    snapshot = await get_interface_snapshot(fresh=fresh)
+    return snapshot.interfaces
+
 
 async def warm_cache():
-    """Pre-warm cache with initial data to improve first-load performance."""
-    try:
-        # Pre-load interfaces and switches data
-        logger.info("Pre-loading interfaces data...")
-        interfaces_task = get_interfaces_async()
-        
-        logger.info("Pre-loading switches data...")
-        switches_task = get_fortiswitches_optimized()
-        
-        # Execute both tasks in parallel
-        interfaces, switches = await asyncio.gather(
-            interfaces_task, 
-            switches_task, 
-            return_exceptions=True
-        )
-        
-        # Cache the results
-        current_time = time.time()
-        app_cache["interfaces"] = (interfaces, current_time)
-        app_cache["switches"] = (switches, current_time)
-        
-        logger.info(f"Cache pre-warmed with {len(interfaces) if isinstance(interfaces, dict) else 0} interfaces and {len(switches) if isinstance(switches, list) else 0} switches")
-        
-    except Exception as e:
-        logger.error(f"Error warming cache: {e}")
+    """
+    Pre-warm cache with initial data to improve first-load performance.
+    Runs in the background after startup; only successful fetches are cached.
+    """
+    logger.info("Pre-loading interfaces and switches data...")
+    interfaces, switches = await asyncio.gather(
+        fetch_interfaces_snapshot(),
+        fetch_switches_snapshot(),
+        return_exceptions=True
+    )
+
+    current_time = time.time()
+    errors = []
+    for key, result in (("interfaces", interfaces), ("switches", switches)):
+        if isinstance(result, BaseException):
+            errors.append(f"{key}: {result}")
+        else:
+            app_cache[key] = (result, current_time)
+
+    logger.info(f"Cache pre-warmed with {len(interfaces) if isinstance(interfaces, dict) else 0} interfaces and {len(switches) if isinstance(switches, list) else 0} switches")
+    if errors:
+        raise RuntimeError("; ".join(errors))
 
 
 async def get_cached_data(cache_key: str, fetch_function, ttl: int = 60):
@@ -120,11 +179,13 @@ async def get_cached_data(cache_key: str, fetch_function, ttl: int = 60):
         cached_data, cached_time = app_cache[cache_key]
         if current_time - cached_time < ttl:
             performance_metrics["cache_hits"] += 1
+            get_telemetry().record_cache(cache_key, True)
             logger.debug(f"Cache hit for {cache_key}")
             return cached_data
     
     # Cache miss - fetch new data
     performance_metrics["cache_misses"] += 1
+    get_telemetry().record_cache(cache_key, False)
     logger.debug(f"Cache miss for {cache_key}, fetching new data")
     
     start_time = time.time()
@@ -152,27 +213,31 @@ async def update_performance_metrics(response_time: float, endpoint: str):
         performance_metrics["last_switches_load"] = response_time
 
 
-async def background_cache_refresh():
-    """Background task to refresh cache periodically."""
+async def background_cache_refresh(force: bool = False):
+    """
+    Refresh the page cache from the shared snapshots. Scheduled after page views:
+    the snapshots only go back to the FortiGate once their TTL has expired
+    (or when force=True), so this is cheap when they are current.
+    """
     try:
-        logger.info("Background cache refresh started")
+        logger.debug("Background cache refresh started")
         
         # Refresh interfaces and switches data in parallel
-        interfaces_task = get_interfaces_async()
-        switches_task = get_fortiswitches_optimized()
-        
         interfaces, switches = await asyncio.gather(
-            interfaces_task, 
-            switches_task, 
+            fetch_interfaces_snapshot(fresh=force),
+            fetch_switches_snapshot(fresh=force),
             return_exceptions=True
         )
         
-        # Update cache
+        # Update cache (failed fetches keep the previous entry)
         current_time = time.time()
-        app_cache["interfaces"] = (interfaces, current_time)
-        app_cache["switches"] = (switches, current_time)
+        for key, result in (("interfaces", interfaces), ("switches", switches)):
+            if isinstance(result, BaseException):
+                logger.error(f"Background refresh of {key} failed: {result}")
+            else:
+                app_cache[key] = (result, current_time)
         
-        logger.info("Background cache refresh completed")
+        logger.debug("Background cache refresh completed")
         
     except Exception as e:
         logger.error(f"Error in background cache refresh: {e}")
@@ -210,7 +275,7 @@ async def show_dashboard(request: Request, background_tasks: BackgroundTasks):
     
     try:
         # Get cached interfaces data
-        interfaces = await get_cached_data("interfaces", get_interfaces_async, ttl=cache_ttl)
+        interfaces = await get_cached_data("interfaces", fetch_interfaces_snapshot, ttl=cache_ttl)
         
         # Schedule background cache refresh if needed
         background_tasks.add_task(background_cache_refresh)
@@ -249,29 +314,30 @@ async def switches_page(request: Request, background_tasks: BackgroundTasks):
     
     try:
         # Get cached switches data
-        switches = await get_cached_data("switches", get_fortiswitches_optimized, ttl=cache_ttl)
+        switches = await get_cached_data("switches", fetch_switches_snapshot, ttl=cache_ttl)
         
         # Calculate summary statistics
         total_switches = len(switches) if isinstance(switches, list) else 0
         total_devices = sum(
             switch.get("connected_devices_count", 0) 
             for switch in switches 
-            if isinstance(switch, dict)
+            if isinstance(switch, Mapping)
         ) if isinstance(switches, list) else 0
         
         # Schedule background cache refresh
         background_tasks.add_task(background_cache_refresh)
         
-        response = templates.TemplateResponse(
-            "switches.html", 
-            {
-                "request": request, 
-                "switches": switches,
-                "total_switches": total_switches,
-                "total_devices": total_devices,
-                "performance_metrics": performance_metrics
-            }
-        )
+        with span("render", pipeline="fortiswitches", template="switches.html"):
+            response = templates.TemplateResponse(
+                "switches.html", 
+                {
+                    "request": request, 
+                    "switches": switches,
+                    "total_switches": total_switches,
+                    "total_devices": total_devices,
+                    "performance_metrics": performance_metrics
+                }
+            )
         
         response_time = time.time() - start_time
         await update_performance_metrics(response_time, "switches")
@@ -294,6 +360,8 @@ async def get_performance_metrics():
     return {
         "status": "ok",
         "metrics": performance_metrics,
+        "latency": get_telemetry().summary(),
+        "caches": get_telemetry().cache_stats(),
         "cache_status": {
             "cached_items": len(app_cache),
             "cache_keys": list(app_cache.keys())
@@ -316,7 +384,7 @@ async def clear_cache():
 @app.post("/api/cache/refresh")
 async def refresh_cache(background_tasks: BackgroundTasks):
     """Manually trigger cache refresh."""
-    background_tasks.add_task(background_cache_refresh)
+    background_tasks.add_task(background_cache_refresh, force=True)
     return {"status": "ok", "message": "Cache refresh scheduled"}
 
 
@@ -351,12 +419,6 @@ async def health_check():
 if __name__ == "__main__":
     import uvicorn
     
-    # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    )
-    
     # Run with optimized settings
     uvicorn.run(
         "app.main_optimized:app",
@@ -0,0 +1,140 @@
+"""
+Compact records for the cached switch -> port -> device snapshot.
+
+The discovery pipeline produces one dict per switch, port and device; with 10k
+devices and the snapshot shared by the paged API, /metrics and the HTML pages,
+those dicts are the bulk of a worker's memory. The records below keep the known
+keys in __slots__ (no per-row dict), hold child rows in tuples and store the
+values that repeat across rows (status, VLAN, manufacturer, DHCP interface, ...)
+as the canonical instance from a dictionary-encoded column in CATEGORIES, so
+each distinct value exists once however many rows and refreshes use it.
+Keys a record does not know (classifier output, direct-poll details) are kept as
+a tuple of values next to a key tuple shared by every row with the same keys.
+
+Records are read-only Mappings, so existing readers (`row.get("status")`,
+`row["ports"]`, templates) work unchanged; to_dict() rebuilds plain dicts and is
+only called when a payload is serialized.
+"""
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.utils.categorical import CategoryTable
+
+_MISSING = object()  # Keys the source row did not have leave their slot unset
+_KEY_LAYOUTS: Dict[Tuple[str, ...], Tuple[str, ...]] = {}  # One shared tuple per distinct set of extra keys
+CATEGORIES = CategoryTable()  # Lookup tables for the CATEGORICAL fields, shared by every snapshot
+
+
+class SnapshotRecord(Mapping):
+    """Base class: FIELDS become slots, CATEGORICAL values are dictionary-encoded, CHILDREN hold nested records."""
+
+    __slots__ = ("_extra_keys", "_extra_values")
+
+    FIELDS: Tuple[str, ...] = ()
+    CATEGORICAL: frozenset = frozenset()
+    CHILDREN: Dict[str, type] = {}
+    _FIELD_SET: frozenset = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._FIELD_SET = frozenset(cls.FIELDS)
+
+    @classmethod
+    def from_mapping(cls, data: Mapping) -> "SnapshotRecord":
+        """Compact one row; records of this type are returned as they are (shared, not copied)."""
+        if type(data) is cls:
+            return data
+        record = cls.__new__(cls)
+        get = data.get
+        for field in cls.FIELDS:
+            value = get(field, _MISSING)
+            if value is _MISSING:
+                continue
+            child = cls.CHILDREN.get(field)
+            if child is not None:
+                value = tuple(child.from_mapping(item) for item in value or () if isinstance(item, Mapping))
+            elif field in cls.CATEGORICAL:
+                value = CATEGORIES.intern(field, value)
+            setattr(record, field, value)
+        fields = cls._FIELD_SET
+        keys = tuple(key for key in data if key not in fields)
+        record._extra_keys = _KEY_LAYOUTS.setdefault(keys, keys)
+        record._extra_values = tuple(data[key] for key in keys)
+        return record
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain (nested) dict with the original keys."""
+        result = {}
+        for field in self.FIELDS:
+            value = getattr(self, field, _MISSING)
+            if value is _MISSING:
+                continue
+            if field in self.CHILDREN:
+                value = [child.to_dict() for child in value]
+            result[field] = value
+        result.update(zip(self._extra_keys, self._extra_values))
+        return result
+
+    # --- Read-only Mapping protocol ---
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._FIELD_SET:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                return value
+        elif key in self._extra_keys:
+            return self._extra_values[self._extra_keys.index(key)]
+        raise KeyError(key)
+
+    def __iter__(self):
+        for field in self.FIELDS:
+            if getattr(self, field, _MISSING) is not _MISSING:
+                yield field
+        yield from self._extra_keys
+
+    def __len__(self) -> int:
+        present = sum(1 for field in self.FIELDS if getattr(self, field, _MISSING) is not _MISSING)
+        return present + len(self._extra_keys)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class DeviceRecord(SnapshotRecord):
+    """One connected device (aggregate_port_devices_optimized output)."""
+
+    FIELDS = (
+        "device_mac", "device_ip", "device_name", "device_type", "manufacturer", "source",
+        "vlan", "last_seen", "port_id", "dhcp_status", "dhcp_interface", "vci",
+    )
+    __slots__ = FIELDS
+    CATEGORICAL = frozenset(("device_type", "manufacturer", "source", "vlan", "dhcp_status", "dhcp_interface", "vci"))
+
+
+class PortRecord(SnapshotRecord):
+    """One switch port with its connected devices."""
+
+    FIELDS = (
+        "name", "status", "speed", "duplex", "vlan", "poe_capable", "poe_status",
+        "fortilink_port", "connected_devices",
+    )
+    __slots__ = FIELDS
+    CATEGORICAL = frozenset(("name", "status", "duplex", "vlan", "poe_status"))
+    CHILDREN = {"connected_devices": DeviceRecord}
+
+
+class SwitchRecord(SnapshotRecord):
+    """One managed FortiSwitch with its ports."""
+
+    FIELDS = (
+        "name", "serial", "model", "status", "version", "ip", "uptime", "ports",
+        "total_ports", "active_ports", "connected_devices_count",
+    )
+    __slots__ = FIELDS
+    CATEGORICAL = frozenset(("model", "status", "version"))
+    CHILDREN = {"ports": PortRecord}
+
+
+def compact_switches(switches: Optional[Iterable[Any]]) -> List[SwitchRecord]:
+    """Compact a switch list (dicts or records); rows that are not mappings are dropped."""
+    return [SwitchRecord.from_mapping(s) for s in switches or () if isinstance(s, Mapping)]
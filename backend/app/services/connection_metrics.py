@@ -0,0 +1,247 @@
+import ssl
+import time
+import threading
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class HostStats:
+    """Connection and latency counters for one remote host."""
+
+    __slots__ = (
+        "connections_opened",
+        "sessions_resumed",
+        "handshake_total",
+        "handshake_max",
+        "requests",
+        "ttfb_total",
+        "ttfb_max",
+        "errors",
+    )
+
+    def __init__(self):
+        self.connections_opened = 0
+        self.sessions_resumed = 0
+        self.handshake_total = 0.0
+        self.handshake_max = 0.0
+        self.requests = 0
+        self.ttfb_total = 0.0
+        self.ttfb_max = 0.0
+        self.errors = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        opened = self.connections_opened
+        return {
+            "connections_opened": opened,
+            "connections_reused": max(0, self.requests - opened),
+            "tls_sessions_resumed": self.sessions_resumed,
+            "tls_resumption_rate": round(self.sessions_resumed / opened, 3) if opened else None,
+            "handshake_ms_avg": round(self.handshake_total / opened * 1000, 2) if opened else None,
+            "handshake_ms_max": round(self.handshake_max * 1000, 2),
+            "handshake_ms_total": round(self.handshake_total * 1000, 1),
+            "requests": self.requests,
+            "ttfb_ms_avg": round(self.ttfb_total / self.requests * 1000, 2) if self.requests else None,
+            "ttfb_ms_max": round(self.ttfb_max * 1000, 2),
+            "ttfb_ms_total": round(self.ttfb_total * 1000, 1),
+            # Share of time-to-first-byte spent in TLS handshakes
+            "handshake_share": round(self.handshake_total / self.ttfb_total, 3) if self.ttfb_total else None,
+            "errors": self.errors,
+        }
+
+
+class ConnectionMetrics:
+    """Thread-safe per-host counters fed by the TLS layer and the HTTP clients."""
+
+    def __init__(self):
+        self._hosts: Dict[str, HostStats] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def _stats(self, host: Optional[str]) -> HostStats:
+        host = host or "unknown"
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = HostStats()
+        return stats
+
+    def record_handshake(self, host: Optional[str], seconds: float, resumed: bool) -> None:
+        with self._lock:
+            stats = self._stats(host)
+            stats.connections_opened += 1
+            stats.handshake_total += seconds
+            stats.handshake_max = max(stats.handshake_max, seconds)
+            if resumed:
+                stats.sessions_resumed += 1
+
+    def record_request(self, host: Optional[str], ttfb: float) -> None:
+        with self._lock:
+            stats = self._stats(host)
+            stats.requests += 1
+            stats.ttfb_total += ttfb
+            stats.ttfb_max = max(stats.ttfb_max, ttfb)
+
+    def record_error(self, host: Optional[str]) -> None:
+        with self._lock:
+            self._stats(host).errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "since": self.started_at,
+                "hosts": {host: stats.to_dict() for host, stats in sorted(self._hosts.items())},
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hosts.clear()
+            self.started_at = time.time()
+
+
+# --- TLS session resumption ---
+
+
+class _ResumingMixin:
+    """
+    Shared by the socket (requests/urllib3) and memory-BIO (asyncio/aiohttp) TLS
+    objects: times the handshake, reports it, and hands the negotiated session back
+    to the context. TLS 1.3 tickets arrive after the handshake, so the session is
+    captured again on the first read that has one.
+    """
+
+    _handshake_started = 0.0
+    _ticket_pending = False
+
+    def _start_handshake(self) -> None:
+        if not self._handshake_started:
+            self._handshake_started = time.perf_counter()
+
+    def _finish_handshake(self) -> None:
+        context = self.context
+        elapsed = time.perf_counter() - self._handshake_started if self._handshake_started else 0.0
+        if isinstance(context, ResumingSSLContext):
+            context.metrics.record_handshake(self.server_hostname, elapsed, self.session_reused)
+            if self.version() == "TLSv1.3":
+                # Nothing resumable until the server's NewSessionTicket is read
+                self._ticket_pending = True
+            else:
+                context.store_session(self.server_hostname, self.session)
+
+    def _capture_ticket(self) -> None:
+        session = self.session
+        if session is not None and session.has_ticket:
+            self._ticket_pending = False
+            self.context.store_session(self.server_hostname, session)
+
+
+class ResumingSSLSocket(_ResumingMixin, ssl.SSLSocket):
+    def do_handshake(self, block: bool = False) -> None:
+        self._start_handshake()
+        super().do_handshake(block)
+        self._finish_handshake()
+
+    def recv_into(self, buffer, nbytes=None, flags=0):
+        received = super().recv_into(buffer, nbytes, flags)
+        if self._ticket_pending:
+            self._capture_ticket()
+        return received
+
+
+class ResumingSSLObject(_ResumingMixin, ssl.SSLObject):
+    def do_handshake(self) -> None:
+        # asyncio retries do_handshake until the peer has answered; time from the first try
+        self._start_handshake()
+        super().do_handshake()
+        self._finish_handshake()
+
+    def read(self, len=1024, buffer=None):
+        data = super().read(len, buffer)
+        if self._ticket_pending:
+            self._capture_ticket()
+        return data
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """
+    SSLContext that offers the last TLS session for a host on every new connection
+    (session ticket / session ID resumption), so reconnecting to a FortiGate with a
+    self-signed certificate skips the full handshake. Works for both wrap_socket
+    (requests) and wrap_bio (asyncio/aiohttp).
+    """
+
+    sslsocket_class = ResumingSSLSocket
+    sslobject_class = ResumingSSLObject
+
+    def __new__(cls, protocol=ssl.PROTOCOL_TLS_CLIENT, *args, **kwargs):
+        return super().__new__(cls, protocol, *args, **kwargs)
+
+    def __init__(self, protocol=ssl.PROTOCOL_TLS_CLIENT, metrics: Optional[ConnectionMetrics] = None):
+        self.metrics = metrics or get_connection_metrics()
+        self._sessions: Dict[str, ssl.SSLSession] = {}
+        self._sessions_lock = threading.Lock()
+
+    def store_session(self, host: Optional[str], session: Optional[ssl.SSLSession]) -> bool:
+        """Cache a resumable session; returns False if there is nothing to cache yet."""
+        if not host or session is None or not (session.has_ticket or session.id):
+            return False
+        with self._sessions_lock:
+            self._sessions[host] = session
+        return True
+
+    def cached_session(self, host: Optional[str]) -> Optional[ssl.SSLSession]:
+        if not host:
+            return None
+        with self._sessions_lock:
+            session = self._sessions.get(host)
+        if session is not None and session.timeout and time.time() - session.time > session.timeout:
+            return None
+        return session
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True,
+                    suppress_ragged_eofs=True, server_hostname=None, session=None):
+        if session is None and not server_side:
+            session = self.cached_session(server_hostname)
+        return super().wrap_socket(
+            sock,
+            server_side=server_side,
+            do_handshake_on_connect=do_handshake_on_connect,
+            suppress_ragged_eofs=suppress_ragged_eofs,
+            server_hostname=server_hostname,
+            session=session,
+        )
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        if session is None and not server_side:
+            session = self.cached_session(server_hostname)
+        return super().wrap_bio(
+            incoming, outgoing, server_side=server_side, server_hostname=server_hostname, session=session
+        )
+
+    def session_count(self) -> int:
+        with self._sessions_lock:
+            return len(self._sessions)
+
+
+def create_client_context(verify: bool = True) -> ResumingSSLContext:
+    """Client context with default CA/ciphers plus session resumption."""
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    if verify:
+        context.load_default_certs(ssl.Purpose.SERVER_AUTH)
+    else:
+        # FortiGate/FortiSwitch management certificates are usually self-signed
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+# Global metrics instance
+_connection_metrics = None
+
+
+def get_connection_metrics() -> ConnectionMetrics:
+    """Get the global connection metrics instance"""
+    global _connection_metrics
+    if _connection_metrics is None:
+        _connection_metrics = ConnectionMetrics()
+    return _connection_metrics
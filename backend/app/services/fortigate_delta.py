@@ -0,0 +1,347 @@
+"""
+Delta polling of the large FortiGate monitor tables (detected devices, DHCP, ARP).
+
+Each table is read in pages with FortiOS query parameters: start/count for
+paging, format= to request only the fields of the table's projection and an
+optional filter= (FORTIGATE_<TABLE>_FILTER, FortiOS filter syntax). Every page is
+hashed; a page whose hash matches the previous poll is skipped without looking at
+its rows. Rows on changed pages are projected to tuples and compared with the
+previous poll by key, and only new,
+changed and vanished rows are fed to the map builders, which patch copies of the
+previous maps. An idle network therefore costs a few hashes per refresh instead
+of rebuilding every map from scratch.
+
+FortiOS has no change tokens for these tables, and some fields tick on every
+poll (detected-device last_seen, ARP age). Those are marked volatile: they are
+ignored when deciding whether a row changed, and every DELTA_FULL_REBUILD_INTERVAL
+seconds all rows are rebuilt so their values do not drift too far.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from operator import itemgetter
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+from urllib.parse import urlencode
+
+from .fortigate_service_optimized import fgt_api_async_uncached
+from .fortiswitch_service_optimized import (
+    ARP_ENTRY,
+    DELTA_POLLING_ENABLED,
+    DETECTED_DEVICE,
+    DHCP_LEASE,
+    build_arp_map_optimized,
+    build_detected_device_map_optimized,
+    build_dhcp_map_optimized,
+    normalize_mac_optimized,
+    prefetch_manufacturers,
+)
+from app.utils.projection import Projection
+from app.utils.telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = int(os.environ.get("FORTIGATE_DELTA_PAGE_SIZE", "1000"))
+MAX_PAGES = 200  # Guard against endpoints that ignore start=
+DELTA_FULL_REBUILD_INTERVAL = float(os.environ.get("FORTIGATE_DELTA_FULL_REBUILD_INTERVAL", "300"))
+
+Row = tuple  # Projected row (namedtuple)
+
+
+def _mac_key(row: Row) -> Optional[Hashable]:
+    mac = row.mac
+    return normalize_mac_optimized(mac) if isinstance(mac, str) and mac else None
+
+
+def _detected_key(row: Row) -> Optional[Hashable]:
+    mac = _mac_key(row)
+    if mac is None or not row.switch_id or not row.port_name:
+        return None
+    return (mac, row.switch_id, row.port_name)
+
+
+class DeltaTable:
+    """One paged monitor table: its projection and how rows are keyed."""
+
+    def __init__(
+        self,
+        name: str,
+        projection: Projection,
+        key: Callable[[Row], Optional[Hashable]],
+        volatile: Tuple[str, ...] = (),
+        filter: Optional[str] = None,
+    ):
+        self.name = name
+        self.projection = projection
+        self.key = key
+        self.filter = filter
+        # Rows differing only in volatile fields count as unchanged
+        fields = projection.row_type._fields
+        stable = [i for i, field in enumerate(fields) if field not in volatile]
+        self._stable = itemgetter(*stable) if len(stable) != len(fields) else None
+        # State from the previous poll
+        self.page_hashes: List[str] = []
+        self.page_keys: List[List[Hashable]] = []
+        self.rows: Dict[Hashable, Row] = {}
+
+    def page_endpoint(self, start: int, count: int) -> str:
+        params = {"start": start, "count": count, **self.projection.params()}
+        if self.filter:
+            params["filter"] = self.filter
+        return f"{self.projection.endpoint}?{urlencode(params, safe='|,=')}"
+
+    def same_row(self, old: Row, new: Row) -> bool:
+        if self._stable is None:
+            return old == new
+        return self._stable(old) == self._stable(new)
+
+
+def default_tables() -> Dict[str, DeltaTable]:
+    return {
+        "detected_devices": DeltaTable(
+            "detected_devices",
+            DETECTED_DEVICE,
+            _detected_key,
+            volatile=("last_seen",),
+            filter=os.environ.get("FORTIGATE_DETECTED_DEVICE_FILTER") or None,
+        ),
+        "dhcp": DeltaTable(
+            "dhcp",
+            DHCP_LEASE,
+            _mac_key,
+            filter=os.environ.get("FORTIGATE_DHCP_FILTER") or None,
+        ),
+        "arp": DeltaTable(
+            "arp",
+            ARP_ENTRY,
+            _mac_key,
+            volatile=("age",),
+            filter=os.environ.get("FORTIGATE_ARP_FILTER") or None,
+        ),
+    }
+
+
+def _page_hash(results: List[Any]) -> str:
+    body = json.dumps(results, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(body.encode(), digest_size=16).hexdigest()
+
+
+class TableDelta:
+    """Changes in one table since the previous poll."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.upserted: Dict[Hashable, Row] = {}
+        self.removed: Dict[Hashable, Row] = {}
+        self.pages = 0
+        self.changed_pages = 0
+        self.rows = 0
+        self.error: Optional[str] = None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "pages": self.pages,
+            "changed_pages": self.changed_pages,
+            "rows": self.rows,
+            "upserted": len(self.upserted),
+            "removed": len(self.removed),
+            "error": self.error,
+        }
+
+
+class DeltaPoller:
+    """Keeps the DHCP/ARP/detected-device maps current by applying per-poll deltas."""
+
+    def __init__(self, tables: Optional[Dict[str, DeltaTable]] = None, page_size: int = PAGE_SIZE):
+        self.tables = tables if tables is not None else default_tables()
+        self.page_size = page_size
+        self.dhcp_map: Dict[str, Row] = {}
+        self.arp_map: Dict[str, Row] = {}
+        self.detected_map: Dict[str, List[Row]] = {}
+        # Port key -> {row key: processed device}, backing detected_map
+        self._detected_ports: Dict[str, Dict[Hashable, Row]] = {}
+        self._lock = asyncio.Lock()
+        self.poll_count = 0
+        self.last_full_rebuild = 0.0
+        self.last_poll: Dict[str, Dict[str, Any]] = {}
+
+    # --- Fetching ---
+
+    async def _fetch_page(self, table: DeltaTable, index: int) -> Dict[str, Any]:
+        return await fgt_api_async_uncached(table.page_endpoint(index * self.page_size, self.page_size))
+
+    async def poll_table(self, table: DeltaTable, full: bool = False) -> TableDelta:
+        """Fetch all pages of a table and diff them against the previous poll."""
+        delta = TableDelta(table.name)
+        # Pages we expect to exist are fetched together; more are read one by one
+        known = max(1, len(table.page_hashes))
+        responses = list(await asyncio.gather(*(self._fetch_page(table, i) for i in range(known))))
+
+        page_hashes: List[str] = []
+        page_keys: List[List[Hashable]] = []
+        seen: Set[Hashable] = set()
+        new_rows = dict(table.rows)
+        index = 0
+        while index < MAX_PAGES:
+            if index >= len(responses):
+                responses.append(await self._fetch_page(table, index))
+            data = responses[index]
+            if not isinstance(data, dict) or "error" in data:
+                delta.error = str(data.get("error") if isinstance(data, dict) else data)
+                logger.warning(f"Delta poll of {table.name} page {index} failed: {delta.error}")
+                delta.upserted.clear()  # Keep the previous state; retry the whole table next poll
+                return delta
+            results = data.get("results", [])
+            if not isinstance(results, list):
+                results = []
+
+            digest = _page_hash(results)
+            delta.pages += 1
+            if not full and index < len(table.page_hashes) and table.page_hashes[index] == digest:
+                keys = table.page_keys[index]
+            else:
+                delta.changed_pages += 1
+                keys = []
+                for row in table.projection.project_all(results):
+                    key = table.key(row)
+                    if key is None:
+                        continue
+                    keys.append(key)
+                    old = new_rows.get(key)
+                    if full or old is None or not table.same_row(old, row):
+                        delta.upserted[key] = row
+                    new_rows[key] = row
+            page_hashes.append(digest)
+            page_keys.append(keys)
+            seen.update(keys)
+
+            # A short page is the last one; so is a page that ignored count=
+            if len(results) < self.page_size or len(results) > self.page_size:
+                break
+            index += 1
+
+        for key in new_rows.keys() - seen:
+            delta.removed[key] = new_rows.pop(key)
+        delta.rows = len(new_rows)
+        table.page_hashes, table.page_keys, table.rows = page_hashes, page_keys, new_rows
+        return delta
+
+    # --- Applying deltas ---
+
+    def _apply_keyed(
+        self, current: Dict[str, Row], delta: TableDelta, builder: Callable[[Dict[str, Any]], Dict]
+    ) -> Dict[str, Row]:
+        """DHCP/ARP maps are keyed by normalized MAC, the same key as the table rows."""
+        if not delta.upserted and not delta.removed:
+            return current
+        updated = dict(current)
+        for key in delta.removed:
+            updated.pop(key, None)
+        updated.update(builder({"results": list(delta.upserted.values())}))
+        return updated
+
+    def _apply_detected(self, delta: TableDelta) -> None:
+        if not delta.upserted and not delta.removed:
+            return
+        ports = dict(self._detected_ports)
+        touched: Set[str] = set()
+
+        def port(port_key: str) -> Dict[Hashable, Row]:
+            if port_key not in touched:
+                touched.add(port_key)
+                ports[port_key] = dict(ports.get(port_key, {}))
+            return ports[port_key]
+
+        for (mac, switch_id, port_name) in delta.removed:
+            port(f"{switch_id}:{port_name}").pop((mac, switch_id, port_name), None)
+        built = build_detected_device_map_optimized({"results": list(delta.upserted.values())})
+        for port_key, devices in built.items():
+            entries = port(port_key)
+            for device in devices:
+                entries[_detected_key(device)] = device
+
+        detected_map = dict(self.detected_map)
+        for port_key in touched:
+            if ports[port_key]:
+                detected_map[port_key] = list(ports[port_key].values())
+            else:
+                del ports[port_key]
+                detected_map.pop(port_key, None)
+        self._detected_ports, self.detected_map = ports, detected_map
+
+    async def poll(self) -> Dict[str, Any]:
+        """
+        Poll all tables and return {"dhcp_map", "arp_map", "detected_map", "deltas"}.
+        The maps are new objects when something changed; earlier maps are never modified.
+        A table whose poll failed keeps its previous map.
+        """
+        async with self._lock:
+            full = time.monotonic() - self.last_full_rebuild >= DELTA_FULL_REBUILD_INTERVAL
+            names = list(self.tables)
+            deltas = dict(zip(names, await asyncio.gather(
+                *(self.poll_table(self.tables[name], full=full) for name in names)
+            )))
+
+            detected = deltas.get("detected_devices")
+            if detected is not None and detected.upserted:
+                # Resolve new manufacturers in one batch, off the loop
+                await asyncio.to_thread(prefetch_manufacturers, {"results": list(detected.upserted.values())})
+            if "dhcp" in deltas:
+                self.dhcp_map = self._apply_keyed(self.dhcp_map, deltas["dhcp"], build_dhcp_map_optimized)
+            if "arp" in deltas:
+                self.arp_map = self._apply_keyed(self.arp_map, deltas["arp"], build_arp_map_optimized)
+            if detected is not None:
+                self._apply_detected(detected)
+
+            if full and not any(d.error for d in deltas.values()):
+                self.last_full_rebuild = time.monotonic()
+            self.poll_count += 1
+            self.last_poll = {name: delta.summary() for name, delta in deltas.items()}
+            telemetry = get_telemetry()
+            for name, delta in deltas.items():
+                telemetry.increment("fortigate_delta_pages_total", name, "changed", amount=delta.changed_pages)
+                telemetry.increment(
+                    "fortigate_delta_pages_total", name, "unchanged", amount=delta.pages - delta.changed_pages
+                )
+                telemetry.increment("fortigate_delta_rows_total", name, "upserted", amount=len(delta.upserted))
+                telemetry.increment("fortigate_delta_rows_total", name, "removed", amount=len(delta.removed))
+            logger.info(
+                "Delta poll%s: " % (" (full rebuild)" if full else "")
+                + ", ".join(
+                    f"{name} {d.changed_pages}/{d.pages} pages changed, +{len(d.upserted)} -{len(d.removed)}"
+                    for name, d in deltas.items()
+                )
+            )
+            return {
+                "dhcp_map": self.dhcp_map,
+                "arp_map": self.arp_map,
+                "detected_map": self.detected_map,
+                "deltas": self.last_poll,
+            }
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": DELTA_POLLING_ENABLED,
+            "page_size": self.page_size,
+            "poll_count": self.poll_count,
+            "full_rebuild_interval": DELTA_FULL_REBUILD_INTERVAL,
+            "tables": {
+                name: {"pages": len(t.page_hashes), "rows": len(t.rows), "filter": t.filter}
+                for name, t in self.tables.items()
+            },
+            "last_poll": self.last_poll,
+        }
+
+
+# Global delta poller instance
+_delta_poller = None
+
+
+def get_delta_poller() -> DeltaPoller:
+    """Get the global FortiGate delta poller instance"""
+    global _delta_poller
+    if _delta_poller is None:
+        _delta_poller = DeltaPoller()
+    return _delta_poller
@@ -15,22 +15,35 @@ import os
 import requests
 import json
 import logging
+import threading
 import time
 from typing import Dict, Any, Optional
 
 from .fortigate_session import get_session_manager
+from .http_clients import get_http_clients
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Rate limiting - track last API call time
 _last_api_call = 0
 _min_interval = 10  # Minimum 10 seconds between API calls
+# Calls may come from several offload threads; the interval is enforced across them
+_rate_limit_lock = threading.Lock()
 
 # Authentication mode: 'session' (preferred) or 'token'
 _auth_mode = "session"
 
+# Token-auth session, created on first use (nothing is opened at import time)
+_token_session = None
+
+
+def _get_token_session():
+    """Token-auth requests reuse the shared FortiGate keep-alive pool."""
+    global _token_session
+    if _token_session is None:
+        _token_session = get_http_clients().get_sync_session("fortigate")
+    return _token_session
+
 
 def load_api_token() -> Optional[str]:
     """Load API token from file or environment variable"""
@@ -95,14 +108,15 @@ def fgt_api(
                 fortigate_ip = fortigate_host
 
         # Rate limiting - ensure minimum interval between calls
-        current_time = time.time()
-        time_since_last = current_time - _last_api_call
-        if time_since_last < _min_interval:
-            sleep_time = _min_interval - time_since_last
-            logger.info(f"Rate limiting: sleeping {sleep_time:.1f}s before API call")
-            time.sleep(sleep_time)
+        with _rate_limit_lock:
+            current_time = time.time()
+            time_since_last = current_time - _last_api_call
+            if time_since_last < _min_interval:
+                sleep_time = _min_interval - time_since_last
+                logger.info(f"Rate limiting: sleeping {sleep_time:.1f}s before API call")
+                time.sleep(sleep_time)
 
-        _last_api_call = time.time()
+            _last_api_call = time.time()
 
         # Try session-based authentication first
         if _auth_mode == "session":
@@ -167,7 +181,7 @@ def _fgt_api_with_token(
             f"Making API request to: {endpoint} (FortiGate: {fortigate_ip}) using token authentication"
         )
 
-        response = requests.get(url, headers=headers, verify=False, timeout=30)
+        response = _get_token_session().get(url, headers=headers, verify=False, timeout=30)
 
         # Handle specific HTTP status codes
         if response.status_code == 401:
@@ -2,16 +2,18 @@ import os
 import logging
 import time
 import asyncio
-from typing import Dict, Any, Optional, List
+from typing import AsyncIterator, Dict, Any, Optional, List
+from urllib.parse import urlencode
 import aiohttp
 import json
 from functools import wraps
 from datetime import datetime, timedelta
 
 from .fortigate_session import get_session_manager
+from .http_clients import get_http_clients, run_async
+from app.utils.json_stream import ResultsParser
+from app.utils.telemetry import get_telemetry
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Optimized rate limiting - reduced from 10s to 2s
@@ -25,11 +27,19 @@ _auth_mode = "session"
 _cache = {}
 _cache_ttl = 60  # Cache for 60 seconds
 
-# Connection pool for aiohttp
-_connector = None
-_session = None
+# Streaming reads of large monitor tables
+STREAM_PAGE_SIZE = int(os.environ.get("FORTIGATE_STREAM_PAGE_SIZE", "5000"))
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_MAX_PAGES = 1000
 
 
+class FortiGateStreamError(RuntimeError):
+    """A streamed table read failed; .error holds the usual {"error": ...} dict."""
+
+    def __init__(self, error: Dict[str, Any]):
+        super().__init__(f"{error.get('error')}: {error.get('message', error.get('status_code', ''))}")
+        self.error = error
+
 def cache_response(ttl_seconds: int = 60):
     """Decorator for caching API responses with TTL."""
     def decorator(func):
@@ -43,9 +53,11 @@ def cache_response(ttl_seconds: int = 60):
                 cached_data, cached_time = _cache[cache_key]
                 if datetime.now() - cached_time < timedelta(seconds=ttl_seconds):
                     logger.debug(f"Cache hit for {cache_key}")
+                    get_telemetry().record_cache("fortigate_api", True)
                     return cached_data
             
             # Execute function and cache result
+            get_telemetry().record_cache("fortigate_api", False)
             result = await func(*args, **kwargs)
             _cache[cache_key] = (result, datetime.now())
             
@@ -61,51 +73,20 @@ def cache_response(ttl_seconds: int = 60):
 
 
 async def get_connection_pool():
-    """Get or create the aiohttp connection pool."""
-    global _connector, _session
-    
-    if _connector is None:
-        # Create optimized connector with connection pooling
-        _connector = aiohttp.TCPConnector(
-            limit=100,  # Total connection pool size
-            limit_per_host=20,  # Connections per host
-            ttl_dns_cache=300,  # DNS cache TTL
-            use_dns_cache=True,
-            keepalive_timeout=30,  # Keep connections alive
-            enable_cleanup_closed=True
-        )
-        
-        # Create session with optimized timeouts
-        timeout = aiohttp.ClientTimeout(
+    """Get the shared FortiGate aiohttp session from the HTTP client registry."""
+    return await get_http_clients().get_async_session(
+        "fortigate",
+        timeout=aiohttp.ClientTimeout(
             total=30,  # Total timeout
             connect=10,  # Connection timeout
             sock_read=10  # Socket read timeout
-        )
-        
-        _session = aiohttp.ClientSession(
-            connector=_connector,
-            timeout=timeout,
-            headers={'User-Agent': 'FortiSwitch-Monitor/1.0'}
-        )
-        
-        logger.info("Created optimized aiohttp connection pool")
-    
-    return _session
+        ),
+    )
 
 
 async def close_connection_pool():
-    """Close the connection pool properly."""
-    global _connector, _session
-    
-    if _session:
-        await _session.close()
-        _session = None
-    
-    if _connector:
-        await _connector.close()
-        _connector = None
-    
-    logger.info("Closed aiohttp connection pool")
+    """Close the FortiGate connection pool properly."""
+    await get_http_clients().close_async("fortigate")
 
 
 def load_api_token() -> Optional[str]:
@@ -147,6 +128,16 @@ def load_api_token() -> Optional[str]:
         return None
 
 
+def default_fortigate_ip() -> str:
+    """FORTIGATE_HOST without the scheme."""
+    fortigate_host = os.getenv("FORTIGATE_HOST", "https://192.168.0.254")
+    if fortigate_host.startswith("https://"):
+        return fortigate_host[8:]
+    if fortigate_host.startswith("http://"):
+        return fortigate_host[7:]
+    return fortigate_host
+
+
 async def rate_limit():
     """Async rate limiting function."""
     global _last_api_call
@@ -172,19 +163,25 @@ async def fgt_api_async(
     Async FortiGate API helper with connection pooling and caching.
     Significantly faster than the original synchronous version.
     """
+    return await fgt_api_async_uncached(endpoint, api_token, fortigate_ip)
+
+
+async def fgt_api_async_uncached(
+    endpoint: str, 
+    api_token: Optional[str] = None, 
+    fortigate_ip: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Async FortiGate API helper that always hits the FortiGate.
+    Used by pollers that need fresh counters on every cycle.
+    """
     try:
         # Apply rate limiting
         await rate_limit()
         
         # Determine FortiGate IP
         if fortigate_ip is None:
-            fortigate_host = os.getenv("FORTIGATE_HOST", "https://192.168.0.254")
-            if fortigate_host.startswith("https://"):
-                fortigate_ip = fortigate_host[8:]
-            elif fortigate_host.startswith("http://"):
-                fortigate_ip = fortigate_host[7:]
-            else:
-                fortigate_ip = fortigate_host
+            fortigate_ip = default_fortigate_ip()
 
         # Try session-based authentication first
         if _auth_mode == "session":
@@ -200,7 +197,12 @@ async def fgt_api_async(
             if not api_token:
                 return {"error": "no_token", "message": "No API token available"}
 
-        return await _fgt_api_with_token_async(endpoint, api_token, fortigate_ip)
+        started = time.perf_counter()
+        result = await _fgt_api_with_token_async(endpoint, api_token, fortigate_ip)
+        get_telemetry().record_fortigate_call(
+            endpoint, time.perf_counter() - started, not (isinstance(result, dict) and "error" in result)
+        )
+        return result
 
     except Exception as e:
         logger.error(f"Unexpected error for {endpoint}: {e}")
@@ -223,15 +225,8 @@ async def _fgt_api_with_token_async(
 
         logger.debug(f"Making async API request to: {endpoint}")
 
-        # Use aiohttp session with connection pooling
-        if session is None:
-            session = await get_connection_pool()
-        
-        async with session.get(
-            url, 
-            headers=headers, 
-            ssl=False  # Equivalent to verify=False
-        ) as response:
+        # TLS settings (verification off for self-signed certs) come from the pool's SSLContext
+        async with session.get(url, headers=headers) as response:
             
             # Handle specific HTTP status codes
             if response.status == 401:
@@ -305,6 +300,71 @@ async def batch_api_calls(endpoints: List[str]) -> List[Dict[str, Any]]:
     return processed_results
 
 
+async def fgt_api_stream(
+    endpoint: str,
+    page_size: int = STREAM_PAGE_SIZE,
+    params: Optional[Dict[str, Any]] = None,
+    api_token: Optional[str] = None,
+    fortigate_ip: Optional[str] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield the rows of a monitor table, requesting it in start/count pages and
+    parsing each response body incrementally as it arrives. Memory stays bounded
+    by the row being decoded plus one network chunk, whatever the table size.
+    Raises FortiGateStreamError (the generator cannot return an error dict).
+    """
+    if fortigate_ip is None:
+        fortigate_ip = default_fortigate_ip()
+    if not api_token:
+        api_token = load_api_token()
+        if not api_token:
+            raise FortiGateStreamError({"error": "no_token", "message": "No API token available"})
+
+    session = await get_connection_pool()
+    headers = {"Authorization": f"Bearer {api_token}"}
+    # The pages of one table count as a single call for rate limiting
+    await rate_limit()
+
+    for page in range(STREAM_MAX_PAGES):
+        query = {**(params or {}), "start": page * page_size, "count": page_size}
+        url = f"https://{fortigate_ip}/api/v2/{endpoint}?{urlencode(query, safe='|,=')}"
+        parser = ResultsParser()
+        rows = 0
+        started = time.perf_counter()
+        ok = False
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status >= 400:
+                    logger.error(f"FortiGate API error {response.status} streaming {endpoint}")
+                    raise FortiGateStreamError({"error": "api_error", "status_code": response.status})
+                async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                    for row in parser.feed(chunk):
+                        rows += 1
+                        yield row
+                for row in parser.close():
+                    rows += 1
+                    yield row
+            if parser.meta.get("status") == "error":
+                raise FortiGateStreamError({"error": "api_error", "status_code": parser.meta.get("http_status")})
+            ok = True
+        except asyncio.TimeoutError as e:
+            logger.error(f"API request timeout streaming {endpoint}")
+            raise FortiGateStreamError({"error": "timeout"}) from e
+        except aiohttp.ClientError as e:
+            logger.error(f"Connection error streaming {endpoint}: {e}")
+            raise FortiGateStreamError({"error": "connection_error", "message": str(e)}) from e
+        except ValueError as e:
+            logger.error(f"Invalid JSON streaming {endpoint}: {e}")
+            raise FortiGateStreamError({"error": "json_decode_error", "message": str(e)}) from e
+        finally:
+            get_telemetry().record_fortigate_call(endpoint, time.perf_counter() - started, ok)
+
+        # A short page is the last one; so is one from an endpoint that ignores count=
+        if rows != page_size:
+            return
+    logger.warning(f"Stopped streaming {endpoint} after {STREAM_MAX_PAGES} pages")
+
+
 def process_interface_data(data: Dict[str, Any]) -> Dict[str, Any]:
     """Process interface data from API response (unchanged but more efficient)."""
     if not data or "error" in data:
@@ -358,12 +418,12 @@ async def get_interfaces_async() -> Dict[str, Any]:
 # Backward compatibility functions
 def fgt_api(endpoint: str, api_token: Optional[str] = None, fortigate_ip: Optional[str] = None) -> Dict[str, Any]:
     """Synchronous wrapper for backward compatibility."""
-    return asyncio.run(fgt_api_async(endpoint, api_token, fortigate_ip))
+    return run_async(fgt_api_async, endpoint, api_token, fortigate_ip)
 
 
 def get_interfaces() -> Dict[str, Any]:
     """Synchronous wrapper for backward compatibility."""
-    return asyncio.run(get_interfaces_async())
+    return run_async(get_interfaces_async)
 
 
 # Cleanup function for application shutdown
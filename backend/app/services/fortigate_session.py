@@ -5,8 +5,8 @@ import logging
 from typing import Dict, Any, Optional
 from datetime import datetime, timedelta
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from .http_clients import get_http_clients
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,7 +22,8 @@ class FortiGateSessionManager:
         self.fortigate_ip: Optional[str] = None
         self.username: Optional[str] = None
         self.password: Optional[str] = None
-        self.session = requests.Session()
+        # Keep-alive pool shared with other FortiGate clients
+        self.session = get_http_clients().get_sync_session("fortigate")
         self.session.verify = (
             False  # Disable SSL verification for self-signed certificates
         )
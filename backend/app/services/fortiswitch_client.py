@@ -0,0 +1,305 @@
+import os
+import time
+import asyncio
+import logging
+from collections.abc import Mapping
+from typing import Callable, Dict, Any, List, Optional
+
+import aiohttp
+
+from .fortiswitch_session import get_fortiswitch_session_manager
+from .http_clients import get_http_clients
+from .switch_snapshot import add_snapshot_enricher, get_cached_snapshot, republish_snapshot
+from app.utils.telemetry import get_telemetry, span
+
+logger = logging.getLogger(__name__)
+
+# Direct FortiSwitch polling configuration
+POLL_INTERVAL = float(os.environ.get("FORTISWITCH_DIRECT_POLL_INTERVAL", "60"))
+POLL_CONCURRENCY = int(os.environ.get("FORTISWITCH_POLL_CONCURRENCY", "16"))  # Requests in flight across all switches
+REQUEST_TIMEOUT = float(os.environ.get("FORTISWITCH_REQUEST_TIMEOUT", "10"))
+# Explicit management addresses: "S248EPTF1800001=10.10.0.2,S124...=10.10.0.3"
+FORTISWITCH_HOSTS = os.environ.get("FORTISWITCH_HOSTS", "")
+# Also poll the address the FortiGate reports for each switch (only useful when routable)
+USE_SNAPSHOT_ADDRESSES = os.environ.get("FORTISWITCH_USE_SNAPSHOT_ADDRESSES", "false").lower() == "true"
+
+# FortiSwitchOS monitor endpoints, keyed by the section they fill in each port's detail
+DETAIL_ENDPOINTS = {
+    "counters": "/api/v2/monitor/switch/port-statistics",
+    "poe": "/api/v2/monitor/switch/poe-status",
+    "transceiver": "/api/v2/monitor/switch/modules-detail",
+    "lldp": "/api/v2/monitor/switch/lldp-neighbors-detail",
+}
+PORT_KEYS = ("port", "interface", "local-port", "local_port", "name")
+
+
+def parse_hosts(value: str) -> Dict[str, str]:
+    """Parse FORTISWITCH_HOSTS ("serial=host,...") into {serial: base_url}."""
+    hosts = {}
+    for item in value.split(","):
+        serial, sep, host = item.strip().partition("=")
+        if not sep or not serial or not host:
+            continue
+        host = host.strip()
+        hosts[serial.strip()] = host if host.startswith(("http://", "https://")) else f"https://{host}"
+    return hosts
+
+
+def _by_port(results: Any, multi: bool = False) -> Dict[str, Any]:
+    """
+    Normalize a monitor response to {port: entry}. FortiSwitchOS returns either a
+    dict keyed by port or a list of entries naming their port; LLDP can report
+    several neighbors per port (multi=True keeps a list).
+    """
+    ports: Dict[str, Any] = {}
+    if isinstance(results, dict):
+        items = [(name, entry) for name, entry in results.items() if isinstance(entry, dict)]
+    elif isinstance(results, list):
+        items = []
+        for entry in results:
+            if not isinstance(entry, dict):
+                continue
+            name = next((entry[k] for k in PORT_KEYS if entry.get(k)), None)
+            if name is not None:
+                items.append((str(name), entry))
+    else:
+        return ports
+    for name, entry in items:
+        if multi:
+            ports.setdefault(name, []).append(entry)
+        else:
+            ports[name] = entry
+    return ports
+
+
+class FortiSwitchClient:
+    """
+    Async client for the FortiSwitchOS REST API on many switches at once.
+
+    All switches share the registry's "fortiswitch" connection pool (keep-alive and
+    TLS resumption per host) and one semaphore that bounds requests in flight, so a
+    poll of 50 switches x 4 endpoints runs as a steady stream of parallel requests.
+    """
+
+    def __init__(self, concurrency: int = POLL_CONCURRENCY, timeout: float = REQUEST_TIMEOUT):
+        # Same credentials (env / Docker secrets) as the sync session manager
+        credentials = get_fortiswitch_session_manager()
+        self.username = credentials.username
+        self.password = credentials.password
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.username and self.password)
+
+    async def get(self, base_url: str, endpoint: str) -> Dict[str, Any]:
+        """GET one endpoint; returns the JSON body or {"error": ...} like the other API helpers."""
+        session = await get_http_clients().get_async_session("fortiswitch")
+        url = f"{base_url.rstrip('/')}{endpoint}"
+        started = time.perf_counter()
+        ok = False
+        try:
+            async with self._semaphore:
+                async with session.get(
+                    url, auth=aiohttp.BasicAuth(self.username, self.password), timeout=self.timeout
+                ) as response:
+                    if response.status == 401:
+                        return {"error": "unauthorized", "status_code": 401}
+                    if response.status >= 400:
+                        return {"error": "api_error", "status_code": response.status}
+                    data = await response.json(content_type=None)
+                    ok = True
+                    return data if isinstance(data, dict) else {"results": data}
+        except asyncio.TimeoutError:
+            return {"error": "timeout"}
+        except aiohttp.ClientError as e:
+            return {"error": "connection_error", "message": str(e)}
+        finally:
+            get_telemetry().observe(
+                "fortiswitch_api_request_duration_seconds", time.perf_counter() - started, endpoint
+            )
+            get_telemetry().increment("fortiswitch_api_requests_total", endpoint, "ok" if ok else "error")
+
+    async def poll_switch(self, serial: str, base_url: str) -> Dict[str, Any]:
+        """Fetch every detail endpoint of one switch concurrently and group the results by port."""
+        started = time.monotonic()
+        sections = list(DETAIL_ENDPOINTS.items())
+        responses = await asyncio.gather(*(self.get(base_url, endpoint) for _section, endpoint in sections))
+
+        ports: Dict[str, Dict[str, Any]] = {}
+        errors: Dict[str, str] = {}
+        for (section, _endpoint), data in zip(sections, responses):
+            if "error" in data:
+                errors[section] = data["error"]
+                continue
+            for port, entry in _by_port(data.get("results"), multi=section == "lldp").items():
+                ports.setdefault(port, {})[section] = entry
+
+        return {
+            "serial": serial,
+            "host": base_url,
+            "polled_at": time.time(),
+            "duration": round(time.monotonic() - started, 3),
+            "ports": ports,
+            "errors": errors,
+        }
+
+    async def poll_all(self, targets: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+        """Poll all targets ({serial: base_url}) in parallel."""
+        results = await asyncio.gather(
+            *(self.poll_switch(serial, url) for serial, url in targets.items()), return_exceptions=True
+        )
+        details = {}
+        for serial, result in zip(targets, results):
+            if isinstance(result, Exception):
+                logger.error(f"Direct poll of FortiSwitch {serial} failed: {result}")
+                continue
+            details[serial] = result
+        return details
+
+
+def merge_port_details(switches: List[Mapping], details: Dict[str, Dict[str, Any]]) -> List[Mapping]:
+    """
+    Copy-on-write merge of direct-poll results into a switch list (dicts or
+    snapshot records): switches with details get new switch/port dicts carrying a
+    "detail" section per port; the input (possibly shared with an older snapshot)
+    is left untouched.
+    """
+    if not details:
+        return switches
+    merged = []
+    for switch in switches:
+        detail = details.get(switch.get("serial")) if isinstance(switch, Mapping) else None
+        if detail is None:
+            merged.append(switch)
+            continue
+        port_details = detail["ports"]
+        ports = [
+            {**port, "detail": port_details[port.get("name")]}
+            if isinstance(port, Mapping) and port.get("name") in port_details else port
+            for port in switch.get("ports", []) or []
+        ]
+        merged.append({
+            **switch,
+            "ports": ports,
+            "direct_poll": {"polled_at": detail["polled_at"], "errors": detail["errors"]},
+        })
+    return merged
+
+
+class FortiSwitchPoller:
+    """Background task polling switches directly and folding the results into the switch snapshot."""
+
+    def __init__(self, interval: float = POLL_INTERVAL, client_factory: Callable[[], FortiSwitchClient] = FortiSwitchClient):
+        self.interval = interval
+        self._client_factory = client_factory
+        self.client: Optional[FortiSwitchClient] = None
+        self.details: Dict[str, Dict[str, Any]] = {}
+        self.static_hosts = parse_hosts(FORTISWITCH_HOSTS)
+        self._task: Optional[asyncio.Task] = None
+        self.poll_count = 0
+        self.last_poll_time = 0.0
+        self.last_poll_duration = 0.0
+        add_snapshot_enricher(self.enrich)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def targets(self) -> Dict[str, str]:
+        targets: Dict[str, str] = {}
+        snapshot = get_cached_snapshot()
+        if USE_SNAPSHOT_ADDRESSES and snapshot is not None:
+            for switch in snapshot.switches:
+                ip = switch.get("ip")
+                if switch.get("serial") and ip and ip != "Unknown":
+                    targets[switch["serial"]] = f"https://{ip}"
+        targets.update(self.static_hosts)
+        return targets
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.client = self._client_factory()
+        if not self.client.configured:
+            logger.warning("FortiSwitch credentials not configured; direct switch polling disabled")
+            return
+        self._task = asyncio.create_task(self._run(), name="fortiswitch-poller")
+        logger.info(f"FortiSwitch direct poller started (interval {self.interval}s, concurrency {POLL_CONCURRENCY})")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("FortiSwitch direct poller stopped")
+
+    async def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error polling FortiSwitches directly: {e}")
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(max(0.0, self.interval - elapsed))
+
+    async def poll_once(self, targets: Optional[Dict[str, str]] = None) -> int:
+        """Poll every target once and republish the snapshot with the new details."""
+        targets = targets if targets is not None else self.targets()
+        if not targets:
+            logger.debug("No FortiSwitch management addresses to poll")
+            return 0
+        if self.client is None:
+            self.client = self._client_factory()
+        started = time.monotonic()
+        with span("poll", pipeline="fortiswitch_direct", switches=len(targets)):
+            self.details = await self.client.poll_all(targets)
+            republish_snapshot()
+        self.poll_count += 1
+        self.last_poll_time = time.time()
+        self.last_poll_duration = time.monotonic() - started
+        failed = sum(1 for d in self.details.values() if d["errors"])
+        logger.info(
+            f"Polled {len(self.details)}/{len(targets)} FortiSwitches directly in "
+            f"{self.last_poll_duration:.2f}s ({failed} with errors)"
+        )
+        return len(self.details)
+
+    def enrich(self, switches: List[Mapping]) -> List[Mapping]:
+        """Snapshot enricher: attach the latest per-port details."""
+        return merge_port_details(switches, self.details)
+
+    def switch_detail(self, serial: str) -> Optional[Dict[str, Any]]:
+        return self.details.get(serial)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "targets": len(self.targets()),
+            "switches_polled": len(self.details),
+            "switches_with_errors": sorted(s for s, d in self.details.items() if d["errors"]),
+            "poll_count": self.poll_count,
+            "last_poll_time": self.last_poll_time,
+            "last_poll_duration": round(self.last_poll_duration, 3),
+        }
+
+
+# Global poller instance
+_fortiswitch_poller = None
+
+
+def get_fortiswitch_poller() -> FortiSwitchPoller:
+    """Get the global direct FortiSwitch poller instance"""
+    global _fortiswitch_poller
+    if _fortiswitch_poller is None:
+        _fortiswitch_poller = FortiSwitchPoller()
+    return _fortiswitch_poller
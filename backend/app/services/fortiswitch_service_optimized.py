@@ -3,14 +3,17 @@ import logging
 import time
 import asyncio
 import re
-from typing import Dict, Any, List, Optional
-from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 from urllib3.exceptions import InsecureRequestWarning
 import urllib3
 
 from app.utils import oui_lookup
+from app.utils.blocking import call_async
+from app.utils.oui_cache import get_oui_cache
+from app.utils.projection import Projection
 from app.utils.restaurant_device_classifier import enhance_device_info
-from .fortigate_service_optimized import fgt_api_async, batch_api_calls
+from app.utils.telemetry import get_telemetry
+from .fortigate_service_optimized import FortiGateStreamError, batch_api_calls, fgt_api_async, fgt_api_stream
 
 # Suppress only the InsecureRequestWarning from urllib3
 urllib3.disable_warnings(InsecureRequestWarning)
@@ -19,20 +22,63 @@ logger = logging.getLogger(__name__)
 
 # Environment/defaults
 FORTIGATE_HOST = os.environ.get("FORTIGATE_HOST", "https://192.168.0.254")
+# Page, hash and diff the big monitor tables instead of rebuilding all maps every refresh
+DELTA_POLLING_ENABLED = os.environ.get("FORTIGATE_DELTA_POLLING", "true").lower() == "true"
+OUI_PREFETCH_BATCH = 1000  # Streamed detected devices resolved per batch
+
+# Fields the map builders and aggregate_port_devices_optimized read from the big
+# monitor tables, with their defaults. Only these are requested (format=) and kept.
+DETECTED_DEVICE = Projection(
+    "DetectedDevice",
+    "monitor/switch-controller/detected-device",
+    {"mac": None, "switch_id": None, "port_name": None, "port_id": 0, "vlan_id": "N/A", "last_seen": 0},
+    computed={"manufacturer": "Unknown"},
+)
+DHCP_LEASE = Projection(
+    "DhcpLease",
+    "monitor/system/dhcp",
+    {
+        "mac": None,
+        "ip": "Unknown",
+        "hostname": "",
+        "interface": "",
+        "expire_time": 0,
+        "status": "unknown",
+        "vci": "",
+        "type": "ipv4",
+    },
+)
+ARP_ENTRY = Projection(
+    "ArpEntry",
+    "monitor/system/arp",
+    {"mac": None, "ip": "Unknown", "interface": "", "age": 0},
+)
 
 # Optimized MAC address regex pattern (compiled once for performance)
 MAC_PATTERN = re.compile(r'^([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})$')
 MAC_NORMALIZE_PATTERN = re.compile(r'[^0-9A-Fa-f]')
 
-# Cache for OUI lookups to avoid repeated API calls
-@lru_cache(maxsize=1000)
+def _resolve_manufacturer(mac_prefix: str) -> Optional[str]:
+    return oui_lookup.get_manufacturer_from_mac(mac_prefix)
+
+
 def cached_oui_lookup(mac_prefix: str) -> str:
-    """Cached OUI lookup to avoid repeated API calls for same manufacturers."""
-    try:
-        result = oui_lookup.get_manufacturer_from_mac(mac_prefix)
-        return result if result is not None else "Unknown"
-    except Exception:
-        return "Unknown"
+    """OUI lookup through the persistent cache shared by all workers."""
+    return get_oui_cache().lookup(mac_prefix, _resolve_manufacturer)
+
+
+def prefetch_manufacturers(detected_data: Dict[str, Any]) -> int:
+    """Resolve every MAC prefix in a detected-device response (raw or projected rows) in one batch."""
+    results = detected_data.get("results", []) if isinstance(detected_data, dict) else []
+    prefixes = {
+        device.mac[:8]
+        for device in DETECTED_DEVICE.project_all(results)
+        if isinstance(device.mac, str)
+    }
+    return get_oui_cache().prefetch(prefixes, _resolve_manufacturer)
+
+
+get_telemetry().register_cache_info("oui_lookup", get_oui_cache().cache_info)
 
 
 def normalize_mac_optimized(mac: str) -> Optional[str]:
@@ -93,7 +139,60 @@ async def get_all_fortiswitch_data() -> Dict[str, Any]:
     }
 
 
-def build_dhcp_map_optimized(dhcp_data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+async def get_fortiswitch_data_delta() -> Dict[str, Any]:
+    """
+    Switch status plus DHCP/ARP/detected-device maps kept current by the delta
+    poller, which only processes rows that changed since the previous refresh.
+    """
+    from .fortigate_delta import get_delta_poller
+
+    switches, maps = await asyncio.gather(
+        fgt_api_async("monitor/switch-controller/managed-switch/status"),
+        get_delta_poller().poll(),
+    )
+    return {"switches": switches, **maps}
+
+
+def _dhcp_entry(entry: Any) -> Optional[Tuple[str, tuple]]:
+    """(normalized MAC, DhcpLease) for one lease, or None if it has no MAC."""
+    lease = DHCP_LEASE.project(entry)
+    if lease is None or not lease.mac or not isinstance(lease.mac, str):
+        return None
+    mac = normalize_mac_optimized(lease.mac)
+    if not mac:
+        return None
+    return mac, lease
+
+
+def _arp_entry(entry: Any) -> Optional[Tuple[str, tuple]]:
+    """(normalized MAC, ArpEntry) for one entry, or None if it has no MAC."""
+    arp = ARP_ENTRY.project(entry)
+    if arp is None or not arp.mac or not isinstance(arp.mac, str):
+        return None
+    mac = normalize_mac_optimized(arp.mac)
+    if not mac:
+        return None
+    return mac, arp
+
+
+def _detected_entry(entry: Any) -> Optional[Tuple[str, tuple]]:
+    """("switch:port", DetectedDevice) with normalized MAC and manufacturer filled in."""
+    device = DETECTED_DEVICE.project(entry)
+    if device is None or not device.switch_id or not device.port_name:
+        return None
+
+    if device.mac and isinstance(device.mac, str):
+        normalized_mac = normalize_mac_optimized(device.mac)
+        if normalized_mac:
+            # Use cached OUI lookup for performance
+            device = device._replace(
+                mac=normalized_mac,  # Use normalized MAC
+                manufacturer=cached_oui_lookup(normalized_mac[:8]),  # First 3 octets
+            )
+    return f"{device.switch_id}:{device.port_name}", device
+
+
+def build_dhcp_map_optimized(dhcp_data: Dict[str, Any]) -> Dict[str, tuple]:
     """
     Optimized DHCP map building with better error handling and performance.
     """
@@ -106,32 +205,16 @@ def build_dhcp_map_optimized(dhcp_data: Dict[str, Any]) -> Dict[str, Dict[str, A
     results = dhcp_data.get("results", [])
     logger.info(f"Processing {len(results)} DHCP entries")
 
-    # Use list comprehension and batch processing for better performance
-    valid_entries = [
-        entry for entry in results 
-        if isinstance(entry, dict) and entry.get("mac")
-    ]
-    
-    for entry in valid_entries:
-        mac_raw = entry.get("mac")
-        if mac_raw and isinstance(mac_raw, str):
-            mac = normalize_mac_optimized(mac_raw)
-            if mac:
-                dhcp_map[mac] = {
-                    "ip": entry.get("ip", "Unknown"),
-                    "hostname": entry.get("hostname", ""),
-                    "interface": entry.get("interface", ""),
-                    "expire_time": entry.get("expire_time", 0),
-                    "status": entry.get("status", "unknown"),
-                    "vci": entry.get("vci", ""),
-                    "type": entry.get("type", "ipv4"),
-                }
+    for entry in results:
+        item = _dhcp_entry(entry)
+        if item is not None:
+            dhcp_map[item[0]] = item[1]
 
     logger.info(f"Built optimized DHCP map for {len(dhcp_map)} devices")
     return dhcp_map
 
 
-def build_arp_map_optimized(arp_data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+def build_arp_map_optimized(arp_data: Dict[str, Any]) -> Dict[str, tuple]:
     """
     Optimized ARP map building with better performance.
     """
@@ -144,28 +227,16 @@ def build_arp_map_optimized(arp_data: Dict[str, Any]) -> Dict[str, Dict[str, Any
     results = arp_data.get("results", [])
     logger.info(f"Processing {len(results)} ARP entries")
 
-    # Batch process valid entries
-    valid_entries = [
-        entry for entry in results 
-        if isinstance(entry, dict) and entry.get("mac")
-    ]
-
-    for entry in valid_entries:
-        mac_raw = entry.get("mac")
-        if mac_raw and isinstance(mac_raw, str):
-            mac = normalize_mac_optimized(mac_raw)
-            if mac:
-                arp_map[mac] = {
-                    "ip": entry.get("ip", "Unknown"),
-                    "interface": entry.get("interface", ""),
-                    "age": entry.get("age", 0),
-                }
+    for entry in results:
+        item = _arp_entry(entry)
+        if item is not None:
+            arp_map[item[0]] = item[1]
 
     logger.info(f"Built optimized ARP map for {len(arp_map)} devices")
     return arp_map
 
 
-def build_detected_device_map_optimized(detected_data: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+def build_detected_device_map_optimized(detected_data: Dict[str, Any]) -> Dict[str, List[tuple]]:
     """
     Optimized detected device map building with caching and performance improvements.
     """
@@ -180,42 +251,93 @@ def build_detected_device_map_optimized(detected_data: Dict[str, Any]) -> Dict[s
 
     # Batch process and add manufacturer info with caching
     for device in results:
-        if not isinstance(device, dict):
-            continue
-
-        switch_id = device.get("switch_id")
-        port_name = device.get("port_name")
-        mac = device.get("mac")
-
-        if switch_id and port_name:
-            key = f"{switch_id}:{port_name}"
-            
-            # Add cached manufacturer lookup
-            if mac and isinstance(mac, str):
-                normalized_mac = normalize_mac_optimized(mac)
-                if normalized_mac:
-                    # Use cached OUI lookup for performance
-                    manufacturer = cached_oui_lookup(normalized_mac[:8])  # First 3 octets
-                    device["manufacturer"] = manufacturer
-                    device["mac"] = normalized_mac  # Use normalized MAC
-            
-            if key not in detected_map:
-                detected_map[key] = []
-            detected_map[key].append(device)
+        item = _detected_entry(device)
+        if item is not None:
+            detected_map.setdefault(item[0], []).append(item[1])
 
     logger.info(f"Built optimized detected device map for {len(detected_map)} port combinations")
     return detected_map
 
 
-def aggregate_port_devices_optimized(
-    switch_serial: str, 
-    port_name: str, 
-    detected_map: Dict[str, List[Dict[str, Any]]], 
-    dhcp_map: Dict[str, Dict[str, Any]], 
-    arp_map: Dict[str, Dict[str, Any]]
+async def build_maps_streaming() -> Dict[str, Any]:
+    """
+    Build the DHCP, ARP and detected-device maps straight from streamed pages
+    (fgt_api_stream): rows go into the maps as they are parsed, so the raw tables
+    are never held in memory. A table that fails to stream yields an empty map,
+    like an error response does in the build_*_map_optimized functions.
+    """
+    dhcp_map: Dict[str, tuple] = {}
+    arp_map: Dict[str, tuple] = {}
+    detected_map: Dict[str, List[tuple]] = {}
+
+    async def stream(name: str, projection: Projection, handle) -> None:
+        rows = 0
+        try:
+            async for row in fgt_api_stream(projection.endpoint, params=projection.params()):
+                row = projection.project(row)  # Pack right after parsing
+                if row is not None:
+                    await handle(row)
+                    rows += 1
+        except FortiGateStreamError as e:
+            logger.warning(f"Streaming {name} failed after {rows} rows: {e}")
+            return
+        logger.info(f"Streamed {rows} {name} entries")
+
+    async def handle_dhcp(row):
+        item = _dhcp_entry(row)
+        if item is not None:
+            dhcp_map[item[0]] = item[1]
+
+    async def handle_arp(row):
+        item = _arp_entry(row)
+        if item is not None:
+            arp_map[item[0]] = item[1]
+
+    pending: List[tuple] = []
+
+    async def flush_detected():
+        # Resolve the batch's manufacturers together, off the loop
+        await asyncio.to_thread(prefetch_manufacturers, {"results": pending})
+        for device in pending:
+            item = _detected_entry(device)
+            if item is not None:
+                detected_map.setdefault(item[0], []).append(item[1])
+        pending.clear()
+
+    async def handle_detected(row):
+        pending.append(row)
+        if len(pending) >= OUI_PREFETCH_BATCH:
+            await flush_detected()
+
+    await asyncio.gather(
+        stream("DHCP", DHCP_LEASE, handle_dhcp),
+        stream("ARP", ARP_ENTRY, handle_arp),
+        stream("detected device", DETECTED_DEVICE, handle_detected),
+    )
+    if pending:
+        await flush_detected()
+    return {"dhcp_map": dhcp_map, "arp_map": arp_map, "detected_map": detected_map}
+
+
+async def get_fortiswitch_data_streaming() -> Dict[str, Any]:
+    """Switch status plus maps built from streamed monitor tables."""
+    switches, maps = await asyncio.gather(
+        fgt_api_async("monitor/switch-controller/managed-switch/status"),
+        build_maps_streaming(),
+    )
+    return {"switches": switches, **maps}
+
+
+def port_device_rows(
+    switch_serial: str,
+    port_name: str,
+    detected_map: Dict[str, List[tuple]],
+    dhcp_map: Dict[str, tuple],
+    arp_map: Dict[str, tuple]
 ) -> List[Dict[str, Any]]:
     """
-    Optimized device aggregation with reduced redundant processing.
+    Join one port's detected devices with their DHCP lease and ARP entry
+    (the pipeline's join stage; enrichment happens afterwards).
     """
     port_key = f"{switch_serial}:{port_name}"
     detected_devices = detected_map.get(port_key, [])
@@ -229,161 +351,66 @@ def aggregate_port_devices_optimized(
     
     # Process devices with optimized lookups
     for device in detected_devices:
-        mac = device.get("mac")  # Already normalized in build_detected_device_map_optimized
+        mac = device.mac  # Already normalized in build_detected_device_map_optimized
         if not mac:
             continue
 
         # Fast dictionary lookups (O(1) vs O(n) list searches)
-        dhcp_info = dhcp_map.get(mac, {})
-        arp_info = arp_map.get(mac, {})
+        dhcp_info = dhcp_map.get(mac)
+        arp_info = arp_map.get(mac)
 
         # Determine device name/hostname with fallback
-        hostname = (dhcp_info.get("hostname") or 
+        hostname = ((dhcp_info and dhcp_info.hostname) or 
                    f"Device-{port_name[-2:]}-{mac[-5:].replace(':', '')}")
 
         # Determine IP address with priority
-        ip_address = dhcp_info.get("ip") or arp_info.get("ip", "Unknown")
+        ip_address = (dhcp_info and dhcp_info.ip) or (arp_info.ip if arp_info else "Unknown")
 
-        # Get pre-cached manufacturer info
-        manufacturer = device.get("manufacturer", "Unknown")
-
-        device_info = {
+        devices.append({
             "device_mac": mac,
             "device_ip": ip_address,
             "device_name": hostname,
             "device_type": hostname,
-            "manufacturer": manufacturer,
+            "manufacturer": device.manufacturer,  # Pre-cached OUI lookup
             "source": "switch_controller_detected",
-            "vlan": device.get("vlan_id", "N/A"),
-            "last_seen": device.get("last_seen", 0),
-            "port_id": device.get("port_id", 0),
-            "dhcp_status": dhcp_info.get("status", "unknown"),
-            "dhcp_interface": dhcp_info.get("interface", ""),
-            "vci": dhcp_info.get("vci", ""),
-        }
-
-        # Enhance with restaurant technology classification (cached internally)
-        enhanced_device_info = enhance_device_info(device_info)
-        devices.append(enhanced_device_info)
+            "vlan": device.vlan_id,
+            "last_seen": device.last_seen,
+            "port_id": device.port_id,
+            "dhcp_status": dhcp_info.status if dhcp_info else "unknown",
+            "dhcp_interface": dhcp_info.interface if dhcp_info else "",
+            "vci": dhcp_info.vci if dhcp_info else "",
+        })
 
     logger.debug(f"Port {port_name}: Processed {len(devices)} devices")
     return devices
 
 
+def aggregate_port_devices_optimized(
+    switch_serial: str, 
+    port_name: str, 
+    detected_map: Dict[str, List[tuple]], 
+    dhcp_map: Dict[str, tuple], 
+    arp_map: Dict[str, tuple]
+) -> List[Dict[str, Any]]:
+    """Joined device rows for one port, enhanced with restaurant technology classification."""
+    return [
+        enhance_device_info(device_info)
+        for device_info in port_device_rows(switch_serial, port_name, detected_map, dhcp_map, arp_map)
+    ]
+
+
 async def get_fortiswitches_optimized() -> List[Dict[str, Any]]:
     """
     Highly optimized FortiSwitch discovery with parallel API calls and caching.
-    
-    Performance improvements:
-    - 60-75% faster API data collection (parallel vs sequential)
-    - 10x faster MAC address processing (regex vs string ops)
-    - 50% less memory usage (optimized data structures)
-    - Cached OUI lookups (avoid repeated API calls)
-    - Reduced redundant processing
+    Reads the shared switch snapshot, rebuilt by the switch pipeline when older
+    than its TTL (concurrent callers share one run).
     
     Returns: List of FortiSwitch dictionaries with detailed port and device info.
     """
-    logger.info("=== Starting OPTIMIZED FortiSwitch discovery ===")
-    total_start_time = time.time()
-
-    try:
-        # Step 1: Fetch all data in parallel (MAJOR PERFORMANCE GAIN)
-        logger.info("--- Fetching all data in parallel ---")
-        all_data = await get_all_fortiswitch_data()
-        
-        # Step 2: Build optimized lookup maps
-        logger.info("--- Building optimized lookup maps ---")
-        map_start_time = time.time()
-        
-        dhcp_map = build_dhcp_map_optimized(all_data["dhcp"])
-        arp_map = build_arp_map_optimized(all_data["arp"])
-        detected_map = build_detected_device_map_optimized(all_data["detected_devices"])
-        
-        map_elapsed = time.time() - map_start_time
-        logger.info(f"Built lookup maps in {map_elapsed:.2f}s - DHCP: {len(dhcp_map)}, ARP: {len(arp_map)}, Detected: {len(detected_map)}")
-
-        # Step 3: Process switches with optimized aggregation
-        switches = []
-        switches_data = all_data["switches"]
-        switch_results = switches_data.get("results", []) if isinstance(switches_data, dict) else []
-
-        if not switch_results:
-            logger.error("No managed switches found in FortiGate response")
-            return []
-
-        logger.info(f"--- Processing {len(switch_results)} switches ---")
-        process_start_time = time.time()
-
-        for switch_data in switch_results:
-            if not isinstance(switch_data, dict):
-                continue
-
-            switch_serial = switch_data.get("serial", "Unknown")
-            switch_name = switch_data.get("switch-id", switch_serial)
-
-            logger.debug(f"Processing switch: {switch_name}")
-
-            # Process ports with optimized aggregation
-            ports = []
-            ports_data = switch_data.get("ports", [])
-
-            for port_data in ports_data:
-                if not isinstance(port_data, dict):
-                    continue
-
-                port_name = port_data.get("interface", "Unknown")
-
-                # Use optimized device aggregation
-                connected_devices = aggregate_port_devices_optimized(
-                    switch_serial, port_name, detected_map, dhcp_map, arp_map
-                )
-
-                port_info = {
-                    "name": port_name,
-                    "status": port_data.get("status", "Unknown"),
-                    "speed": port_data.get("speed", 0),
-                    "duplex": port_data.get("duplex", "Unknown"),
-                    "vlan": port_data.get("vlan", "Unknown"),
-                    "poe_capable": port_data.get("poe_capable", False),
-                    "poe_status": port_data.get("poe_status", "disabled"),
-                    "fortilink_port": port_data.get("fortilink_port", False),
-                    "connected_devices": connected_devices,
-                }
-
-                ports.append(port_info)
-
-            # Build optimized switch object
-            switch_info = {
-                "name": switch_name,
-                "serial": switch_serial,
-                "model": switch_data.get("model", "Unknown"),
-                "status": switch_data.get("status", "Unknown"),
-                "version": switch_data.get("os_version", "Unknown"),
-                "ip": switch_data.get("connecting_from", "Unknown"),
-                "uptime": switch_data.get("uptime", 0),
-                "ports": ports,
-                "total_ports": len(ports),
-                "active_ports": len([p for p in ports if p["status"] == "up"]),
-                "connected_devices_count": sum(len(p["connected_devices"]) for p in ports),
-            }
-
-            switches.append(switch_info)
-
-        process_elapsed = time.time() - process_start_time
-        total_elapsed = time.time() - total_start_time
-        
-        # Performance summary
-        total_devices = sum(s["connected_devices_count"] for s in switches)
-        logger.info(f"=== OPTIMIZED FortiSwitch discovery completed ===")
-        logger.info(f"Total time: {total_elapsed:.2f}s (vs 15-30s original)")
-        logger.info(f"Found {len(switches)} switches with {total_devices} total devices")
-        logger.info(f"Performance: {total_devices/total_elapsed:.1f} devices/second")
-
-        return switches
-
-    except Exception as e:
-        logger.error(f"Error in optimized FortiSwitch discovery: {e}")
-        return []
+    from .fortiswitch_service import switch_dicts
+    from .switch_pipeline import get_switch_pipeline
+
+    return switch_dicts(await get_switch_pipeline().snapshot())
 
 
 # Backward compatibility function
@@ -393,5 +420,5 @@ async def get_fortiswitches_enhanced():
 
 
 def get_fortiswitches():
-    """Synchronous wrapper for backward compatibility."""
-    return asyncio.run(get_fortiswitches_optimized())
\ No newline at end of file
+    """Synchronous wrapper for backward compatibility (runs on the application loop when there is one)."""
+    return call_async(get_fortiswitches_optimized)
\ No newline at end of file
@@ -5,6 +5,8 @@ from typing import Dict, Any, Optional
 from datetime import datetime, timedelta
 import urllib3
 
+from .http_clients import get_http_clients
+
 # Suppress only the InsecureRequestWarning from urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -21,8 +23,10 @@ class FortiSwitchSessionManager:
         self.fortiswitch_host: Optional[str] = None
         self.username: Optional[str] = None
         self.password: Optional[str] = None
-        self.session = requests.Session()
+        # Keep-alive pool shared with other FortiSwitch clients
+        self.session = get_http_clients().get_sync_session("fortiswitch")
         self.session.verify = False  # Disable SSL verification by default
+        self._ssl_warning_logged = False  # Warn once per manager, not on every call
 
         # Load credentials
         self._load_credentials()
@@ -88,9 +92,10 @@ class FortiSwitchSessionManager:
             auth = (self.username, self.password)
             verify_ssl_str = os.environ.get("FORTISWITCH_VERIFY_SSL", "false").lower()
             verify_ssl = verify_ssl_str == "true"
-            if not verify_ssl:
+            if not verify_ssl and not self._ssl_warning_logged:
+                self._ssl_warning_logged = True
                 logger.warning(
-                    f"SSL verification disabled for FortiSwitch API ({url}). Set FORTISWITCH_VERIFY_SSL=true to enable."
+                    f"SSL verification disabled for FortiSwitch API ({self.fortiswitch_host}). Set FORTISWITCH_VERIFY_SSL=true to enable."
                 )
 
             logger.info(f"Making FortiSwitch API request to: {url}")
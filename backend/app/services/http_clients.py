@@ -0,0 +1,280 @@
+import os
+import ssl
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from .connection_metrics import create_client_context, get_connection_metrics
+from app.utils.blocking import warn_if_blocking
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration
+HTTP_POOL_LIMIT = int(os.environ.get("HTTP_POOL_LIMIT", "100"))  # Total async connections per target
+HTTP_KEEPALIVE_TIMEOUT = float(os.environ.get("HTTP_KEEPALIVE_TIMEOUT", "60"))  # Idle keep-alive seconds
+HTTP_DNS_CACHE_TTL = int(os.environ.get("HTTP_DNS_CACHE_TTL", "300"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_TOTAL_TIMEOUT = float(os.environ.get("HTTP_TOTAL_TIMEOUT", "30"))
+USER_AGENT = "FortiSwitch-Monitor/1.0"
+
+# Connections per host for each outbound target (async limit_per_host / sync pool_maxsize)
+TARGET_LIMITS: Dict[str, int] = {
+    "fortigate": int(os.environ.get("HTTP_FORTIGATE_CONNECTIONS", "20")),
+    "fortiswitch": int(os.environ.get("HTTP_FORTISWITCH_CONNECTIONS", "10")),
+    "power_automate": int(os.environ.get("HTTP_POWER_AUTOMATE_CONNECTIONS", "5")),
+}
+DEFAULT_TARGET_LIMIT = 10
+
+# FortiGate/FortiSwitch use self-signed certificates unless verification is enabled
+TARGET_VERIFY_ENV = {
+    "fortigate": "FORTIGATE_VERIFY_SSL",
+    "fortiswitch": "FORTISWITCH_VERIFY_SSL",
+}
+
+
+def _verify_enabled(target: str) -> bool:
+    env = TARGET_VERIFY_ENV.get(target)
+    if env is None:
+        return True
+    return os.environ.get(env, "false").lower() == "true"
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter using the target's resuming SSLContext and recording per-host metrics."""
+
+    def __init__(self, ssl_context: ssl.SSLContext, **kwargs):
+        self._ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["ssl_context"] = self._ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        host = urlsplit(request.url).hostname
+        warn_if_blocking(f"requests {request.method} {host}")
+        started = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except Exception:
+            get_connection_metrics().record_error(host)
+            raise
+        # The adapter returns once the headers are parsed (the body is read later by the
+        # Session), so this is time to first byte. response.elapsed is only set by
+        # Session.send after the adapter returns and cannot be used here.
+        get_connection_metrics().record_request(host, time.perf_counter() - started)
+        return response
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    """aiohttp tracing hooks feeding time-to-first-byte into the connection metrics."""
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context, params):
+        context.started = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        # Fired once the response headers have arrived
+        get_connection_metrics().record_request(params.url.host, time.perf_counter() - context.started)
+
+    async def on_request_exception(session, context, params):
+        get_connection_metrics().record_error(params.url.host)
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+    return trace
+
+
+class HTTPClientRegistry:
+    """
+    Owns every outbound HTTP connection pool, keyed by target (fortigate,
+    fortiswitch, power_automate, ...).
+
+    Async callers share one aiohttp ClientSession per target, with keep-alive, a DNS
+    cache, per-host limits and a single SSLContext. Sync callers get their own
+    requests.Session (cookies and auth stay separate) but every session for a target
+    mounts the same HTTPAdapter, so the underlying urllib3 connection pool is shared.
+    Either way, repeated calls reuse warm TCP+TLS connections instead of handshaking
+    each time, and new connections resume the previous TLS session. Pools are created
+    lazily and closed together from the app lifespan.
+    """
+
+    def __init__(self):
+        self._async_sessions: Dict[str, Tuple[aiohttp.ClientSession, asyncio.AbstractEventLoop]] = {}
+        self._ssl_contexts: Dict[str, ssl.SSLContext] = {}
+        self._adapters: Dict[str, HTTPAdapter] = {}
+        self._lock = threading.Lock()
+
+    def limit_for(self, target: str) -> int:
+        return TARGET_LIMITS.get(target, DEFAULT_TARGET_LIMIT)
+
+    def ssl_context(self, target: str) -> ssl.SSLContext:
+        """One resuming SSLContext per target, shared by its sync and async pools."""
+        with self._lock:
+            context = self._ssl_contexts.get(target)
+            if context is None:
+                context = self._ssl_contexts[target] = create_client_context(_verify_enabled(target))
+            return context
+
+    # --- Async (aiohttp) ---
+
+    async def get_async_session(
+        self,
+        target: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+    ) -> aiohttp.ClientSession:
+        """Shared aiohttp session for target, bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        existing = self._async_sessions.get(target)
+        if existing is not None:
+            session, session_loop = existing
+            if not session.closed and session_loop is loop:
+                return session
+            # Sessions are loop-bound; sync wrappers using asyncio.run() get their own
+            logger.debug(f"Replacing {target} HTTP session from a different or closed event loop")
+            self._discard_async_session(target, session, session_loop)
+
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=self.limit_for(target),
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            use_dns_cache=True,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            enable_cleanup_closed=True,
+            ssl=self.ssl_context(target),
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout or aiohttp.ClientTimeout(total=HTTP_TOTAL_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            headers={"User-Agent": USER_AGENT, **(headers or {})},
+            trace_configs=[_trace_config()],
+        )
+        self._async_sessions[target] = (session, loop)
+        logger.info(f"Created {target} HTTP connection pool (limit per host {self.limit_for(target)})")
+        return session
+
+    def _discard_async_session(
+        self, target: str, session: aiohttp.ClientSession, session_loop: asyncio.AbstractEventLoop
+    ) -> None:
+        """Release a session owned by another event loop so its connector and sockets are not leaked."""
+        if session.closed:
+            return
+        if session_loop.is_running():
+            # Its loop is still alive (another thread): close it there
+            asyncio.run_coroutine_threadsafe(session.close(), session_loop)
+            return
+        # The loop is gone, so close() cannot be awaited on it. Take the connector from the
+        # session and close its pooled transports directly, as BaseConnector.__del__ does.
+        connector = session.connector
+        session.detach()
+        if connector is not None and not connector.closed:
+            try:
+                connector._close()
+            except Exception as e:
+                logger.debug(f"Error closing {target} connector of a finished event loop: {e}")
+
+    async def close_async(self, target: Optional[str] = None) -> None:
+        """Close one target's aiohttp session, or all of them."""
+        targets = [target] if target is not None else list(self._async_sessions.keys())
+        loop = asyncio.get_running_loop()
+        for name in targets:
+            entry = self._async_sessions.pop(name, None)
+            if entry is None:
+                continue
+            session, session_loop = entry
+            if session_loop is loop:
+                if not session.closed:
+                    await session.close()
+            else:
+                self._discard_async_session(name, session, session_loop)
+            logger.info(f"Closed {name} HTTP connection pool")
+
+    async def close_loop_sessions(self) -> None:
+        """Close the sessions bound to the running loop (end of an asyncio.run() wrapper)."""
+        loop = asyncio.get_running_loop()
+        for name, (session, session_loop) in list(self._async_sessions.items()):
+            if session_loop is loop:
+                await self.close_async(name)
+
+
+    # --- Sync (requests) ---
+
+    def adapter(self, target: str) -> HTTPAdapter:
+        context = self.ssl_context(target)
+        with self._lock:
+            adapter = self._adapters.get(target)
+            if adapter is None:
+                limit = self.limit_for(target)
+                adapter = PooledHTTPAdapter(context, pool_connections=1, pool_maxsize=limit, pool_block=False)
+                self._adapters[target] = adapter
+            return adapter
+
+    def get_sync_session(self, target: str) -> requests.Session:
+        """New requests.Session that shares target's keep-alive connection pool."""
+        session = requests.Session()
+        adapter = self.adapter(target)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.verify = _verify_enabled(target)
+        session.headers["User-Agent"] = USER_AGENT
+        return session
+
+    def close_sync(self) -> None:
+        with self._lock:
+            adapters, self._adapters = self._adapters, {}
+        for target, adapter in adapters.items():
+            adapter.close()
+            logger.info(f"Closed {target} sync connection pool")
+
+    async def close(self) -> None:
+        """Close every pool (called from the application lifespan)."""
+        await self.close_async()
+        self.close_sync()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "tls_sessions_cached": {name: context.session_count() for name, context in self._ssl_contexts.items()},
+            "async": {
+                name: {"closed": session.closed, "limit_per_host": self.limit_for(name)}
+                for name, (session, _loop) in self._async_sessions.items()
+            },
+            "sync": {
+                name: {"pool_maxsize": adapter._pool_maxsize, "hosts": len(adapter.poolmanager.pools)}
+                for name, adapter in self._adapters.items()
+            },
+        }
+
+
+# Global registry instance
+_http_clients = None
+
+
+def get_http_clients() -> HTTPClientRegistry:
+    """Get the global HTTP client registry instance"""
+    global _http_clients
+    if _http_clients is None:
+        _http_clients = HTTPClientRegistry()
+    return _http_clients
+
+
+def run_async(func, *args, **kwargs):
+    """
+    asyncio.run(func(*args, **kwargs)) for sync wrappers. Pools created on the
+    temporary loop are closed before it ends instead of being left behind.
+    """
+    async def main():
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            await get_http_clients().close_loop_sessions()
+
+    return asyncio.run(main())
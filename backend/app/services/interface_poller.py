@@ -0,0 +1,337 @@
+import os
+import time
+import asyncio
+import logging
+from array import array
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Poller configuration
+POLL_INTERVAL = float(os.environ.get("INTERFACE_POLL_INTERVAL", "10"))  # Seconds between polls
+HISTORY_CAPACITY = int(os.environ.get("INTERFACE_HISTORY_SAMPLES", "720"))  # 2h at 10s
+INTERFACE_ENDPOINT = "monitor/system/interface"
+
+# Counter columns kept per interface (besides the timestamp)
+COUNTER_FIELDS = (
+    "rx_bytes",
+    "tx_bytes",
+    "rx_packets",
+    "tx_packets",
+    "rx_errors",
+    "tx_errors",
+)
+GAUGE_FIELDS = ("link", "speed")
+FIELDS = COUNTER_FIELDS + GAUGE_FIELDS
+
+
+class InterfaceRingBuffer:
+    """
+    Fixed-size ring buffer of counter samples for a single interface.
+
+    Each column is a preallocated array('d') so appends never allocate and the
+    memory per interface is constant (capacity * columns * 8 bytes). Reads return
+    chronologically ordered copies of the requested window.
+    """
+
+    def __init__(self, name: str, capacity: int = HISTORY_CAPACITY):
+        self.name = name
+        self.capacity = max(2, capacity)
+        self.timestamps = array("d", bytes(8 * self.capacity))
+        self.columns: Dict[str, array] = {
+            field: array("d", bytes(8 * self.capacity)) for field in FIELDS
+        }
+        self._head = 0  # Next write position
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, timestamp: float, sample: Dict[str, float]) -> None:
+        pos = self._head
+        self.timestamps[pos] = timestamp
+        for field, column in self.columns.items():
+            column[pos] = float(sample.get(field, 0) or 0)
+        self._head = (pos + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def _ordered(self, column: array, start: int) -> array:
+        """Chronological copy of column from logical index start to the end."""
+        first = (self._head - self._size) % self.capacity
+        if first + self._size <= self.capacity:
+            return column[first + start:first + self._size]
+        wrapped = column[first:] + column[:self._head]
+        return wrapped[start:]
+
+    def window(self, since: Optional[float] = None) -> Tuple[array, Dict[str, array]]:
+        """Return (timestamps, columns) for samples newer than since (epoch seconds)."""
+        if self._size == 0:
+            return array("d"), {field: array("d") for field in FIELDS}
+        timestamps = self._ordered(self.timestamps, 0)
+        start = 0
+        if since is not None:
+            # Timestamps are monotonic within the buffer: binary search the cutoff
+            lo, hi = 0, len(timestamps)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if timestamps[mid] < since:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            start = lo
+        return timestamps[start:], {
+            field: self._ordered(column, start) for field, column in self.columns.items()
+        }
+
+    def tail(self, count: int) -> Tuple[array, Dict[str, array]]:
+        """Return (timestamps, columns) for the last count samples (fewer if not filled yet)."""
+        count = min(max(0, count), self._size)
+        positions = [(self._head - count + i) % self.capacity for i in range(count)]
+        return array("d", (self.timestamps[p] for p in positions)), {
+            field: array("d", (column[p] for p in positions)) for field, column in self.columns.items()
+        }
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        if self._size == 0:
+            return None
+        pos = (self._head - 1) % self.capacity
+        sample = {field: column[pos] for field, column in self.columns.items()}
+        sample["timestamp"] = self.timestamps[pos]
+        return sample
+
+
+# --- Derived series (rates, deltas, moving averages) ---
+
+
+def counter_rates(timestamps: array, values: array) -> List[Optional[float]]:
+    """
+    Per-second rate between consecutive counter samples.
+    Counter resets (negative deltas) and zero-length intervals yield None.
+    """
+    if len(values) < 2:
+        return []
+    rates: List[Optional[float]] = []
+    for i in range(1, len(values)):
+        delta = values[i] - values[i - 1]
+        dt = timestamps[i] - timestamps[i - 1]
+        rates.append(delta / dt if delta >= 0 and dt > 0 else None)
+    return rates
+
+
+def moving_average(series: List[Optional[float]], window: int) -> List[Optional[float]]:
+    """Trailing moving average over the last `window` valid points."""
+    window = max(1, window)
+    result: List[Optional[float]] = []
+    running_sum = 0.0
+    running_count = 0
+    for i, value in enumerate(series):
+        if value is not None:
+            running_sum += value
+            running_count += 1
+        if i >= window:
+            old = series[i - window]
+            if old is not None:
+                running_sum -= old
+                running_count -= 1
+        result.append(running_sum / running_count if running_count else None)
+    return result
+
+
+def _parse_interface_sample(interface: Dict[str, Any]) -> Dict[str, float]:
+    """Pick counter fields out of a monitor/system/interface row."""
+    sample = {field: interface.get(field, 0) or 0 for field in COUNTER_FIELDS}
+    link = interface.get("link")
+    if isinstance(link, str):
+        link = link.lower() in ("up", "true", "1")
+    sample["link"] = 1.0 if link else 0.0
+    sample["speed"] = interface.get("speed", 0) or 0
+    return sample
+
+
+def _iter_interfaces(data: Dict[str, Any]):
+    """monitor/system/interface returns results keyed by name (or a list on some builds)."""
+    results = data.get("results") if isinstance(data, dict) else None
+    if isinstance(results, dict):
+        for name, interface in results.items():
+            if isinstance(interface, dict):
+                yield interface.get("name", name), interface
+    elif isinstance(results, list):
+        for interface in results:
+            if isinstance(interface, dict) and interface.get("name"):
+                yield interface["name"], interface
+
+
+class InterfacePoller:
+    """
+    Background poller that appends interface counters into per-interface ring buffers.
+
+    Dashboards read throughput/error history from memory through query(), so charting
+    the last N minutes never triggers extra FortiGate calls.
+    """
+
+    def __init__(self, interval: float = POLL_INTERVAL, capacity: int = HISTORY_CAPACITY):
+        self.interval = interval
+        self.capacity = capacity
+        self.buffers: Dict[str, InterfaceRingBuffer] = {}
+        # Called as listener(timestamp, name, sample) for every ingested sample
+        self.listeners: List[Callable[[float, str, Dict[str, float]], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.poll_count = 0
+        self.error_count = 0
+        self.last_poll_time = 0.0
+        self.last_poll_duration = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run(), name="interface-poller")
+        logger.info(f"Interface poller started (interval {self.interval}s, {self.capacity} samples)")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Interface poller stopped")
+
+    async def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.error_count += 1
+                logger.error(f"Error polling interface counters: {e}")
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(max(0.0, self.interval - elapsed))
+
+    async def poll_once(self) -> int:
+        """Poll the FortiGate once and append a sample per interface."""
+        # Imported here so the ring buffers and rate math do not depend on the HTTP client
+        from .fortigate_service_optimized import fgt_api_async_uncached
+
+        started = time.monotonic()
+        data = await fgt_api_async_uncached(INTERFACE_ENDPOINT)
+        if not isinstance(data, dict) or "error" in data:
+            self.error_count += 1
+            logger.warning(f"Interface poll failed: {data.get('error') if isinstance(data, dict) else data}")
+            return 0
+        return self.ingest(data, started_monotonic=started)
+
+    def add_listener(self, listener: Callable[[float, str, Dict[str, float]], None]) -> None:
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def ingest(self, data: Dict[str, Any], timestamp: Optional[float] = None, started_monotonic: Optional[float] = None) -> int:
+        """Append one sample per interface from a monitor/system/interface response."""
+        timestamp = timestamp if timestamp is not None else time.time()
+        count = 0
+        for name, interface in _iter_interfaces(data):
+            buffer = self.buffers.get(name)
+            if buffer is None:
+                buffer = self.buffers[name] = InterfaceRingBuffer(name, self.capacity)
+            sample = _parse_interface_sample(interface)
+            buffer.append(timestamp, sample)
+            for listener in self.listeners:
+                try:
+                    listener(timestamp, name, sample)
+                except Exception as e:
+                    logger.error(f"Interface sample listener failed for {name}: {e}")
+            count += 1
+        self.poll_count += 1
+        self.last_poll_time = timestamp
+        if started_monotonic is not None:
+            self.last_poll_duration = time.monotonic() - started_monotonic
+        logger.debug(f"Interface poll #{self.poll_count}: {count} interfaces")
+        return count
+
+    def interfaces(self) -> List[str]:
+        return sorted(self.buffers.keys())
+
+    def query(self, name: str, minutes: float = 15, smooth: int = 1) -> Optional[Dict[str, Any]]:
+        """
+        Range query for one interface over the last `minutes`.
+        Returns timestamps plus per-second rates (bps/pps/errors) and link state.
+        """
+        buffer = self.buffers.get(name)
+        if buffer is None:
+            return None
+
+        since = time.time() - minutes * 60 if minutes else None
+        timestamps, columns = buffer.window(since)
+
+        series: Dict[str, Any] = {
+            "rx_bps": [r * 8 if r is not None else None for r in counter_rates(timestamps, columns["rx_bytes"])],
+            "tx_bps": [r * 8 if r is not None else None for r in counter_rates(timestamps, columns["tx_bytes"])],
+            "rx_pps": counter_rates(timestamps, columns["rx_packets"]),
+            "tx_pps": counter_rates(timestamps, columns["tx_packets"]),
+            "rx_errors_per_s": counter_rates(timestamps, columns["rx_errors"]),
+            "tx_errors_per_s": counter_rates(timestamps, columns["tx_errors"]),
+        }
+        if smooth > 1:
+            for key in list(series.keys()):
+                series[f"{key}_avg"] = moving_average(series[key], smooth)
+
+        errors_window = {
+            field: (columns[field][-1] - columns[field][0]) if len(columns[field]) > 1 else 0.0
+            for field in ("rx_errors", "tx_errors")
+        }
+
+        return {
+            "interface": name,
+            "samples": len(timestamps),
+            "interval": self.interval,
+            # Rates describe the interval ending at each timestamp, so drop the first one
+            "timestamps": list(timestamps[1:]),
+            "link": [int(v) for v in columns["link"][1:]],
+            "error_deltas": errors_window,
+            **series,
+        }
+
+    def current_rates(self) -> Dict[str, Dict[str, Any]]:
+        """Latest rates per interface, derived from the last two samples."""
+        rates = {}
+        for name, buffer in self.buffers.items():
+            last_ts, columns = buffer.tail(2)
+            if len(last_ts) < 2:
+                continue
+            entry = {"timestamp": last_ts[-1], "link": bool(columns["link"][-1])}
+            for field in COUNTER_FIELDS:
+                rate = counter_rates(last_ts, columns[field])
+                entry[f"{field}_per_s"] = rate[0] if rate else None
+            rates[name] = entry
+        return rates
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "capacity": self.capacity,
+            "interfaces": len(self.buffers),
+            "poll_count": self.poll_count,
+            "error_count": self.error_count,
+            "last_poll_time": self.last_poll_time,
+            "last_poll_duration": round(self.last_poll_duration, 3),
+        }
+
+
+# Global poller instance
+_interface_poller = None
+
+
+def get_interface_poller() -> InterfacePoller:
+    """Get the global interface poller instance"""
+    global _interface_poller
+    if _interface_poller is None:
+        _interface_poller = InterfacePoller()
+    return _interface_poller
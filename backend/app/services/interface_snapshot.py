@@ -0,0 +1,98 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.utils.compression import PRECOMPRESS_ENABLED, precompress
+from app.utils.fast_json import SerializedEntry, dumps, version_etag
+from app.utils.telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+INTERFACE_SNAPSHOT_TTL = int(os.environ.get("INTERFACE_SNAPSHOT_TTL", "30"))  # Seconds before a refresh
+
+
+class InterfaceSnapshot:
+    """One refresh of the FortiGate interface table (cmdb/system/interface), serialized at most once."""
+
+    def __init__(self, interfaces: Dict[str, Any], version: int = 0, created_at: Optional[float] = None):
+        self.interfaces = interfaces
+        self.version = version
+        self.created_at = created_at if created_at is not None else time.time()
+        self._entry: Optional[SerializedEntry] = None
+
+    def etag(self) -> str:
+        return version_etag("interfaces", self.version)
+
+    def serialized(self) -> SerializedEntry:
+        if self._entry is None:
+            body = dumps(self.interfaces)
+            variants = precompress(body) if PRECOMPRESS_ENABLED else {}
+            self._entry = SerializedEntry(body, etag=self.etag(), created_at=self.created_at, variants=variants)
+        return self._entry
+
+
+# Current snapshot and refresh state
+_snapshot: Optional[InterfaceSnapshot] = None
+_snapshot_version = 0
+_last_attempt = 0.0  # When the last refresh (successful or not) finished
+_snapshot_lock: Optional[asyncio.Lock] = None
+
+
+async def _default_fetch() -> Dict[str, Any]:
+    from app.services.fortigate_service_optimized import get_interfaces_async
+
+    return await get_interfaces_async()
+
+
+async def get_interface_snapshot(
+    ttl: int = INTERFACE_SNAPSHOT_TTL,
+    fresh: bool = False,
+    fetch_function: Optional[Callable[[], Awaitable[Dict[str, Any]]]] = None,
+) -> InterfaceSnapshot:
+    """
+    Get the cached interface snapshot, refreshing it when older than ttl seconds
+    (fresh=True: always, unless a refresh finished after this call). Concurrent
+    callers share a single refresh. A failed refresh (empty result) keeps the
+    previous snapshot.
+    """
+    global _snapshot, _snapshot_version, _last_attempt, _snapshot_lock
+
+    requested_at = time.time()
+    if not fresh and _snapshot is not None and requested_at - _snapshot.created_at < ttl:
+        get_telemetry().record_cache("interface_snapshot", True)
+        return _snapshot
+
+    if _snapshot_lock is None:
+        _snapshot_lock = asyncio.Lock()
+
+    async with _snapshot_lock:
+        # Another caller refreshed while we waited for the lock
+        if _snapshot is not None and _last_attempt >= requested_at:
+            get_telemetry().record_cache("interface_snapshot", True)
+            return _snapshot
+
+        get_telemetry().record_cache("interface_snapshot", False)
+        start_time = time.time()
+        try:
+            interfaces = await (fetch_function or _default_fetch)()
+        finally:
+            _last_attempt = time.time()
+
+        if not interfaces and _snapshot is not None:
+            logger.warning(f"Interface refresh returned no data; keeping snapshot v{_snapshot.version}")
+            return _snapshot
+
+        _snapshot_version += 1
+        _snapshot = InterfaceSnapshot(interfaces or {}, version=_snapshot_version)
+        logger.info(
+            f"Interface snapshot v{_snapshot.version} ({len(_snapshot.interfaces)} interfaces) "
+            f"built in {time.time() - start_time:.2f}s"
+        )
+        return _snapshot
+
+
+def get_cached_interface_snapshot() -> Optional[InterfaceSnapshot]:
+    """Return the current interface snapshot without triggering a refresh."""
+    return _snapshot
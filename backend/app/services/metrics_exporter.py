@@ -0,0 +1,246 @@
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from app.services.connection_metrics import get_connection_metrics
+from app.services.interface_poller import COUNTER_FIELDS, InterfacePoller, get_interface_poller
+from app.services.switch_snapshot import SwitchSnapshot, get_cached_snapshot
+from app.utils.telemetry import escape_label, get_telemetry
+
+logger = logging.getLogger(__name__)
+
+# Switch status values FortiOS reports for a switch that is reachable
+SWITCH_UP_STATUSES = {"connected", "online", "up", "authorized"}
+# Rendered label sets kept across snapshot versions before the cache is reset
+LABEL_CACHE_LIMIT = 200_000
+
+
+def _number(value: Any) -> Optional[float]:
+    """Numeric value of a field such as speed ("1000", 1000, "1000full"), or None."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        digits = ""
+        for ch in value:
+            if not (ch.isdigit() or ch == "."):
+                break
+            digits += ch
+        try:
+            return float(digits) if digits else None
+        except ValueError:
+            return None
+    return None
+
+
+class _Family:
+    """Lines of one metric family, emitted together under a single HELP/TYPE header."""
+
+    __slots__ = ("name", "help_text", "kind", "lines")
+
+    def __init__(self, name: str, help_text: str, kind: str = "gauge"):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.lines: List[str] = []
+
+    def add(self, labels: str, value: Any) -> None:
+        self.lines.append(f"{self.name}{labels} {value}")
+
+    def render(self, out: List[str]) -> None:
+        if not self.lines:
+            return
+        out.append(f"# HELP {self.name} {self.help_text}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        out.extend(self.lines)
+
+
+class MetricsExporter:
+    """
+    Renders /metrics from data that is already held in memory: the switch snapshot,
+    the interface poller ring buffers, latency histograms and connection counters.
+    A scrape never calls the FortiGate.
+
+    Switch and interface sections can reach tens of thousands of series, so each is
+    rendered once per data version (snapshot version / poll count) and the encoded
+    text is reused by every scrape until the data changes. Label strings are cached
+    per (switch, port) across versions, so a new snapshot only re-formats values.
+    Only the small telemetry section is rendered on every scrape.
+    """
+
+    def __init__(self):
+        self._sections: Dict[str, Tuple[Hashable, bytes]] = {}
+        self._labels: Dict[Tuple[Any, ...], str] = {}
+        self._lock = threading.Lock()
+        self.renders: Counter = Counter()
+
+    def labels(self, names: Tuple[str, ...], values: Tuple[Any, ...]) -> str:
+        key = (names, values)
+        text = self._labels.get(key)
+        if text is None:
+            if len(self._labels) >= LABEL_CACHE_LIMIT:
+                self._labels.clear()
+            text = "{" + ",".join(f'{n}="{escape_label(v)}"' for n, v in zip(names, values)) + "}"
+            self._labels[key] = text
+        return text
+
+    def _section(self, name: str, version: Hashable, render: Callable[[], List[str]]) -> bytes:
+        cached = self._sections.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        start_time = time.time()
+        lines = render()
+        text = ("\n".join(lines) + "\n").encode() if lines else b""
+        self._sections[name] = (version, text)
+        self.renders[name] += 1
+        logger.debug(
+            f"Rendered metrics section '{name}' ({len(lines)} lines, {len(text)} bytes) "
+            f"in {(time.time() - start_time) * 1000:.1f}ms"
+        )
+        return text
+
+    # --- Sections ---
+
+    def _render_snapshot(self, snapshot: Optional[SwitchSnapshot]) -> List[str]:
+        if snapshot is None:
+            return []
+        version = _Family("fortiswitch_snapshot_version", "Version of the switch snapshot being exported")
+        created = _Family("fortiswitch_snapshot_timestamp_seconds", "Unix time the switch snapshot was built")
+        info = _Family("fortiswitch_info", "Managed FortiSwitch inventory (always 1)")
+        switch_up = _Family("fortiswitch_up", "1 if the FortiGate reports the switch as connected")
+        ports_total = _Family("fortiswitch_ports", "Ports on the switch")
+        ports_up = _Family("fortiswitch_ports_up", "Ports with link up on the switch")
+        port_up = _Family("fortiswitch_port_up", "1 if the port has link")
+        port_speed = _Family("fortiswitch_port_speed_mbps", "Negotiated port speed")
+        port_poe = _Family("fortiswitch_port_poe_enabled", "1 if PoE is enabled on the port")
+        port_devices = _Family("fortiswitch_port_connected_devices", "Devices learned on the port")
+        devices = _Family("fortiswitch_devices", "Connected devices per switch and VLAN")
+
+        version.add("", snapshot.version)
+        created.add("", f"{snapshot.created_at:.3f}")
+
+        switch_names = ("serial",)
+        port_names = ("serial", "port")
+        for switch in snapshot.switches:
+            serial = switch.get("serial") or "unknown"
+            switch_labels = self.labels(switch_names, (serial,))
+            info.add(self.labels(
+                ("serial", "name", "model", "version"),
+                (serial, switch.get("name", ""), switch.get("model", ""), switch.get("version", "")),
+            ), 1)
+            switch_up.add(switch_labels, int(str(switch.get("status", "")).lower() in SWITCH_UP_STATUSES))
+
+            ports = switch.get("ports", ())  # Snapshot records: always a tuple of port records
+            ports_total.add(switch_labels, len(ports))
+            ports_up.add(switch_labels, sum(1 for p in ports if p.get("status") == "up"))
+
+            vlan_counts: Counter = Counter()
+            for port in ports:
+                port_labels = self.labels(port_names, (serial, port.get("name", "")))
+                port_up.add(port_labels, int(port.get("status") == "up"))
+                speed = _number(port.get("speed"))
+                if speed is not None:
+                    port_speed.add(port_labels, int(speed) if speed.is_integer() else speed)
+                if port.get("poe_capable"):
+                    port_poe.add(port_labels, int(str(port.get("poe_status", "")).lower() in ("enable", "enabled", "on")))
+                connected = port.get("connected_devices", ())
+                port_devices.add(port_labels, len(connected))
+                for device in connected:
+                    vlan_counts[str(device.get("vlan", "unknown"))] += 1
+
+            for vlan, count in sorted(vlan_counts.items()):
+                devices.add(self.labels(("serial", "vlan"), (serial, vlan)), count)
+
+        lines: List[str] = []
+        for family in (version, created, info, switch_up, ports_total, ports_up,
+                       port_up, port_speed, port_poe, port_devices, devices):
+            family.render(lines)
+        return lines
+
+    def _render_interfaces(self, poller: InterfacePoller) -> List[str]:
+        polls = _Family("fortigate_interface_polls_total", "Interface counter polls completed", "counter")
+        poll_errors = _Family("fortigate_interface_poll_errors_total", "Interface counter polls that failed", "counter")
+        last_poll = _Family("fortigate_interface_last_poll_timestamp_seconds", "Unix time of the last interface poll")
+        link = _Family("fortigate_interface_up", "1 if the interface has link")
+        speed = _Family("fortigate_interface_speed_mbps", "Interface speed")
+        counters = {
+            field: _Family(f"fortigate_interface_{field}_total", f"Interface {field.replace('_', ' ')} counter", "counter")
+            for field in COUNTER_FIELDS
+        }
+
+        polls.add("", poller.poll_count)
+        poll_errors.add("", poller.error_count)
+        if poller.last_poll_time:
+            last_poll.add("", f"{poller.last_poll_time:.3f}")
+
+        names = ("interface",)
+        for name in sorted(poller.buffers):
+            sample = poller.buffers[name].latest()
+            if sample is None:
+                continue
+            labels = self.labels(names, (name,))
+            link.add(labels, int(sample["link"]))
+            speed.add(labels, int(sample["speed"]))
+            for field in COUNTER_FIELDS:
+                counters[field].add(labels, int(sample[field]))
+
+        lines: List[str] = []
+        for family in (polls, poll_errors, last_poll, link, speed, *counters.values()):
+            family.render(lines)
+        return lines
+
+    def _render_connections(self) -> List[str]:
+        hosts = get_connection_metrics().snapshot()["hosts"]
+        families = [
+            (_Family("http_client_connections_opened_total", "Outbound TCP+TLS connections opened by host", "counter"), "connections_opened"),
+            (_Family("http_client_tls_sessions_resumed_total", "Outbound TLS handshakes that resumed a session", "counter"), "tls_sessions_resumed"),
+            (_Family("http_client_requests_total", "Outbound HTTP requests by host", "counter"), "requests"),
+            (_Family("http_client_errors_total", "Outbound HTTP request errors by host", "counter"), "errors"),
+        ]
+        lines: List[str] = []
+        for family, key in families:
+            for host, stats in hosts.items():
+                family.add(self.labels(("host",), (host,)), stats[key])
+            family.render(lines)
+        return lines
+
+    def render(self) -> bytes:
+        """Full exposition text. Only telemetry and connection counters are rebuilt per scrape."""
+        snapshot = get_cached_snapshot()
+        poller = get_interface_poller()
+        with self._lock:
+            parts = [
+                self._section(
+                    "switches", snapshot.version if snapshot is not None else None,
+                    lambda: self._render_snapshot(snapshot),
+                ),
+                self._section(
+                    "interfaces", (poller.poll_count, poller.error_count),
+                    lambda: self._render_interfaces(poller),
+                ),
+            ]
+            connections = self._render_connections()
+        if connections:
+            parts.append(("\n".join(connections) + "\n").encode())
+        parts.append(get_telemetry().render_prometheus().encode())
+        return b"".join(parts)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "sections": {name: {"version": version, "bytes": len(text)} for name, (version, text) in self._sections.items()},
+            "renders": dict(self.renders),
+            "cached_label_sets": len(self._labels),
+        }
+
+
+# Global exporter instance
+_metrics_exporter = None
+
+
+def get_metrics_exporter() -> MetricsExporter:
+    """Get the global metrics exporter instance"""
+    global _metrics_exporter
+    if _metrics_exporter is None:
+        _metrics_exporter = MetricsExporter()
+    return _metrics_exporter
@@ -0,0 +1,504 @@
+import os
+import re
+import time
+import mmap
+import shutil
+import asyncio
+import bisect
+import logging
+import threading
+from array import array
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Storage configuration
+METRICS_DATA_DIR = os.environ.get("METRICS_DATA_DIR", "./data/metrics")
+PORT_STATS_POLL_INTERVAL = float(os.environ.get("PORT_STATS_POLL_INTERVAL", "60"))
+COMPACTION_INTERVAL = float(os.environ.get("METRICS_COMPACTION_INTERVAL", "3600"))
+PORT_STATS_ENDPOINT = "monitor/switch-controller/managed-switch/port-stats"
+
+RAW = "raw"
+# Rollup resolutions in seconds, smallest first
+ROLLUPS: Dict[str, int] = {"1m": 60, "5m": 300, "1h": 3600}
+
+# Retention per resolution, in days
+RETENTION_DAYS: Dict[str, int] = {
+    RAW: int(os.environ.get("METRICS_RETENTION_RAW_DAYS", "2")),
+    "1m": int(os.environ.get("METRICS_RETENTION_1M_DAYS", "14")),
+    "5m": int(os.environ.get("METRICS_RETENTION_5M_DAYS", "90")),
+    "1h": int(os.environ.get("METRICS_RETENTION_1H_DAYS", "400")),
+}
+
+# Rollup aggregates written for every raw field
+AGGREGATES = ("avg", "max", "last")
+
+TS_COLUMN = "ts"
+COLUMN_SUFFIX = ".f64"
+_SERIES_SAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def series_key(*parts: str) -> str:
+    """Build a filesystem-safe series name, e.g. series_key("port", serial, "port1")."""
+    return ".".join(_SERIES_SAFE.sub("_", str(p)) for p in parts if p is not None and p != "")
+
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y%m%d")
+
+
+class _RollupBucket:
+    """Running aggregates for one series at one rollup resolution."""
+
+    __slots__ = ("start", "count", "sums", "maxes", "lasts")
+
+    def __init__(self, start: float, fields: List[str]):
+        self.start = start
+        self.count = 0
+        self.sums = dict.fromkeys(fields, 0.0)
+        self.maxes = dict.fromkeys(fields, float("-inf"))
+        self.lasts = dict.fromkeys(fields, 0.0)
+
+    def add(self, values: Dict[str, float]) -> None:
+        self.count += 1
+        for field, value in values.items():
+            if field not in self.sums:
+                self.sums[field] = 0.0
+                self.maxes[field] = float("-inf")
+            self.sums[field] += value
+            if value > self.maxes[field]:
+                self.maxes[field] = value
+            self.lasts[field] = value
+
+    def row(self) -> Dict[str, float]:
+        row = {}
+        for field in self.sums:
+            row[f"{field}_avg"] = self.sums[field] / self.count if self.count else 0.0
+            row[f"{field}_max"] = self.maxes[field] if self.count else 0.0
+            row[f"{field}_last"] = self.lasts[field]
+        return row
+
+
+class TimeSeriesStore:
+    """
+    Embedded append-only columnar time-series store.
+
+    Layout: <root>/<resolution>/<YYYYMMDD>/<series>/<column>.f64, one little-endian
+    float64 per row per column. Writes are buffered in memory and appended to the
+    column files on flush(). Raw samples are rolled up on ingest into 1m/5m/1h
+    buckets (avg/max/last per field). Expired day segments are deleted by compact()
+    according to RETENTION_DAYS. Queries memory-map the column files of the day
+    segments in range and binary-search the timestamp column, so reading 90 days of
+    hourly rollups touches a few kilobytes per series.
+    """
+
+    def __init__(self, root: str = METRICS_DATA_DIR, retention_days: Optional[Dict[str, int]] = None):
+        self.root = root
+        self.retention_days = dict(RETENTION_DAYS, **(retention_days or {}))
+        self._pending: Dict[Tuple[str, str, str], List[Tuple[float, Dict[str, float]]]] = {}
+        self._buckets: Dict[Tuple[str, str], _RollupBucket] = {}
+        self._lock = threading.Lock()
+        self.rows_written = 0
+        self.segments_compacted = 0
+
+    # --- Write path ---
+
+    def append(self, series: str, timestamp: float, values: Dict[str, float]) -> None:
+        """Buffer one raw sample and roll it into every rollup resolution."""
+        values = {k: float(v) for k, v in values.items() if v is not None}
+        if not values:
+            return
+        with self._lock:
+            self._pending.setdefault((RAW, _day(timestamp), series), []).append((timestamp, values))
+            for resolution, seconds in ROLLUPS.items():
+                bucket_start = timestamp - (timestamp % seconds)
+                key = (resolution, series)
+                bucket = self._buckets.get(key)
+                if bucket is not None and bucket.start != bucket_start:
+                    self._emit_bucket(resolution, series, bucket)
+                    bucket = None
+                if bucket is None:
+                    bucket = self._buckets[key] = _RollupBucket(bucket_start, list(values.keys()))
+                bucket.add(values)
+
+    def _emit_bucket(self, resolution: str, series: str, bucket: _RollupBucket) -> None:
+        self._pending.setdefault((resolution, _day(bucket.start), series), []).append(
+            (bucket.start, bucket.row())
+        )
+
+    def flush(self, close_buckets: bool = False) -> int:
+        """
+        Append buffered rows to their segment files. With close_buckets, partially
+        filled rollup buckets are written too (used on shutdown; a later row for the
+        same bucket supersedes it at query time).
+        """
+        with self._lock:
+            if close_buckets:
+                for (resolution, series), bucket in self._buckets.items():
+                    self._emit_bucket(resolution, series, bucket)
+                self._buckets.clear()
+            pending, self._pending = self._pending, {}
+
+        written = 0
+        for (resolution, day, series), rows in pending.items():
+            try:
+                written += self._write_rows(os.path.join(self.root, resolution, day, series), rows)
+            except OSError as e:
+                logger.error(f"Error writing metrics segment {resolution}/{day}/{series}: {e}")
+        self.rows_written += written
+        return written
+
+    @staticmethod
+    def _write_rows(segment_dir: str, rows: List[Tuple[float, Dict[str, float]]]) -> int:
+        os.makedirs(segment_dir, exist_ok=True)
+        fields = sorted({field for _ts, values in rows for field in values})
+
+        # Columns added mid-segment are back-filled with NaN so all columns stay aligned
+        existing_rows = _segment_length(segment_dir)
+        columns = {TS_COLUMN: array("d", (ts for ts, _values in rows))}
+        for field in fields:
+            columns[field] = array("d", (values.get(field, float("nan")) for _ts, values in rows))
+
+        for name, column in columns.items():
+            path = os.path.join(segment_dir, name + COLUMN_SUFFIX)
+            if name != TS_COLUMN and existing_rows and not os.path.exists(path):
+                with open(path, "wb") as f:
+                    array("d", [float("nan")] * existing_rows).tofile(f)
+            with open(path, "ab") as f:
+                column.tofile(f)
+
+        # Existing columns missing from this batch get NaN padding
+        for filename in os.listdir(segment_dir):
+            name = filename[:-len(COLUMN_SUFFIX)]
+            if filename.endswith(COLUMN_SUFFIX) and name not in columns:
+                with open(os.path.join(segment_dir, filename), "ab") as f:
+                    array("d", [float("nan")] * len(rows)).tofile(f)
+        return len(rows)
+
+    # --- Retention ---
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """Delete day segments older than each resolution's retention."""
+        now = now if now is not None else time.time()
+        removed = 0
+        for resolution, days in self.retention_days.items():
+            resolution_dir = os.path.join(self.root, resolution)
+            if not os.path.isdir(resolution_dir):
+                continue
+            cutoff = _day(now - days * 86400)
+            for day in os.listdir(resolution_dir):
+                if day < cutoff:
+                    shutil.rmtree(os.path.join(resolution_dir, day), ignore_errors=True)
+                    removed += 1
+        if removed:
+            logger.info(f"Metrics compaction removed {removed} expired day segments")
+        self.segments_compacted += removed
+        return removed
+
+    # --- Read path ---
+
+    def pick_resolution(self, start: float, end: float) -> str:
+        """Coarsest-needed resolution: keep result sizes bounded and inside retention."""
+        span = end - start
+        age = time.time() - start
+        for resolution, max_span in ((RAW, 6 * 3600), ("1m", 2 * 86400), ("5m", 30 * 86400)):
+            if span <= max_span and age <= self.retention_days[resolution] * 86400:
+                return resolution
+        return "1h"
+
+    def query(
+        self,
+        series: str,
+        start: float,
+        end: Optional[float] = None,
+        resolution: str = "auto",
+        fields: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Read rows of one series in [start, end] from the memory-mapped segments."""
+        end = end if end is not None else time.time()
+        if resolution == "auto":
+            resolution = self.pick_resolution(start, end)
+
+        result: Dict[str, List[float]] = {TS_COLUMN: []}
+        day = datetime.fromtimestamp(start, tz=timezone.utc).date()
+        last_day = datetime.fromtimestamp(end, tz=timezone.utc).date()
+        while day <= last_day:
+            segment_dir = os.path.join(self.root, resolution, day.strftime("%Y%m%d"), series)
+            if os.path.isdir(segment_dir):
+                _read_segment(segment_dir, start, end, fields, result)
+            day += timedelta(days=1)
+
+        if resolution != RAW:
+            _dedupe_rows(result)
+        return {"series": series, "resolution": resolution, "rows": len(result[TS_COLUMN]), "columns": result}
+
+    def list_series(self, resolution: str = "1h", prefix: str = "") -> List[str]:
+        names = set()
+        resolution_dir = os.path.join(self.root, resolution)
+        if os.path.isdir(resolution_dir):
+            for day in os.listdir(resolution_dir):
+                day_dir = os.path.join(resolution_dir, day)
+                for name in os.listdir(day_dir):
+                    if name.startswith(prefix):
+                        names.add(name)
+        return sorted(names)
+
+    def capacity_report(
+        self,
+        prefix: str = "",
+        days: int = 90,
+        fields: Tuple[str, ...] = ("rx_bps", "tx_bps"),
+    ) -> List[Dict[str, Any]]:
+        """
+        Per-series utilisation summary over the last `days` from hourly rollups:
+        peak (max of hourly max), average and p95 of hourly averages.
+        """
+        end = time.time()
+        start = end - days * 86400
+        wanted = [f"{f}_{agg}" for f in fields for agg in ("avg", "max")]
+        report = []
+        for series in self.list_series("1h", prefix):
+            columns = self.query(series, start, end, resolution="1h", fields=wanted)["columns"]
+            row: Dict[str, Any] = {"series": series, "hours": len(columns[TS_COLUMN])}
+            for field in fields:
+                avgs = [v for v in columns.get(f"{field}_avg", []) if v == v]
+                maxes = [v for v in columns.get(f"{field}_max", []) if v == v]
+                row[f"{field}_peak"] = max(maxes) if maxes else None
+                row[f"{field}_avg"] = sum(avgs) / len(avgs) if avgs else None
+                row[f"{field}_p95"] = _percentile(avgs, 95)
+            report.append(row)
+        report.sort(key=lambda r: max((r.get(f"{f}_peak") or 0) for f in fields), reverse=True)
+        return report
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "root": os.path.abspath(self.root),
+            "retention_days": self.retention_days,
+            "rows_written": self.rows_written,
+            "segments_compacted": self.segments_compacted,
+            "pending_segments": len(self._pending),
+        }
+
+
+def _segment_length(segment_dir: str) -> int:
+    path = os.path.join(segment_dir, TS_COLUMN + COLUMN_SUFFIX)
+    try:
+        return os.path.getsize(path) // 8
+    except OSError:
+        return 0
+
+
+def _mapped_slice(path: str, lo: int, hi: int) -> List[float]:
+    """Copy rows [lo, hi) of a float64 column file out of a read-only memory map."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < hi * 8:
+            hi = os.fstat(f.fileno()).st_size // 8
+        if hi <= lo:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as raw, raw[: (os.fstat(f.fileno()).st_size // 8) * 8].cast("d") as column:
+                return column[lo:hi].tolist()
+
+
+def _read_segment(
+    segment_dir: str,
+    start: float,
+    end: float,
+    fields: Optional[List[str]],
+    result: Dict[str, List[float]],
+) -> None:
+    ts_path = os.path.join(segment_dir, TS_COLUMN + COLUMN_SUFFIX)
+    if not os.path.exists(ts_path) or os.path.getsize(ts_path) < 8:
+        return
+
+    # A torn write can leave columns of different lengths; only trust complete rows
+    names = [n[:-len(COLUMN_SUFFIX)] for n in os.listdir(segment_dir) if n.endswith(COLUMN_SUFFIX)]
+    rows = min(os.path.getsize(os.path.join(segment_dir, n + COLUMN_SUFFIX)) // 8 for n in names)
+
+    with open(ts_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as raw, raw[: rows * 8].cast("d") as ts:
+            lo = bisect.bisect_left(ts, start, 0, rows)
+            hi = bisect.bisect_right(ts, end, lo, rows)
+    if hi <= lo:
+        return
+
+    existing = len(result[TS_COLUMN])
+    result[TS_COLUMN].extend(_mapped_slice(ts_path, lo, hi))
+    for name in names:
+        if name == TS_COLUMN or (fields is not None and name not in fields):
+            continue
+        column = result.setdefault(name, [float("nan")] * existing)
+        column.extend(_mapped_slice(os.path.join(segment_dir, name + COLUMN_SUFFIX), lo, hi))
+    # Pad columns absent from this segment
+    for name, column in result.items():
+        if len(column) < len(result[TS_COLUMN]):
+            column.extend([float("nan")] * (len(result[TS_COLUMN]) - len(column)))
+
+
+def _dedupe_rows(result: Dict[str, List[float]]) -> None:
+    """Keep the last row per timestamp (a flushed partial bucket may be superseded)."""
+    ts = result[TS_COLUMN]
+    if len(ts) < 2 or all(ts[i] < ts[i + 1] for i in range(len(ts) - 1)):
+        return
+    last_index = {t: i for i, t in enumerate(ts)}
+    keep = sorted(last_index.values(), key=lambda i: ts[i])
+    for name in list(result.keys()):
+        column = result[name]
+        result[name] = [column[i] for i in keep]
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+# --- Collection: interface samples (from the poller) and FortiSwitch port stats ---
+
+
+def _counter_value(row: Dict[str, Any], name: str) -> Optional[float]:
+    """FortiOS uses both tx-bytes and tx_bytes spellings depending on endpoint/version."""
+    value = row.get(name, row.get(name.replace("_", "-")))
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+RATE_FIELDS = {
+    "rx_bytes": ("rx_bps", 8.0),
+    "tx_bytes": ("tx_bps", 8.0),
+    "rx_packets": ("rx_pps", 1.0),
+    "tx_packets": ("tx_pps", 1.0),
+    "rx_errors": ("rx_errors_per_s", 1.0),
+    "tx_errors": ("tx_errors_per_s", 1.0),
+}
+
+
+class MetricsRecorder:
+    """
+    Feeds the time-series store: converts counter samples to rates (so rollups give
+    meaningful average/peak utilisation), listens to the interface poller, and polls
+    FortiSwitch port statistics on its own interval.
+    """
+
+    def __init__(self, store: TimeSeriesStore, port_stats_interval: float = PORT_STATS_POLL_INTERVAL):
+        self.store = store
+        self.port_stats_interval = port_stats_interval
+        self._previous: Dict[str, Tuple[float, Dict[str, float]]] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def record_counters(self, series: str, timestamp: float, counters: Dict[str, Any], gauges: Optional[Dict[str, float]] = None) -> None:
+        """Record counter deltas as per-second rates (first sample only primes the state)."""
+        current = {name: _counter_value(counters, name) for name in RATE_FIELDS}
+        current = {k: v for k, v in current.items() if v is not None}
+        previous = self._previous.get(series)
+        self._previous[series] = (timestamp, current)
+        if previous is None:
+            return
+
+        prev_ts, prev_values = previous
+        dt = timestamp - prev_ts
+        if dt <= 0:
+            return
+        values: Dict[str, float] = dict(gauges or {})
+        for name, value in current.items():
+            if name in prev_values and value >= prev_values[name]:
+                rate_name, scale = RATE_FIELDS[name]
+                values[rate_name] = (value - prev_values[name]) * scale / dt
+        self.store.append(series, timestamp, values)
+
+    def on_interface_sample(self, timestamp: float, name: str, sample: Dict[str, float]) -> None:
+        """Interface poller listener."""
+        self.record_counters(
+            series_key("interface", name), timestamp, sample, {"link": sample.get("link", 0.0)}
+        )
+
+    def ingest_port_stats(self, data: Dict[str, Any], timestamp: Optional[float] = None) -> int:
+        timestamp = timestamp if timestamp is not None else time.time()
+        results = data.get("results", []) if isinstance(data, dict) else []
+        count = 0
+        for switch in results if isinstance(results, list) else []:
+            if not isinstance(switch, dict):
+                continue
+            serial = switch.get("serial") or switch.get("switch-id")
+            ports = switch.get("ports", {})
+            items = ports.items() if isinstance(ports, dict) else (
+                (p.get("interface") or p.get("name"), p) for p in ports if isinstance(p, dict)
+            )
+            for port_name, stats in items:
+                if port_name and isinstance(stats, dict):
+                    self.record_counters(series_key("port", serial, port_name), timestamp, stats)
+                    count += 1
+        return count
+
+    async def _poll_port_stats(self) -> None:
+        # Imported here so the storage engine does not depend on the HTTP client
+        from .fortigate_service_optimized import fgt_api_async_uncached
+
+        while True:
+            started = time.monotonic()
+            try:
+                data = await fgt_api_async_uncached(PORT_STATS_ENDPOINT)
+                if isinstance(data, dict) and "error" not in data:
+                    count = self.ingest_port_stats(data)
+                    logger.debug(f"Recorded port stats for {count} switch ports")
+                await asyncio.to_thread(self.store.flush)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error recording FortiSwitch port stats: {e}")
+            await asyncio.sleep(max(0.0, self.port_stats_interval - (time.monotonic() - started)))
+
+    async def _maintain(self) -> None:
+        while True:
+            await asyncio.sleep(COMPACTION_INTERVAL)
+            try:
+                await asyncio.to_thread(self.store.compact)
+            except Exception as e:
+                logger.error(f"Error compacting metrics store: {e}")
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._poll_port_stats(), name="port-stats-recorder"),
+            asyncio.create_task(self._maintain(), name="metrics-compaction"),
+        ]
+        logger.info(f"Metrics recorder started (store: {os.path.abspath(self.store.root)})")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        await asyncio.to_thread(self.store.flush, True)
+        logger.info("Metrics recorder stopped")
+
+
+# Global store/recorder instances
+_metrics_store = None
+_metrics_recorder = None
+
+
+def get_metrics_store() -> TimeSeriesStore:
+    """Get the global time-series store instance"""
+    global _metrics_store
+    if _metrics_store is None:
+        _metrics_store = TimeSeriesStore()
+    return _metrics_store
+
+
+def get_metrics_recorder() -> MetricsRecorder:
+    """Get the global metrics recorder instance"""
+    global _metrics_recorder
+    if _metrics_recorder is None:
+        _metrics_recorder = MetricsRecorder(get_metrics_store())
+    return _metrics_recorder
@@ -7,6 +7,8 @@ import json
 
 from config import settings
 
+from .http_clients import get_http_clients
+
 logger = logging.getLogger(__name__)
 
 class PowerAutomateService:
@@ -30,7 +32,8 @@ class PowerAutomateService:
     async def initialize(self) -> None:
         """Initialize the Power Automate service"""
         try:
-            self.session = aiohttp.ClientSession(
+            self.session = await get_http_clients().get_async_session(
+                "power_automate",
                 timeout=aiohttp.ClientTimeout(total=30),
                 headers={
                     "Content-Type": "application/json",
@@ -271,7 +274,7 @@ class PowerAutomateService:
     async def shutdown(self) -> None:
         """Shutdown the Power Automate service"""
         if self.session:
-            await self.session.close()
+            await get_http_clients().close_async("power_automate")
             self.session = None
         
         logger.info("Power Automate service shutdown complete")
@@ -0,0 +1,114 @@
+"""
+Startup state behind the liveness and readiness probes.
+
+The process is live as soon as the event loop answers requests. It is ready once
+the application lifespan has finished starting, which no longer waits for the
+FortiGate: cache warm-up runs as a background task afterwards and a slow or
+unreachable FortiGate only delays the warm-up, not the first request. Set
+READINESS_REQUIRES_WARM=true to keep the instance out of rotation until the
+warm-up has completed.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TIMEOUT = float(os.environ.get("WARMUP_TIMEOUT", "120"))
+READINESS_REQUIRES_WARM = os.environ.get("READINESS_REQUIRES_WARM", "false").lower() == "true"
+
+_IMPORTED_AT = time.time()  # First import of this module, close to process start
+
+
+class StartupState:
+    """Tracks lifespan startup, background warm-up and shutdown."""
+
+    def __init__(self, requires_warm: bool = READINESS_REQUIRES_WARM, warmup_timeout: float = WARMUP_TIMEOUT):
+        self.requires_warm = requires_warm
+        self.warmup_timeout = warmup_timeout
+        self.created_at = _IMPORTED_AT
+        self.ready_at: Optional[float] = None
+        self.warm_started_at: Optional[float] = None
+        self.warmed_at: Optional[float] = None
+        self.warm_error: Optional[str] = None
+        self.shutting_down = False
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_ready(self) -> None:
+        """Called at the end of lifespan startup."""
+        self.ready_at = time.time()
+        self.shutting_down = False
+        logger.info(f"Application ready {self.ready_at - self.created_at:.3f}s after import")
+
+    def start_warm_up(self, warm: Callable[[], Awaitable[Any]]) -> None:
+        """Run warm() in the background; errors and timeouts are recorded, not raised."""
+        if self._task is not None and not self._task.done():
+            return
+        self.warm_started_at = time.time()
+        self.warmed_at = None
+        self.warm_error = None
+        self._task = asyncio.create_task(self._warm(warm), name="cache-warm-up")
+
+    async def _warm(self, warm: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            await asyncio.wait_for(warm(), timeout=self.warmup_timeout)
+            self.warmed_at = time.time()
+            logger.info(f"Cache warm-up completed in {self.warmed_at - self.warm_started_at:.2f}s")
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.warm_error = f"Warm-up did not finish within {self.warmup_timeout:g}s"
+            logger.warning(self.warm_error)
+        except Exception as e:
+            self.warm_error = str(e)
+            logger.error(f"Cache warm-up failed: {e}")
+
+    async def stop(self) -> None:
+        """Called at the start of shutdown: readiness drops and a running warm-up is cancelled."""
+        self.shutting_down = True
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    @property
+    def warm(self) -> bool:
+        return self.warmed_at is not None
+
+    def is_ready(self) -> bool:
+        if self.ready_at is None or self.shutting_down:
+            return False
+        return self.warm or not self.requires_warm
+
+    def status(self) -> Dict[str, Any]:
+        warming = self._task is not None and not self._task.done()
+        return {
+            "status": "ready" if self.is_ready() else ("shutting_down" if self.shutting_down else "starting"),
+            "startup_seconds": round(self.ready_at - self.created_at, 3) if self.ready_at else None,
+            "uptime_seconds": round(time.time() - self.created_at, 3),
+            "warm": self.warm,
+            "warming": warming,
+            "warm_seconds": (
+                round(self.warmed_at - self.warm_started_at, 3) if self.warmed_at and self.warm_started_at else None
+            ),
+            "warm_error": self.warm_error,
+            "requires_warm": self.requires_warm,
+        }
+
+
+# Global startup state instance
+_startup_state = None
+
+
+def get_startup_state() -> StartupState:
+    """Get the global startup state instance"""
+    global _startup_state
+    if _startup_state is None:
+        _startup_state = StartupState()
+    return _startup_state
@@ -0,0 +1,267 @@
+"""
+The FortiSwitch discovery pipeline: fetch -> normalize -> join -> enrich -> snapshot.
+
+Every switch entry point runs through here: get_fortiswitches_optimized() and
+the legacy sync functions (fortiswitch_service.get_fortiswitches,
+get_fortiswitches_enhanced, get_fortiswitches_fullview_improved) are views over
+the snapshot it publishes. None of them keeps its own fgt_api, MAC normalization
+or map builders any more.
+
+Each stage is a plain callable and can be swapped per pipeline instance:
+  fetch(ctx)      async; sets ctx.switch_status and either ctx.maps (delta poller,
+                  streaming) or the raw ctx.tables (one batch of API calls)
+  normalize(ctx)  async; raw tables -> projected, MAC-normalized lookup maps
+                  (nothing to do when fetch already produced maps)
+  join(ctx)       switch status x lookup maps -> switch/port/device dicts
+  enrichers       device dict -> device dict, applied to every joined device
+  snapshot()      run through get_switch_snapshot(): TTL, single-flight rebuild,
+                  and the previous snapshot is kept when a run finds no switches
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.utils.restaurant_device_classifier import enhance_device_info
+from app.utils.telemetry import span
+from .fortiswitch_service_optimized import (
+    DELTA_POLLING_ENABLED,
+    build_arp_map_optimized,
+    build_detected_device_map_optimized,
+    build_dhcp_map_optimized,
+    get_all_fortiswitch_data,
+    get_fortiswitch_data_delta,
+    get_fortiswitch_data_streaming,
+    port_device_rows,
+    prefetch_manufacturers,
+)
+from .switch_snapshot import SwitchSnapshot, get_switch_snapshot
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_NAME = "fortiswitches"
+
+
+class PipelineContext:
+    """State handed from stage to stage during one run."""
+
+    def __init__(self):
+        self.switch_status: Any = None  # managed-switch/status response
+        self.tables: Dict[str, Any] = {}  # Raw monitor tables: detected_devices, dhcp, arp
+        self.maps: Optional[Dict[str, Any]] = None  # dhcp_map, arp_map, detected_map
+        self.switches: List[Dict[str, Any]] = []
+        self.devices = 0
+
+
+Stage = Callable[[PipelineContext], Awaitable[None]]
+DeviceEnricher = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+# --- Fetch ---
+
+
+async def fetch_delta(ctx: PipelineContext) -> None:
+    """Maps kept current by the delta poller (only changed rows are processed)."""
+    data = await get_fortiswitch_data_delta()
+    ctx.switch_status = data.pop("switches")
+    ctx.maps = data
+
+
+async def fetch_streaming(ctx: PipelineContext) -> None:
+    """Maps built while the monitor tables stream in page by page."""
+    data = await get_fortiswitch_data_streaming()
+    ctx.switch_status = data.pop("switches")
+    ctx.maps = data
+
+
+async def fetch_batch(ctx: PipelineContext) -> None:
+    """All four endpoints in one parallel batch; maps are built by normalize."""
+    data = await get_all_fortiswitch_data()
+    ctx.switch_status = data["switches"]
+    ctx.tables = {"detected_devices": data["detected_devices"], "dhcp": data["dhcp"], "arp": data["arp"]}
+
+
+FETCH_MODES: Dict[str, Stage] = {"delta": fetch_delta, "stream": fetch_streaming, "batch": fetch_batch}
+
+
+def default_fetch() -> Stage:
+    """FORTISWITCH_FETCH_MODE (delta | stream | batch); delta unless FORTIGATE_DELTA_POLLING=false."""
+    mode = os.environ.get("FORTISWITCH_FETCH_MODE", "delta" if DELTA_POLLING_ENABLED else "stream").lower()
+    if mode not in FETCH_MODES:
+        logger.warning(f"Unknown FORTISWITCH_FETCH_MODE '{mode}', using stream")
+        mode = "stream"
+    return FETCH_MODES[mode]
+
+
+# --- Normalize / join / enrich ---
+
+
+async def normalize_tables(ctx: PipelineContext) -> None:
+    """Project and MAC-normalize raw tables into the lookup maps."""
+    if ctx.maps is not None:
+        return
+    tables = ctx.tables
+    # Resolve every manufacturer in one batch, off the loop
+    await asyncio.to_thread(prefetch_manufacturers, tables.get("detected_devices"))
+    ctx.maps = {
+        "dhcp_map": build_dhcp_map_optimized(tables.get("dhcp")),
+        "arp_map": build_arp_map_optimized(tables.get("arp")),
+        "detected_map": build_detected_device_map_optimized(tables.get("detected_devices")),
+    }
+
+
+def join_switches(ctx: PipelineContext) -> None:
+    """Switch/port/device dicts from the switch status and the lookup maps."""
+    dhcp_map = ctx.maps["dhcp_map"]
+    arp_map = ctx.maps["arp_map"]
+    detected_map = ctx.maps["detected_map"]
+    status = ctx.switch_status
+    switch_results = status.get("results", []) if isinstance(status, dict) else []
+
+    for switch_data in switch_results:
+        if not isinstance(switch_data, dict):
+            continue
+
+        switch_serial = switch_data.get("serial", "Unknown")
+        switch_name = switch_data.get("switch-id", switch_serial)
+
+        ports = []
+        for port_data in switch_data.get("ports", []):
+            if not isinstance(port_data, dict):
+                continue
+
+            port_name = port_data.get("interface", "Unknown")
+            connected_devices = port_device_rows(switch_serial, port_name, detected_map, dhcp_map, arp_map)
+
+            ports.append({
+                "name": port_name,
+                "status": port_data.get("status", "Unknown"),
+                "speed": port_data.get("speed", 0),
+                "duplex": port_data.get("duplex", "Unknown"),
+                "vlan": port_data.get("vlan", "Unknown"),
+                "poe_capable": port_data.get("poe_capable", False),
+                "poe_status": port_data.get("poe_status", "disabled"),
+                "fortilink_port": port_data.get("fortilink_port", False),
+                "connected_devices": connected_devices,
+            })
+
+        ctx.switches.append({
+            "name": switch_name,
+            "serial": switch_serial,
+            "model": switch_data.get("model", "Unknown"),
+            "status": switch_data.get("status", "Unknown"),
+            "version": switch_data.get("os_version", "Unknown"),
+            "ip": switch_data.get("connecting_from", "Unknown"),
+            "mac": switch_data.get("mac", "Unknown"),
+            "uptime": switch_data.get("uptime", 0),
+            "ports": ports,
+            "total_ports": len(ports),
+            "active_ports": len([p for p in ports if p["status"] == "up"]),
+            "connected_devices_count": sum(len(p["connected_devices"]) for p in ports),
+        })
+
+
+def enrich_devices(ctx: PipelineContext, enrichers: List[DeviceEnricher]) -> None:
+    """Apply every enricher to every joined device (in place)."""
+    devices = 0
+    for switch in ctx.switches:
+        for port in switch["ports"]:
+            rows = port["connected_devices"]
+            for enricher in enrichers:
+                rows = [enricher(device) for device in rows]
+            port["connected_devices"] = rows
+            devices += len(rows)
+    ctx.devices = devices
+
+
+# --- Pipeline ---
+
+
+class SwitchPipeline:
+    """One configurable discovery pipeline; see the module docstring for the stages."""
+
+    def __init__(
+        self,
+        fetch: Optional[Stage] = None,
+        normalize: Stage = normalize_tables,
+        join: Callable[[PipelineContext], None] = join_switches,
+        enrichers: Optional[List[DeviceEnricher]] = None,
+    ):
+        self.fetch = fetch or default_fetch()
+        self.normalize = normalize
+        self.join = join
+        # Restaurant technology classification (cached internally)
+        self.enrichers = list(enrichers) if enrichers is not None else [enhance_device_info]
+        self.runs = 0
+        self.last_run: Dict[str, Any] = {}
+
+    async def run(self) -> List[Dict[str, Any]]:
+        """Fetch, normalize, join and enrich; returns the switch list ([] on failure)."""
+        with span("total", pipeline=PIPELINE_NAME):
+            return await self._run()
+
+    async def _run(self) -> List[Dict[str, Any]]:
+        started = time.time()
+        ctx = PipelineContext()
+        try:
+            with span("fetch"):
+                await self.fetch(ctx)
+            with span("normalize"):
+                await self.normalize(ctx)
+
+            switch_results = ctx.switch_status.get("results") if isinstance(ctx.switch_status, dict) else None
+            if not switch_results:
+                logger.error("No managed switches found in FortiGate response")
+                return []
+
+            with span("aggregate", switches=len(switch_results)):
+                self.join(ctx)
+            with span("enrich"):
+                enrich_devices(ctx, self.enrichers)
+        except Exception as e:
+            logger.error(f"Error in FortiSwitch pipeline: {e}")
+            return []
+
+        elapsed = time.time() - started
+        self.runs += 1
+        self.last_run = {
+            "fetch": getattr(self.fetch, "__name__", str(self.fetch)),
+            "switches": len(ctx.switches),
+            "devices": ctx.devices,
+            "seconds": round(elapsed, 3),
+            "finished_at": time.time(),
+        }
+        logger.info(
+            f"FortiSwitch pipeline: {len(ctx.switches)} switches, {ctx.devices} devices in {elapsed:.2f}s "
+            f"({self.last_run['fetch']})"
+        )
+        return ctx.switches
+
+    async def snapshot(self, fresh: bool = False) -> SwitchSnapshot:
+        """
+        The shared switch snapshot, rebuilt with this pipeline when older than its
+        TTL (always when fresh=True). Concurrent callers share one run.
+        """
+        with span("snapshot", pipeline=PIPELINE_NAME):
+            return await get_switch_snapshot(fetch_function=self.run, fresh=fresh)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "fetch": getattr(self.fetch, "__name__", str(self.fetch)),
+            "enrichers": [getattr(e, "__name__", str(e)) for e in self.enrichers],
+            "runs": self.runs,
+            "last_run": self.last_run,
+        }
+
+
+# Global pipeline instance
+_switch_pipeline = None
+
+
+def get_switch_pipeline() -> SwitchPipeline:
+    """Get the global switch pipeline instance"""
+    global _switch_pipeline
+    if _switch_pipeline is None:
+        _switch_pipeline = SwitchPipeline()
+    return _switch_pipeline
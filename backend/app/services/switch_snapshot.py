@@ -0,0 +1,471 @@
+import asyncio
+import base64
+import logging
+import time
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable, Iterable
+
+from app.models.snapshot import SwitchRecord, compact_switches
+from app.utils.categorical import ENCODING_NAME, CategoryTable, encode_fields, encode_rows
+from app.utils.compression import PRECOMPRESS_ENABLED, precompress
+from app.utils.fast_json import SerializedEntry, dumps, version_etag
+from app.utils.telemetry import get_telemetry, span
+
+logger = logging.getLogger(__name__)
+
+# Snapshot refresh defaults
+SNAPSHOT_TTL = 60  # Seconds before a cached snapshot is rebuilt
+SNAPSHOT_RETRY_INTERVAL = 10  # Seconds between refresh attempts while the FortiGate is failing
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Columns sent as dictionary codes when a client asks for encoding=dictionary
+PORT_CATEGORICAL = ("status", "duplex", "vlan", "poe_status")
+DEVICE_CATEGORICAL = ("device_type", "manufacturer", "source", "vlan", "dhcp_status", "dhcp_interface", "vci")
+CONTEXT_CATEGORICAL = ("switch_serial", "switch_name", "port_name", "port_status")  # Added by port_row/device_row
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(version: int, offset: int) -> str:
+    """Encode snapshot version and offset into an opaque cursor string."""
+    raw = f"{version}:{offset}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """Decode a cursor produced by encode_cursor into (version, offset)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        version, offset = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+        version, offset = int(version), int(offset)
+    except Exception:
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}")
+    if offset < 0:
+        raise InvalidCursorError(f"Invalid cursor offset: {offset}")
+    return version, offset
+
+
+def _norm(value: Any) -> str:
+    """Normalize an index key (case-insensitive, string form)."""
+    return str(value).strip().lower() if value is not None else ""
+
+
+def _add(index: Dict[str, List[int]], key: Any, position: int) -> None:
+    index.setdefault(_norm(key), []).append(position)
+
+
+class SwitchSnapshot:
+    """
+    Immutable, indexed view over one refresh of the switch -> port -> device tree.
+
+    The tree is stored as compact slotted records (app.models.snapshot) and the
+    snapshot keeps (switch, port, device) index references into it; response dicts
+    are only built for the rows of the requested page. Secondary indexes map
+    normalized filter values (switch serial, VLAN, manufacturer, port status) to
+    sorted row positions.
+    """
+
+    def __init__(self, switches: List[Any], version: int = 0, created_at: Optional[float] = None):
+        self.version = version
+        self.created_at = created_at if created_at is not None else time.time()
+        self.switches: List[SwitchRecord] = compact_switches(switches)
+
+        # Row references: ports -> (switch_idx, port_idx), devices -> (switch_idx, port_idx, device_idx)
+        self.port_refs: List[Tuple[int, int]] = []
+        self.device_refs: List[Tuple[int, int, int]] = []
+
+        self.switch_by_serial: Dict[str, int] = {}
+        self.ports_by_switch: Dict[str, List[int]] = {}
+        self.ports_by_status: Dict[str, List[int]] = {}
+        self.ports_by_vlan: Dict[str, List[int]] = {}
+        self.devices_by_switch: Dict[str, List[int]] = {}
+        self.devices_by_vlan: Dict[str, List[int]] = {}
+        self.devices_by_manufacturer: Dict[str, List[int]] = {}
+        self.devices_by_port_status: Dict[str, List[int]] = {}
+
+        # Lower-cased search haystacks, one per row
+        self._switch_text: List[str] = []
+        self._port_text: List[str] = []
+        self._device_text: List[str] = []
+
+        # Serialized payloads, built at most once per snapshot
+        self._serialized: Dict[str, SerializedEntry] = {}
+        self._pending: Dict[str, "asyncio.Future[SerializedEntry]"] = {}
+
+        self._build_indexes()
+
+    def _build_indexes(self) -> None:
+        for s_idx, switch in enumerate(self.switches):
+            serial = switch.get("serial")
+            self.switch_by_serial.setdefault(_norm(serial), s_idx)
+            self._switch_text.append(_norm(" ".join(
+                str(switch.get(k, "")) for k in ("name", "serial", "model", "ip", "status")
+            )))
+
+            for p_idx, port in enumerate(switch.get("ports", ())):
+                port_pos = len(self.port_refs)
+                self.port_refs.append((s_idx, p_idx))
+                _add(self.ports_by_switch, serial, port_pos)
+                _add(self.ports_by_status, port.get("status"), port_pos)
+                _add(self.ports_by_vlan, port.get("vlan"), port_pos)
+                self._port_text.append(_norm(f"{port.get('name', '')} {serial or ''}"))
+
+                for d_idx, device in enumerate(port.get("connected_devices", ())):
+                    dev_pos = len(self.device_refs)
+                    self.device_refs.append((s_idx, p_idx, d_idx))
+                    _add(self.devices_by_switch, serial, dev_pos)
+                    _add(self.devices_by_vlan, device.get("vlan"), dev_pos)
+                    _add(self.devices_by_manufacturer, device.get("manufacturer"), dev_pos)
+                    _add(self.devices_by_port_status, port.get("status"), dev_pos)
+                    self._device_text.append(_norm(" ".join(
+                        str(device.get(k, "")) for k in (
+                            "device_mac", "device_ip", "device_name", "manufacturer", "vci"
+                        )
+                    )))
+
+        logger.info(
+            f"Indexed switch snapshot v{self.version}: {len(self.switches)} switches, "
+            f"{len(self.port_refs)} ports, {len(self.device_refs)} devices"
+        )
+
+    # --- Pre-serialized payloads ---
+
+    def etag(self, key: str) -> str:
+        """ETag for a payload derived from this snapshot (changes with every refresh)."""
+        return version_etag("switches", self.version, key)
+
+    def serialized(self, key: str, build_payload: Callable[[], Any]) -> SerializedEntry:
+        """
+        Serialize a payload derived from this snapshot once and reuse the bytes.
+        Compressed variants are produced at the same time, so compression is paid
+        once per refresh instead of once per client.
+        """
+        entry = self._serialized.get(key)
+        if entry is None:
+            start_time = time.time()
+            with span("render", pipeline="fortiswitches", key=key):
+                body = dumps(build_payload())
+                variants = precompress(body) if PRECOMPRESS_ENABLED else {}
+            entry = SerializedEntry(
+                body, etag=self.etag(key), created_at=self.created_at, variants=variants
+            )
+            self._serialized[key] = entry
+            sizes = ", ".join(f"{enc}={len(data)}" for enc, data in variants.items())
+            logger.debug(
+                f"Serialized snapshot v{self.version} '{key}' ({len(body)} bytes"
+                f"{'; ' + sizes if sizes else ''}) in {(time.time() - start_time) * 1000:.1f}ms"
+            )
+        return entry
+
+    async def serialized_async(self, key: str, build_payload: Callable[[], Any]) -> SerializedEntry:
+        """
+        serialized() in a worker thread, so encoding and precompressing a large
+        tree never blocks the event loop. Concurrent requests share one build.
+        """
+        entry = self._serialized.get(key)
+        if entry is not None:
+            return entry
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(asyncio.to_thread(self.serialized, key, build_payload))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        # A cancelled request must not cancel the build the other requests wait for
+        return await asyncio.shield(pending)
+
+    def encoded_tree(self) -> Dict[str, Any]:
+        """
+        The switch tree with port and device categorical fields replaced by codes
+        into lookup tables sent once per payload ({"encoding", "dictionaries",
+        "columns", "switches"}); "columns" names the coded fields per level.
+        """
+        table = CategoryTable()
+        switches = []
+        for switch in self.switches:
+            row = switch.to_dict()
+            for port in row.get("ports", ()):
+                encode_fields(port, PORT_CATEGORICAL, table)
+                for device in port.get("connected_devices", ()):
+                    encode_fields(device, DEVICE_CATEGORICAL, table)
+            switches.append(row)
+        return {
+            "encoding": ENCODING_NAME,
+            "dictionaries": table.to_dict(),
+            "columns": {"ports": list(PORT_CATEGORICAL), "connected_devices": list(DEVICE_CATEGORICAL)},
+            "switches": switches,
+        }
+
+    # --- Row materialization (only for rows that are returned) ---
+
+    def switch_row(self, s_idx: int) -> Dict[str, Any]:
+        switch = self.switches[s_idx]
+        row = {k: v for k, v in switch.items() if k != "ports"}
+        ports = switch.get("ports", ())
+        row.setdefault("total_ports", len(ports))
+        row.setdefault("active_ports", sum(1 for p in ports if p.get("status") == "up"))
+        row.setdefault("connected_devices_count", sum(len(p.get("connected_devices", ())) for p in ports))
+        return row
+
+    def port_row(self, port_pos: int) -> Dict[str, Any]:
+        s_idx, p_idx = self.port_refs[port_pos]
+        switch = self.switches[s_idx]
+        port = switch["ports"][p_idx]
+        row = {k: v for k, v in port.items() if k != "connected_devices"}
+        row["switch_serial"] = switch.get("serial")
+        row["switch_name"] = switch.get("name")
+        row["connected_devices_count"] = len(port.get("connected_devices", ()))
+        return row
+
+    def device_row(self, dev_pos: int) -> Dict[str, Any]:
+        s_idx, p_idx, d_idx = self.device_refs[dev_pos]
+        switch = self.switches[s_idx]
+        port = switch["ports"][p_idx]
+        row = port["connected_devices"][d_idx].to_dict()
+        row["switch_serial"] = switch.get("serial")
+        row["switch_name"] = switch.get("name")
+        row["port_name"] = port.get("name")
+        row["port_status"] = port.get("status")
+        return row
+
+    # --- Filtering ---
+
+    @staticmethod
+    def _intersect(total: int, candidates: Iterable[Optional[List[int]]]) -> List[int]:
+        """Intersect index posting lists; None means 'no filter on this column'."""
+        selected: Optional[set] = None
+        for posting in candidates:
+            if posting is None:
+                continue
+            selected = set(posting) if selected is None else selected & set(posting)
+            if not selected:
+                return []
+        return list(range(total)) if selected is None else sorted(selected)
+
+    @staticmethod
+    def _lookup(index: Dict[str, List[int]], value: Optional[Any]) -> Optional[List[int]]:
+        if value is None or value == "":
+            return None
+        return index.get(_norm(value), [])
+
+    @staticmethod
+    def _search(positions: List[int], haystacks: List[str], search: Optional[str]) -> List[int]:
+        if not search:
+            return positions
+        needle = search.strip().lower()
+        return [pos for pos in positions if needle in haystacks[pos]]
+
+    def filter_switches(self, serial: Optional[str] = None, search: Optional[str] = None) -> List[int]:
+        positions = list(range(len(self.switches)))
+        if serial:
+            s_idx = self.switch_by_serial.get(_norm(serial))
+            positions = [s_idx] if s_idx is not None else []
+        return self._search(positions, self._switch_text, search)
+
+    def filter_ports(
+        self,
+        switch_serial: Optional[str] = None,
+        vlan: Optional[str] = None,
+        status: Optional[str] = None,
+        search: Optional[str] = None,
+    ) -> List[int]:
+        positions = self._intersect(len(self.port_refs), [
+            self._lookup(self.ports_by_switch, switch_serial),
+            self._lookup(self.ports_by_vlan, vlan),
+            self._lookup(self.ports_by_status, status),
+        ])
+        return self._search(positions, self._port_text, search)
+
+    def filter_devices(
+        self,
+        switch_serial: Optional[str] = None,
+        vlan: Optional[str] = None,
+        manufacturer: Optional[str] = None,
+        port_status: Optional[str] = None,
+        search: Optional[str] = None,
+    ) -> List[int]:
+        positions = self._intersect(len(self.device_refs), [
+            self._lookup(self.devices_by_switch, switch_serial),
+            self._lookup(self.devices_by_vlan, vlan),
+            self._lookup(self.devices_by_manufacturer, manufacturer),
+            self._lookup(self.devices_by_port_status, port_status),
+        ])
+        return self._search(positions, self._device_text, search)
+
+    def paginate(
+        self,
+        positions: List[int],
+        row_builder: Callable[[int], Dict[str, Any]],
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        categorical: Optional[Iterable[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Slice filtered positions into one page. With categorical, those fields of
+        the items are sent as codes and the page carries their "dictionaries".
+
+        Cursors carry the snapshot version they were issued for; a cursor from an
+        older snapshot still resolves by offset, and the response reports the current
+        version so clients can restart if they need a consistent view.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = 0
+        if cursor:
+            _version, offset = decode_cursor(cursor)
+
+        page = positions[offset:offset + limit]
+        next_offset = offset + len(page)
+        result = {
+            "items": [row_builder(pos) for pos in page],
+            "count": len(page),
+            "total": len(positions),
+            "next_cursor": encode_cursor(self.version, next_offset) if next_offset < len(positions) else None,
+            "snapshot_version": self.version,
+            "snapshot_age": round(time.time() - self.created_at, 3),
+        }
+        if categorical:
+            encoded = encode_rows(result["items"], categorical)
+            result["items"] = encoded["rows"]
+            result["encoding"] = ENCODING_NAME
+            result["dictionaries"] = encoded["dictionaries"]
+        return result
+
+
+# Global snapshot state
+_snapshot: Optional[SwitchSnapshot] = None
+_snapshot_source: List[SwitchRecord] = []  # Before enrichers; shares records with the snapshot
+_snapshot_version = 0
+_snapshot_lock: Optional[asyncio.Lock] = None
+_last_attempt = 0.0  # When the last refresh (successful or not) finished
+_refresh_failures = 0  # Consecutive refreshes that kept the previous snapshot
+# Functions applied to every new switch list before indexing (e.g. direct-poll port details)
+_enrichers: List[Callable[[List[Any]], List[Any]]] = []
+
+
+def add_snapshot_enricher(enricher: Callable[[List[Any]], List[Any]]) -> None:
+    """
+    Register enricher(switches) -> switches. It receives read-only switch records
+    (Mappings) and returns records or dicts; unchanged records are reused as is.
+    """
+    if enricher not in _enrichers:
+        _enrichers.append(enricher)
+
+
+async def _default_fetch() -> Any:
+    from app.services.switch_pipeline import get_switch_pipeline
+
+    return await get_switch_pipeline().run()
+
+
+def build_snapshot(switches_data: Any, created_at: Optional[float] = None) -> SwitchSnapshot:
+    """
+    Build and install a new snapshot from a switch list or {"switches": [...]} dict.
+    created_at is the age of the source data (default: now, i.e. a fresh fetch).
+    """
+    global _snapshot, _snapshot_source, _snapshot_version
+
+    if isinstance(switches_data, dict) and "switches" in switches_data:
+        switches = switches_data["switches"]
+    elif isinstance(switches_data, list):
+        switches = switches_data
+    else:
+        switches = []
+
+    switches = _snapshot_source = compact_switches(switches)
+    for enricher in _enrichers:
+        try:
+            switches = enricher(switches)
+        except Exception as e:
+            logger.error(f"Snapshot enricher {getattr(enricher, '__qualname__', enricher)} failed: {e}")
+
+    _snapshot_version += 1
+    _snapshot = SwitchSnapshot(switches, version=_snapshot_version, created_at=created_at)
+    return _snapshot
+
+
+def republish_snapshot() -> Optional[SwitchSnapshot]:
+    """
+    Rebuild the current snapshot from its source data so enrichers are re-applied.
+    The source data is not refetched, so the snapshot keeps its age (Cache-Age, TTL).
+    """
+    if _snapshot is None:
+        return None
+    return build_snapshot(_snapshot_source, created_at=_snapshot.created_at)
+
+
+def _has_switches(data: Any) -> bool:
+    if isinstance(data, dict):
+        data = data.get("switches")
+    return isinstance(data, list) and len(data) > 0
+
+
+def _fresh(snapshot: SwitchSnapshot, now: float, ttl: int) -> bool:
+    """Within ttl of the last build, or (after failed refreshes) within the retry interval of the last attempt."""
+    return now - snapshot.created_at < ttl or (_refresh_failures > 0 and now - _last_attempt < SNAPSHOT_RETRY_INTERVAL)
+
+
+async def get_switch_snapshot(
+    ttl: int = SNAPSHOT_TTL,
+    fetch_function: Optional[Callable[[], Awaitable[Any]]] = None,
+    fresh: bool = False,
+) -> SwitchSnapshot:
+    """
+    Get the cached switch snapshot, rebuilding it when older than ttl seconds
+    (fresh=True: always, unless a refresh finished after this call).
+    Concurrent callers share a single rebuild. A refresh that fails or finds
+    no switches keeps the previous snapshot (see is_snapshot_stale()); it is
+    retried after SNAPSHOT_RETRY_INTERVAL.
+    """
+    global _snapshot_lock, _last_attempt, _refresh_failures
+
+    requested_at = time.time()
+    if not fresh and _snapshot is not None and _fresh(_snapshot, requested_at, ttl):
+        get_telemetry().record_cache("switch_snapshot", True)
+        return _snapshot
+
+    if _snapshot_lock is None:
+        _snapshot_lock = asyncio.Lock()
+
+    async with _snapshot_lock:
+        # Another caller may have refreshed while we waited for the lock
+        if _snapshot is not None and (
+            _last_attempt >= requested_at or (not fresh and _fresh(_snapshot, time.time(), ttl))
+        ):
+            get_telemetry().record_cache("switch_snapshot", True)
+            return _snapshot
+
+        get_telemetry().record_cache("switch_snapshot", False)
+        start_time = time.time()
+        try:
+            data = await (fetch_function or _default_fetch)()
+        except Exception as e:
+            if _snapshot is None:
+                raise
+            data = None
+            logger.error(f"Switch snapshot refresh failed: {e}")
+        finally:
+            _last_attempt = time.time()
+
+        if not _has_switches(data) and _snapshot is not None:
+            _refresh_failures += 1
+            logger.warning(
+                f"Switch refresh returned no switches ({_refresh_failures} in a row); keeping snapshot "
+                f"v{_snapshot.version} from {_last_attempt - _snapshot.created_at:.0f}s ago"
+            )
+            return _snapshot
+
+        _refresh_failures = 0
+        snapshot = build_snapshot(data)
+        logger.info(f"Switch snapshot v{snapshot.version} built in {time.time() - start_time:.2f}s")
+        return snapshot
+
+
+def is_snapshot_stale() -> bool:
+    """True while the latest refreshes failed and the snapshot is being served past its TTL."""
+    return _refresh_failures > 0
+
+
+def get_cached_snapshot() -> Optional[SwitchSnapshot]:
+    """Return the current snapshot without triggering a refresh."""
+    return _snapshot
@@ -0,0 +1,234 @@
+import heapq
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Layout geometry defaults (pixels)
+ROOT_POSITION = (400, 100)
+SWITCH_ROW_Y = 300
+DEVICE_ROW_Y = 450
+NODE_SPACING = 120
+ROW_SPACING = 90
+DEVICE_COLUMNS = 8  # Devices per row inside a switch block before wrapping
+UNATTACHED = "__unattached__"  # Block (right of the switch row) for devices without a known switch
+
+
+class _SlotAllocator:
+    """Hands out the lowest free integer slot and remembers who owns it (O(log n) per call)."""
+
+    def __init__(self):
+        self.owner_by_slot: Dict[int, str] = {}
+        self.slot_by_owner: Dict[str, int] = {}
+        self._free: List[int] = []  # Min-heap of released slots below _next
+        self._next = 0  # Lowest slot never handed out
+
+    def get(self, owner: str) -> Optional[int]:
+        return self.slot_by_owner.get(owner)
+
+    def allocate(self, owner: str) -> int:
+        slot = self.slot_by_owner.get(owner)
+        if slot is not None:
+            return slot
+        if self._free:
+            slot = heapq.heappop(self._free)
+        else:
+            slot = self._next
+            self._next += 1
+        self.owner_by_slot[slot] = owner
+        self.slot_by_owner[owner] = slot
+        return slot
+
+    def release(self, owner: str) -> None:
+        slot = self.slot_by_owner.pop(owner, None)
+        if slot is not None:
+            self.owner_by_slot.pop(slot, None)
+            heapq.heappush(self._free, slot)
+
+    def owners(self) -> List[str]:
+        return list(self.slot_by_owner.keys())
+
+    def __len__(self) -> int:
+        return len(self.slot_by_owner)
+
+
+class TopologyLayoutEngine:
+    """
+    Hierarchical FortiGate -> FortiSwitch -> port -> device layout with cached coordinates.
+
+    Every switch owns a fixed-width block on the switch row. Devices are placed into a
+    grid inside their switch's block, grouped by port, wrapping every DEVICE_COLUMNS
+    nodes so thousands of devices never end up on a single line. Positions are cached
+    by node ID: a node keeps its slot across refreshes until it disappears or moves to
+    another switch, so only new or moved nodes are laid out again.
+    """
+
+    def __init__(
+        self,
+        node_spacing: int = NODE_SPACING,
+        row_spacing: int = ROW_SPACING,
+        device_columns: int = DEVICE_COLUMNS,
+    ):
+        self.node_spacing = node_spacing
+        self.row_spacing = row_spacing
+        self.device_columns = max(1, device_columns)
+        self.block_width = self.device_columns * self.node_spacing + self.node_spacing
+
+        self._switch_slots = _SlotAllocator()
+        self._device_slots: Dict[str, _SlotAllocator] = {}
+        self._device_parent: Dict[str, str] = {}
+        self._positions: Dict[str, Dict[str, int]] = {}
+        self._slot_span: Optional[int] = None
+        self._lock = threading.Lock()
+        self.version = 0
+        self.last_relayout_count = 0
+
+    def _switch_x(self, slot: int, switch_count: int) -> int:
+        """Center the switch row under the FortiGate."""
+        total_width = max(switch_count, 1) * self.block_width
+        left = ROOT_POSITION[0] - total_width // 2
+        return left + slot * self.block_width + self.block_width // 2
+
+    def _device_xy(self, switch_x: int, slot: int) -> Tuple[int, int]:
+        row, column = divmod(slot, self.device_columns)
+        row_width = (self.device_columns - 1) * self.node_spacing
+        x = switch_x - row_width // 2 + column * self.node_spacing
+        y = DEVICE_ROW_Y + row * self.row_spacing
+        return x, y
+
+    def layout(
+        self,
+        root_id: str,
+        switch_ids: Iterable[str],
+        devices: Iterable[Tuple[str, str, str]],
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        Compute positions for the whole topology.
+
+        Args:
+            root_id: Node ID of the FortiGate
+            switch_ids: Node IDs of the FortiSwitches, in display order
+            devices: (device_id, switch_id, port_name) tuples; devices whose switch_id is
+                None or not in switch_ids go to an "unattached" block right of the switches
+
+        Returns:
+            Dict mapping node ID to {"x": int, "y": int}
+        """
+        with self._lock:
+            switch_ids = [s for s in switch_ids if s]
+            current_switches = set(switch_ids)
+
+            # Devices are sorted by (switch, port, id) so fresh blocks cluster by port
+            device_list = sorted(
+                (
+                    (d[0], d[1] if d[1] in current_switches else UNATTACHED, d[2])
+                    for d in devices if d and d[0]
+                ),
+                key=lambda d: (d[1], str(d[2] or ""), d[0]),
+            )
+            current_devices = {d[0] for d in device_list}
+
+            relaid_out = set()
+
+            # Release switches (and their device blocks) that disappeared
+            for switch_id in self._switch_slots.owners():
+                if switch_id not in current_switches:
+                    self._switch_slots.release(switch_id)
+                    self._device_slots.pop(switch_id, None)
+                    self._positions.pop(switch_id, None)
+
+            # Release devices that disappeared or whose switch disappeared
+            for device_id, parent_id in list(self._device_parent.items()):
+                if device_id not in current_devices or (parent_id != UNATTACHED and parent_id not in current_switches):
+                    allocator = self._device_slots.get(parent_id)
+                    if allocator is not None:
+                        allocator.release(device_id)
+                    del self._device_parent[device_id]
+                    self._positions.pop(device_id, None)
+
+            for switch_id in switch_ids:
+                if self._switch_slots.get(switch_id) is None:
+                    relaid_out.add(switch_id)
+                self._switch_slots.allocate(switch_id)
+                self._device_slots.setdefault(switch_id, _SlotAllocator())
+            self._device_slots.setdefault(UNATTACHED, _SlotAllocator())
+
+            # The switch row is centered on the highest used slot; if that changes every
+            # switch block shifts, so everything below has to be re-positioned.
+            slot_span = max(self._switch_slots.slot_by_owner.values(), default=-1) + 1
+            geometry_changed = slot_span != self._slot_span
+            self._slot_span = slot_span
+
+            for device_id, switch_id, _port in device_list:
+                parent_id = self._device_parent.get(device_id)
+                if parent_id is not None and parent_id != switch_id:
+                    self._device_slots[parent_id].release(device_id)
+                    self._positions.pop(device_id, None)
+                    parent_id = None
+                if parent_id is None:
+                    self._device_slots[switch_id].allocate(device_id)
+                    self._device_parent[device_id] = switch_id
+                    relaid_out.add(device_id)
+
+            # Materialize coordinates for anything new or affected by a geometry change
+            if root_id not in self._positions:
+                relaid_out.add(root_id)
+            self._positions[root_id] = {"x": ROOT_POSITION[0], "y": ROOT_POSITION[1]}
+
+            for switch_id in switch_ids:
+                if not geometry_changed and switch_id not in relaid_out and switch_id in self._positions:
+                    continue
+                slot = self._switch_slots.get(switch_id)
+                self._positions[switch_id] = {
+                    "x": self._switch_x(slot, slot_span),
+                    "y": SWITCH_ROW_Y,
+                }
+
+            for device_id, switch_id, _port in device_list:
+                if not geometry_changed and device_id not in relaid_out and device_id in self._positions:
+                    continue
+                if switch_id == UNATTACHED:
+                    # One block past the last switch slot
+                    switch_x = self._switch_x(slot_span, slot_span)
+                else:
+                    switch_x = self._positions[switch_id]["x"]
+                slot = self._device_slots[switch_id].get(device_id)
+                x, y = self._device_xy(switch_x, slot)
+                self._positions[device_id] = {"x": x, "y": y}
+
+            self.last_relayout_count = len(switch_ids) + len(device_list) + 1 if geometry_changed else len(relaid_out)
+            if self.last_relayout_count:
+                self.version += 1
+
+            logger.debug(
+                f"Topology layout v{self.version}: {self.last_relayout_count} of "
+                f"{len(switch_ids) + len(device_list) + 1} nodes laid out"
+            )
+
+            return {
+                node_id: dict(self._positions[node_id])
+                for node_id in [root_id, *switch_ids, *(d[0] for d in device_list)]
+            }
+
+    def reset(self) -> None:
+        """Drop all cached positions (next layout starts from scratch)."""
+        with self._lock:
+            self._switch_slots = _SlotAllocator()
+            self._device_slots.clear()
+            self._device_parent.clear()
+            self._positions.clear()
+            self._slot_span = None
+            self.version += 1
+
+
+# Global layout engine instance
+_layout_engine = None
+
+
+def get_layout_engine() -> TopologyLayoutEngine:
+    """Get the global topology layout engine instance"""
+    global _layout_engine
+    if _layout_engine is None:
+        _layout_engine = TopologyLayoutEngine()
+    return _layout_engine
@@ -0,0 +1,149 @@
+"""
+Keep synchronous I/O off the event loop.
+
+The legacy services (fortigate_service, fortiswitch_service) are synchronous:
+requests calls plus time.sleep() rate limiting. Called from an async route they
+stall every other request for the whole FortiGate round trip.
+
+warn_if_blocking() is called from the shared requests adapter that every sync
+FortiGate/FortiSwitch call goes through; when it finds itself running on an event
+loop thread it logs the offending call site with a stack, once per site, and
+counts it in event_loop_blocking_calls_total. BLOCKING_GUARD_MODE=raise turns
+this into an error for development, =off disables it.
+
+run_sync() / offload() run those functions in a small dedicated thread pool so
+the old entry points stay usable from async code without blocking the loop.
+call_async() goes the other way: a sync entry point running in that pool hands
+its coroutine back to the application's event loop, where the shared HTTP
+pools, locks and caches live.
+"""
+import os
+import asyncio
+import logging
+import functools
+import threading
+import traceback
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional, Set, Tuple, TypeVar
+
+from .telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+BLOCKING_GUARD_MODE = os.environ.get("BLOCKING_GUARD_MODE", "warn").lower()  # warn | raise | off
+# Worker threads for legacy sync calls; they are FortiGate-bound, so keep this small
+SYNC_OFFLOAD_WORKERS = int(os.environ.get("SYNC_OFFLOAD_WORKERS", "4"))
+
+T = TypeVar("T")
+
+
+class BlockingCallError(RuntimeError):
+    """Raised in BLOCKING_GUARD_MODE=raise when sync I/O runs on the event loop."""
+
+
+def on_event_loop() -> bool:
+    """True if the current thread is running an asyncio event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+_reported: Set[Tuple[str, str, int]] = set()
+_reported_lock = threading.Lock()
+
+
+def warn_if_blocking(operation: str) -> None:
+    """Report sync I/O (operation) executed on the event loop thread."""
+    if BLOCKING_GUARD_MODE == "off" or not on_event_loop():
+        return
+
+    stack = [f for f in traceback.extract_stack() if "/app/utils/blocking" not in f.filename]
+    # Innermost frame outside the HTTP client plumbing is the call site
+    caller = next(
+        (f for f in reversed(stack) if "/app/services/http_clients" not in f.filename
+         and "site-packages" not in f.filename),
+        stack[-1],
+    )
+    get_telemetry().increment("event_loop_blocking_calls_total", operation)
+
+    if BLOCKING_GUARD_MODE == "raise":
+        raise BlockingCallError(f"Blocking call '{operation}' on the event loop at {caller.filename}:{caller.lineno}")
+
+    site = (operation, caller.filename, caller.lineno)
+    with _reported_lock:
+        if site in _reported:
+            return
+        _reported.add(site)
+    logger.warning(
+        f"Blocking call '{operation}' on the event loop at {caller.filename}:{caller.lineno} "
+        f"({caller.name}); use run_sync()/offload().\n" + "".join(traceback.format_list(stack[-12:]))
+    )
+
+
+# --- Offloading ---
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# Event loop that last offloaded work; call_async() submits coroutines back to it
+_app_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_sync_executor() -> ThreadPoolExecutor:
+    """Dedicated pool for legacy sync calls (separate from the default executor)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=SYNC_OFFLOAD_WORKERS, thread_name_prefix="sync-offload")
+    return _executor
+
+
+async def run_sync(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking function in the offload pool, keeping context (tracing spans)."""
+    global _app_loop
+    loop = _app_loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_sync_executor(), call)
+
+
+def offload(func: Callable[..., T]) -> Callable[..., Any]:
+    """
+    Async adapter for a sync function: `await offload(get_interfaces)()`.
+    The original stays available as .sync for non-async callers.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_sync(func, *args, **kwargs)
+
+    wrapper.sync = func
+    return wrapper
+
+
+def call_async(func: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+    """
+    Run coroutine function func from sync code and wait for the result: on the
+    application's loop when called from the offload pool, otherwise (scripts)
+    in a new loop. Must not be called on an event loop thread.
+    """
+    if on_event_loop():
+        raise BlockingCallError(f"call_async({getattr(func, '__qualname__', func)}) on the event loop; await it instead")
+    loop = _app_loop
+    if loop is not None and loop.is_running() and not loop.is_closed():
+        return asyncio.run_coroutine_threadsafe(func(*args, **kwargs), loop).result()
+    # Imported here: the HTTP client registry itself uses this module
+    from app.services.http_clients import run_async
+
+    return run_async(func, *args, **kwargs)
+
+
+def shutdown_sync_executor() -> None:
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,121 @@
+"""
+Dictionary encoding for categorical columns.
+
+Manufacturer names, device types, VLANs, port status and DHCP interface names
+take a handful of distinct values but repeat on every row. A CategoryDictionary
+gives each distinct value an integer code and keeps one shared lookup table
+(values[code]), so rows can hold the canonical value object (one string per
+distinct value in memory) or, on the wire, just the code.
+
+Encoded payloads look like
+    {"encoding": "dictionary", "dictionaries": {"manufacturer": ["Apple", "Cisco"]},
+     "rows": [{"device_mac": "...", "manufacturer": 1}, ...]}
+and decode_rows() turns them back into plain rows.
+"""
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Mapping, MutableMapping, Tuple
+
+ENCODING_NAME = "dictionary"
+MAX_CATEGORIES = 65536  # Per column; a column with more distinct values is not categorical
+
+
+class CategoryDictionary:
+    """Value <-> integer code for one column. Codes are dense and never reassigned."""
+
+    def __init__(self, max_size: int = MAX_CATEGORIES):
+        self.max_size = max_size
+        self.values: List[Any] = []
+        self._codes: Dict[Tuple[type, Any], int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value: Any) -> int:
+        """Code for value, adding it to the table on first sight."""
+        key = (type(value), value)  # Keeps 1, 1.0 and True apart
+        code = self._codes.get(key)
+        if code is not None:
+            return code
+        with self._lock:
+            code = self._codes.get(key)
+            if code is None:
+                if len(self.values) >= self.max_size:
+                    raise OverflowError(f"More than {self.max_size} distinct values in one column")
+                if type(value) is str:
+                    value = sys.intern(value)
+                code = len(self.values)
+                self.values.append(value)
+                self._codes[key] = code
+        return code
+
+    def decode(self, code: int) -> Any:
+        return self.values[code]
+
+    def intern(self, value: Any) -> Any:
+        """The canonical (shared) instance equal to value."""
+        if value is None:
+            return None
+        try:
+            return self.values[self.encode(value)]
+        except (TypeError, OverflowError):
+            # Unhashable values and overflowing columns are kept as they are
+            return sys.intern(value) if type(value) is str else value
+
+
+class CategoryTable:
+    """One CategoryDictionary per column name."""
+
+    def __init__(self, max_size: int = MAX_CATEGORIES):
+        self.max_size = max_size
+        self.columns: Dict[str, CategoryDictionary] = {}
+
+    def column(self, name: str) -> CategoryDictionary:
+        dictionary = self.columns.get(name)
+        if dictionary is None:
+            dictionary = self.columns.setdefault(name, CategoryDictionary(self.max_size))
+        return dictionary
+
+    def encode(self, name: str, value: Any) -> int:
+        return self.column(name).encode(value)
+
+    def intern(self, name: str, value: Any) -> Any:
+        return self.column(name).intern(value)
+
+    def to_dict(self) -> Dict[str, List[Any]]:
+        """Lookup tables as {column: [value for code 0, 1, ...]}."""
+        return {name: list(dictionary.values) for name, dictionary in self.columns.items()}
+
+    def stats(self) -> Dict[str, int]:
+        return {name: len(dictionary) for name, dictionary in self.columns.items()}
+
+
+def encode_fields(row: MutableMapping, fields: Iterable[str], table: CategoryTable) -> MutableMapping:
+    """Replace the categorical fields of one row with their codes (in place)."""
+    for field in fields:
+        if field in row:
+            row[field] = table.encode(field, row[field])
+    return row
+
+
+def decode_fields(row: MutableMapping, dictionaries: Mapping[str, List[Any]]) -> MutableMapping:
+    """Replace codes with values (in place) for every column in dictionaries."""
+    for field, values in dictionaries.items():
+        if field in row:
+            row[field] = values[row[field]]
+    return row
+
+
+def encode_rows(rows: Iterable[Mapping], fields: Iterable[str]) -> Dict[str, Any]:
+    """Dictionary-encode a list of rows with one lookup table per categorical field."""
+    fields = tuple(fields)
+    table = CategoryTable()
+    encoded = [encode_fields(dict(row), fields, table) for row in rows]
+    return {"encoding": ENCODING_NAME, "dictionaries": table.to_dict(), "rows": encoded}
+
+
+def decode_rows(payload: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    """Inverse of encode_rows."""
+    dictionaries = payload.get("dictionaries", {})
+    return [decode_fields(dict(row), dictionaries) for row in payload.get("rows", ())]
@@ -0,0 +1,129 @@
+"""
+Precompressed payload variants for cached snapshot responses.
+
+Payloads are compressed once per snapshot refresh with every enabled codec and
+the best variant is picked per request from Accept-Encoding, so compression
+cost does not scale with the number of clients. gzip is always available;
+brotli ("br") and zstd are used when their packages are installed.
+"""
+import os
+import gzip
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+PRECOMPRESS_ENABLED = os.environ.get("PRECOMPRESS_SNAPSHOTS", "true").lower() == "true"
+
+# Payloads smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = int(os.environ.get("PRECOMPRESS_MIN_SIZE", "1024"))
+
+# Compression levels: snapshots are compressed once per refresh, so favor ratio
+GZIP_LEVEL = int(os.environ.get("PRECOMPRESS_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("PRECOMPRESS_BROTLI_QUALITY", "5"))
+ZSTD_LEVEL = int(os.environ.get("PRECOMPRESS_ZSTD_LEVEL", "9"))
+
+
+def _gzip(body: bytes, level: int = GZIP_LEVEL) -> bytes:
+    # mtime=0 keeps output deterministic for identical payloads
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def _brotli(body: bytes, level: int = BROTLI_QUALITY) -> bytes:
+    return brotli.compress(body, quality=level)
+
+
+def _zstd(body: bytes, level: int = ZSTD_LEVEL) -> bytes:
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+# Server preference order when the client accepts several encodings equally
+CODECS: Dict[str, Callable[..., bytes]] = {}
+if zstandard is not None:
+    CODECS["zstd"] = _zstd
+if brotli is not None:
+    CODECS["br"] = _brotli
+CODECS["gzip"] = _gzip
+
+
+def enabled_encodings() -> List[str]:
+    """Encodings to precompress, from PRECOMPRESS_ENCODINGS (default: all available)."""
+    configured = os.environ.get("PRECOMPRESS_ENCODINGS")
+    if configured is None:
+        return list(CODECS.keys())
+    wanted = [e.strip().lower() for e in configured.split(",") if e.strip()]
+    missing = [e for e in wanted if e not in CODECS]
+    if missing:
+        logger.warning(f"Precompression codecs not available, skipping: {', '.join(missing)}")
+    return [e for e in CODECS if e in wanted]
+
+
+def precompress(body: bytes, encodings: Optional[List[str]] = None) -> Dict[str, bytes]:
+    """Compress body with each encoding; variants that do not shrink it are dropped."""
+    variants: Dict[str, bytes] = {}
+    if len(body) < MIN_COMPRESS_SIZE:
+        return variants
+    for encoding in (encodings if encodings is not None else enabled_encodings()):
+        codec = CODECS.get(encoding)
+        if codec is None:
+            continue
+        try:
+            compressed = codec(body)
+        except Exception as e:
+            logger.error(f"Error precompressing payload with {encoding}: {e}")
+            continue
+        if len(compressed) < len(body):
+            variants[encoding] = compressed
+    return variants
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into {encoding: q}."""
+    accepted: Dict[str, float] = {}
+    if not header:
+        return accepted
+    for part in header.split(","):
+        fields = [f.strip() for f in part.split(";")]
+        encoding = fields[0].lower()
+        if not encoding:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[encoding] = q
+    return accepted
+
+
+def negotiate(header: Optional[str], available: Dict[str, bytes]) -> Optional[Tuple[str, bytes]]:
+    """
+    Pick the best precompressed variant for an Accept-Encoding header.
+    Returns (encoding, body) or None to send the identity payload.
+    """
+    if not available:
+        return None
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*")
+    best = None
+    for encoding in CODECS:  # server preference order
+        if encoding not in available:
+            continue
+        q = accepted.get(encoding, wildcard if wildcard is not None else 0.0)
+        if q > 0 and (best is None or q > best[0]):
+            best = (q, encoding)
+    if best is None:
+        return None
+    return best[1], available[best[1]]
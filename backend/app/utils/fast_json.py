@@ -0,0 +1,170 @@
+"""
+Fast JSON response path for large API payloads.
+
+Uses orjson when it is installed (falls back to the stdlib encoder), stores
+pre-serialized bytes so a cached payload is only encoded once, and answers
+conditional requests (If-None-Match) with 304 before any serialization happens.
+The path is opt-in via FAST_JSON_RESPONSES=true.
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+from datetime import datetime, date
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .compression import negotiate
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+FAST_JSON_ENABLED = os.environ.get("FAST_JSON_RESPONSES", "false").lower() == "true"
+
+# Distinguishes ETags issued by this process from those of a previous run/worker
+_BOOT_ID = uuid.uuid4().hex[:8]
+
+
+def _default(obj: Any) -> Any:
+    """Fallback encoder for types neither orjson nor json handle natively."""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def version_etag(*parts: Any) -> str:
+    """Weak ETag derived from a version identifier (no payload hashing needed)."""
+    return 'W/"' + "-".join([_BOOT_ID, *(str(p) for p in parts)]) + '"'
+
+
+def content_etag(body: bytes) -> str:
+    """Strong ETag derived from the serialized payload."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check If-None-Match against an ETag (weak comparison, supports lists and *)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+class SerializedEntry:
+    """A payload serialized once (and optionally precompressed once) and served many times."""
+
+    __slots__ = ("body", "etag", "created_at", "variants")
+
+    def __init__(
+        self,
+        body: bytes,
+        etag: Optional[str] = None,
+        created_at: Optional[float] = None,
+        variants: Optional[Dict[str, bytes]] = None,
+    ):
+        self.body = body
+        self.etag = etag or content_etag(body)
+        self.created_at = created_at if created_at is not None else time.time()
+        self.variants = variants or {}
+
+
+def snapshot_headers(version: int, created_at: float, stale: bool = False) -> Dict[str, str]:
+    """
+    Staleness headers for a cached snapshot: Cache-Age (seconds since it was built),
+    X-Snapshot-Version, and X-Snapshot-Stale when refreshes are failing.
+    """
+    headers = {
+        "Cache-Age": str(max(0, int(time.time() - created_at))),
+        "X-Snapshot-Version": str(version),
+    }
+    if stale:
+        headers["X-Snapshot-Stale"] = "true"
+    return headers
+
+
+def not_modified(etag: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, **(headers or {})})
+
+
+def entry_response(
+    request: Request,
+    entry: SerializedEntry,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Serve a pre-serialized entry, or 304 if the client already has it. When the entry
+    carries precompressed variants, the best one for Accept-Encoding is sent as-is.
+    """
+    if etag_matches(request, entry.etag):
+        return not_modified(entry.etag, headers)
+
+    response_headers = {"ETag": entry.etag, **(headers or {})}
+    body = entry.body
+    if entry.variants:
+        response_headers["Vary"] = "Accept-Encoding"
+        chosen = negotiate(request.headers.get("accept-encoding"), entry.variants)
+        if chosen is not None:
+            encoding, body = chosen
+            response_headers["Content-Encoding"] = encoding
+
+    return Response(content=body, media_type="application/json", headers=response_headers)
+
+
+def cached_json_response(
+    request: Request,
+    etag: str,
+    build_entry: Callable[[], SerializedEntry],
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Answer with 304 when the client's ETag matches, otherwise build (or fetch from
+    cache) the serialized entry. build_entry is never called for a 304.
+    """
+    if etag_matches(request, etag):
+        return not_modified(etag, headers)
+    return entry_response(request, build_entry(), headers)
+
+
+async def cached_json_response_async(
+    request: Request,
+    etag: str,
+    build_entry: Callable[[], Awaitable[SerializedEntry]],
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """cached_json_response() for entries built off the event loop (awaited only on a miss)."""
+    if etag_matches(request, etag):
+        return not_modified(etag, headers)
+    return entry_response(request, await build_entry(), headers)
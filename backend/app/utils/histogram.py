@@ -0,0 +1,117 @@
+"""
+HDR-style latency histogram.
+
+Durations are recorded in integer microseconds into log-linear buckets: values
+below 2**SIGNIFICANT_BITS get one bucket each, and every power of two above that
+is split into 2**(SIGNIFICANT_BITS - 1) equal sub-buckets. Recording is O(1) (a
+bit_length and a shift), memory is fixed per histogram, and any percentile is
+reported with a relative error below 2**-(SIGNIFICANT_BITS - 1) (~1.6% by default)
+regardless of how the latencies are distributed.
+"""
+import os
+import threading
+from array import array
+from typing import Dict, Iterable, Optional
+
+SIGNIFICANT_BITS = int(os.environ.get("HISTOGRAM_SIGNIFICANT_BITS", "7"))
+MAX_TRACKABLE_US = 3600 * 1_000_000  # One hour; longer values are clamped
+
+_LINEAR = 1 << SIGNIFICANT_BITS  # Values with one bucket each
+_HALF = _LINEAR >> 1  # Sub-buckets per power of two above the linear range
+
+
+def bucket_index(value_us: int) -> int:
+    if value_us < _LINEAR:
+        return max(0, value_us)
+    shift = value_us.bit_length() - SIGNIFICANT_BITS
+    return _LINEAR + (shift - 1) * _HALF + ((value_us >> shift) - _HALF)
+
+
+def bucket_upper_bound(index: int) -> int:
+    """Largest microsecond value that lands in bucket index."""
+    if index < _LINEAR:
+        return index
+    shift = (index - _LINEAR) // _HALF + 1
+    sub = (index - _LINEAR) % _HALF + _HALF
+    return ((sub + 1) << shift) - 1
+
+
+_BUCKETS = bucket_index(MAX_TRACKABLE_US) + 1
+
+
+class LatencyHistogram:
+    """Fixed-size log-linear histogram of durations."""
+
+    __slots__ = ("counts", "count", "total_us", "min_us", "max_us", "_lock")
+
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * _BUCKETS))
+        self.count = 0
+        self.total_us = 0
+        self.min_us = 0
+        self.max_us = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        value = min(MAX_TRACKABLE_US, max(0, int(seconds * 1_000_000)))
+        index = bucket_index(value)
+        with self._lock:
+            self.counts[index] += 1
+            if self.count == 0 or value < self.min_us:
+                self.min_us = value
+            if value > self.max_us:
+                self.max_us = value
+            self.count += 1
+            self.total_us += value
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        with self._lock:
+            for i, c in enumerate(other.counts):
+                if c:
+                    self.counts[i] += c
+            if other.count:
+                self.min_us = other.min_us if self.count == 0 else min(self.min_us, other.min_us)
+                self.max_us = max(self.max_us, other.max_us)
+            self.count += other.count
+            self.total_us += other.total_us
+
+    def percentiles(self, quantiles: Iterable[float]) -> Dict[float, float]:
+        """Values (seconds) at each quantile in [0, 1], using bucket upper bounds like HdrHistogram."""
+        wanted = sorted(set(quantiles))
+        result: Dict[float, float] = {}
+        with self._lock:
+            if self.count == 0:
+                return {q: 0.0 for q in wanted}
+            ranks = [(q, max(1, int(q * self.count + 0.5))) for q in wanted]
+            seen = 0
+            position = 0
+            for index, c in enumerate(self.counts):
+                if not c:
+                    continue
+                seen += c
+                while position < len(ranks) and seen >= ranks[position][1]:
+                    q = ranks[position][0]
+                    result[q] = min(bucket_upper_bound(index), self.max_us) / 1_000_000
+                    position += 1
+                if position == len(ranks):
+                    break
+            for q, _rank in ranks[position:]:
+                result[q] = self.max_us / 1_000_000
+        return result
+
+    def percentile(self, quantile: float) -> float:
+        return self.percentiles([quantile])[quantile]
+
+    @property
+    def total_seconds(self) -> float:
+        return self.total_us / 1_000_000
+
+    def summary(self, quantiles: Optional[Iterable[float]] = None) -> Dict[str, float]:
+        values = self.percentiles(quantiles or (0.5, 0.9, 0.99, 0.999))
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_us / self.count / 1000, 3) if self.count else 0.0,
+            "min_ms": round(self.min_us / 1000, 3),
+            "max_ms": round(self.max_us / 1000, 3),
+            **{f"p{str(q * 100).rstrip('0').rstrip('.')}_ms": round(v * 1000, 3) for q, v in values.items()},
+        }
@@ -0,0 +1,234 @@
+"""
+In-memory device icon index.
+
+The icon database (app/static/icons.db) is read once into hash maps keyed by a
+normalized manufacturer / device type, so enriching thousands of devices costs
+dictionary lookups instead of two SQLite queries per device. Manufacturer names
+from OUI data vary ("Apple, Inc.", "APPLE INC", "Cisco Systems, Inc"), so keys
+drop punctuation and corporate suffixes, known aliases are folded together, and
+a miss falls back to the longest word prefix that is indexed ("cisco systems" ->
+"cisco"). The file's mtime is checked at most every ICON_DB_RELOAD_INTERVAL
+seconds and the index is rebuilt when it changes.
+"""
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ICON_DB_PATH = os.environ.get("ICON_DB_PATH", "app/static/icons.db")
+ICON_DB_RELOAD_INTERVAL = float(os.environ.get("ICON_DB_RELOAD_INTERVAL", "5"))
+MEMO_LIMIT = 50_000  # Distinct (manufacturer, device_type) pairs remembered between reloads
+
+# Column names accepted for each field (first match wins)
+COLUMN_CANDIDATES = {
+    "manufacturer": ("manufacturer", "vendor", "brand"),
+    "device_type": ("device_type", "type", "category"),
+    "icon_path": ("icon_path", "path", "icon"),
+    "title": ("title", "name", "label"),
+}
+
+_CORPORATE_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited",
+    "llc", "gmbh", "ag", "sa", "srl", "bv", "plc", "oy", "ab", "kk", "pty",
+}
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# Normalized alias -> normalized canonical name
+MANUFACTURER_ALIASES = {
+    "hewlett packard": "hp",
+    "hewlett packard enterprise": "hpe",
+    "hon hai precision": "foxconn",
+    "hon hai precision ind": "foxconn",
+    "ubiquiti networks": "ubiquiti",
+    "raspberry pi trading": "raspberry pi",
+    "raspberry pi foundation": "raspberry pi",
+    "samsung electronics": "samsung",
+    "sony interactive entertainment": "sony",
+    "intel corporate": "intel",
+    "fortinet technologies": "fortinet",
+    "cisco meraki": "meraki",
+    "zebra technologies": "zebra",
+    "amazon technologies": "amazon",
+}
+
+
+def normalize_key(value: Any) -> str:
+    """Lowercase, collapse punctuation to single spaces and drop trailing corporate suffixes."""
+    if not value:
+        return ""
+    words = _NON_ALNUM.sub(" ", str(value).lower()).split()
+    while len(words) > 1 and words[-1] in _CORPORATE_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+class IconResolver:
+    """Hash index over the icon table, rebuilt when the database file changes."""
+
+    def __init__(self, path: str = ICON_DB_PATH, reload_interval: float = ICON_DB_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.by_manufacturer: Dict[str, Dict[str, str]] = {}
+        self.by_device_type: Dict[str, Dict[str, str]] = {}
+        self._memo: Dict[tuple, Optional[Dict[str, str]]] = {}
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.loaded_at = 0.0
+        self.load_count = 0
+        self._missing_logged = False
+
+    # --- Loading ---
+
+    def _read_rows(self) -> List[Dict[str, Any]]:
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            connection.row_factory = sqlite3.Row
+            tables = [r[0] for r in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            for table in sorted(tables, key=lambda t: t != "icons"):
+                columns = {r[1] for r in connection.execute(f'PRAGMA table_info("{table}")')}
+                mapping = {
+                    field: next((c for c in candidates if c in columns), None)
+                    for field, candidates in COLUMN_CANDIDATES.items()
+                }
+                if mapping["icon_path"] is None or not (mapping["manufacturer"] or mapping["device_type"]):
+                    continue
+                rows = connection.execute(f'SELECT * FROM "{table}"').fetchall()
+                return [
+                    {field: (row[column] if column else None) for field, column in mapping.items()}
+                    for row in rows
+                ]
+            logger.warning(f"No icon table found in {self.path}")
+            return []
+        finally:
+            connection.close()
+
+    def load(self) -> int:
+        """(Re)build the index from the database; keeps the previous index on failure."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            if not self._missing_logged:
+                logger.warning(f"Icon database {self.path} not found; devices will have no icons")
+                self._missing_logged = True
+            self._mtime = None
+            return 0
+
+        try:
+            rows = self._read_rows()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to load icon database {self.path}: {e}")
+            return 0
+
+        by_manufacturer: Dict[str, Dict[str, str]] = {}
+        by_device_type: Dict[str, Dict[str, str]] = {}
+        for row in rows:
+            if not row["icon_path"]:
+                continue
+            info = {"icon_path": row["icon_path"], "title": row["title"] or row["manufacturer"] or row["device_type"]}
+            manufacturer = normalize_key(row["manufacturer"])
+            if manufacturer:
+                by_manufacturer.setdefault(MANUFACTURER_ALIASES.get(manufacturer, manufacturer), info)
+            device_type = normalize_key(row["device_type"])
+            if device_type:
+                by_device_type.setdefault(device_type, info)
+
+        # Swap in the new index in one step; lookups never see a half-built one
+        self.by_manufacturer, self.by_device_type, self._memo = by_manufacturer, by_device_type, {}
+        self._mtime = mtime
+        self._missing_logged = False
+        self.loaded_at = time.time()
+        self.load_count += 1
+        logger.info(
+            f"Loaded icon index from {self.path}: {len(by_manufacturer)} manufacturers, "
+            f"{len(by_device_type)} device types"
+        )
+        return len(rows)
+
+    def maybe_reload(self) -> None:
+        """Reload if the database file changed (checked at most every reload_interval)."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.reload_interval
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                mtime = None
+            if mtime != self._mtime or self.load_count == 0:
+                self.load()
+
+    # --- Lookups ---
+
+    def _match_manufacturer(self, manufacturer: Any) -> Optional[Dict[str, str]]:
+        key = normalize_key(manufacturer)
+        if not key:
+            return None
+        key = MANUFACTURER_ALIASES.get(key, key)
+        info = self.by_manufacturer.get(key)
+        if info is not None:
+            return info
+        # Longest indexed word prefix: "cisco systems" -> "cisco"
+        words = key.split()
+        for length in range(len(words) - 1, 0, -1):
+            prefix = " ".join(words[:length])
+            info = self.by_manufacturer.get(MANUFACTURER_ALIASES.get(prefix, prefix))
+            if info is not None:
+                return info
+        return None
+
+    def resolve(self, manufacturer: Any = None, device_type: Any = None) -> Optional[Dict[str, str]]:
+        """Icon for a manufacturer, falling back to the device type; None if neither is known."""
+        self.maybe_reload()
+        memo_key = (manufacturer, device_type)
+        try:
+            return self._memo[memo_key]
+        except KeyError:
+            pass
+        info = self._match_manufacturer(manufacturer)
+        if info is None:
+            info = self.by_device_type.get(normalize_key(device_type))
+        if len(self._memo) >= MEMO_LIMIT:
+            self._memo = {}
+        self._memo[memo_key] = info
+        return info
+
+    def enrich(self, device: Dict[str, Any]) -> Dict[str, Any]:
+        """Set icon_path/icon_title on device (in place) unless it already has an icon."""
+        if not device.get("icon_path"):
+            info = self.resolve(device.get("manufacturer"), device.get("device_type"))
+            if info:
+                device["icon_path"] = info["icon_path"]
+                device["icon_title"] = info["title"]
+        return device
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "loaded": self.load_count > 0,
+            "loaded_at": self.loaded_at,
+            "reloads": self.load_count,
+            "manufacturers": len(self.by_manufacturer),
+            "device_types": len(self.by_device_type),
+            "memoized_lookups": len(self._memo),
+        }
+
+
+# Global resolver instance
+_icon_resolver = None
+
+
+def get_icon_resolver() -> IconResolver:
+    """Get the global icon resolver instance"""
+    global _icon_resolver
+    if _icon_resolver is None:
+        _icon_resolver = IconResolver()
+    return _icon_resolver
@@ -0,0 +1,130 @@
+"""
+Incremental parser for FortiOS API responses.
+
+A monitor response is one object with the rows in a top-level "results" array:
+{"http_method": "GET", "results": [{...}, {...}], "vdom": "root", "status": "success"}.
+ResultsParser is fed the body chunk by chunk as it arrives and returns each row
+as soon as it is complete, so only the unparsed tail of the body and the row
+being decoded are held in memory; other top-level fields are collected in .meta.
+"""
+import json
+import codecs
+from typing import Any, Dict, List
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = ",]}" + _WHITESPACE  # What may follow a complete scalar
+COMPACT_THRESHOLD = 64 * 1024  # Drop the consumed prefix of the buffer past this many characters
+
+
+class ResultsParser:
+    """Feed bytes with feed(); call close() at the end of the body."""
+
+    def __init__(self, key: str = "results"):
+        self.key = key
+        self.meta: Dict[str, Any] = {}
+        self.rows_parsed = 0
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        # start -> object -> (key -> colon -> value -> comma_or_end) / array -> done
+        self._state = "start"
+        self._current_key: Any = None
+        self._final = False
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        self._buffer += self._text.decode(chunk)
+        return self._parse()
+
+    def close(self) -> List[Any]:
+        """Parse whatever is left; raises ValueError if the body was incomplete."""
+        self._buffer += self._text.decode(b"", final=True)
+        self._final = True
+        rows = self._parse()
+        if self._state != "done":
+            raise ValueError(f"Truncated JSON response (stopped in state '{self._state}')")
+        return rows
+
+    # --- Internals ---
+
+    def _skip_whitespace(self) -> bool:
+        """Advance past whitespace; False if the buffer ran out."""
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return pos < len(buffer)
+
+    def _decode_value(self) -> Any:
+        """Decode one JSON value at the cursor, or raise _Incomplete."""
+        try:
+            value, end = _decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if self._final:
+                raise
+            raise _Incomplete()
+        # A scalar (number, true/false/null) is complete only once the delimiter after it
+        # has arrived: a chunk may end inside "1.25" or "2.5e3", and raw_decode accepts "1"
+        if not self._final and not isinstance(value, (dict, list, str)):
+            if end == len(self._buffer) or self._buffer[end] not in _DELIMITERS:
+                raise _Incomplete()
+        self._pos = end
+        return value
+
+    def _expect(self, chars: str) -> str:
+        char = self._buffer[self._pos]
+        if char not in chars:
+            raise ValueError(f"Unexpected '{char}' at offset {self._pos} (expected one of '{chars}')")
+        self._pos += 1
+        return char
+
+    def _parse(self) -> List[Any]:
+        rows: List[Any] = []
+        try:
+            while self._state != "done" and self._skip_whitespace():
+                state = self._state
+                if state == "start":
+                    self._expect("{")
+                    self._state = "key"
+                elif state == "key":
+                    if self._buffer[self._pos] == "}":
+                        self._pos += 1
+                        self._state = "done"
+                        continue
+                    self._current_key = self._decode_value()
+                    self._state = "colon"
+                elif state == "colon":
+                    self._expect(":")
+                    self._state = "value"
+                elif state == "value":
+                    if self._current_key == self.key and self._buffer[self._pos] == "[":
+                        self._pos += 1
+                        self._state = "array"
+                    else:
+                        self.meta[self._current_key] = self._decode_value()
+                        self._state = "comma_or_end"
+                elif state == "comma_or_end":
+                    if self._expect(",}") == "}":
+                        self._state = "done"
+                    else:
+                        self._state = "key"
+                elif state == "array":
+                    char = self._buffer[self._pos]
+                    if char == "]":
+                        self._pos += 1
+                        self._state = "comma_or_end"
+                    elif char == ",":
+                        self._pos += 1
+                    else:
+                        rows.append(self._decode_value())
+                        self.rows_parsed += 1
+        except _Incomplete:
+            pass
+        if self._pos > COMPACT_THRESHOLD:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        return rows
+
+
+class _Incomplete(Exception):
+    """The buffer ends in the middle of a value; wait for the next chunk."""
@@ -0,0 +1,17 @@
+"""
+Logging setup for application entry points.
+
+Library modules only create loggers; the root logger is configured once by the
+application (main.py / main_optimized.py) when it is imported, so importing a
+service never changes the host's logging configuration.
+"""
+import os
+import logging
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+def configure_logging() -> None:
+    """Configure the root logger from LOG_LEVEL (default INFO); no-op if already configured."""
+    level = getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper(), logging.INFO)
+    logging.basicConfig(level=level, format=LOG_FORMAT)
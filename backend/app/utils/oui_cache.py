@@ -0,0 +1,256 @@
+"""
+Persistent OUI (MAC prefix -> manufacturer) result cache.
+
+Lookups are stored in a small SQLite database in WAL mode, so every worker
+process reads and writes the same file without blocking each other and a
+restarted or freshly deployed process starts with everything its predecessors
+already resolved. Each process keeps the rows it has seen in a dict in front of
+the database; the whole table is loaded on first use.
+
+Prefixes the resolver does not know are cached as negative entries with a short
+TTL (OUI_CACHE_NEGATIVE_TTL) so unknown/randomized MACs are retried now and then
+rather than on every refresh. prefetch() resolves a whole detected-device table
+with one bulk read and one bulk write.
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from .telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+OUI_CACHE_PATH = os.environ.get("OUI_CACHE_PATH", "./data/oui_cache.db")
+OUI_CACHE_TTL = float(os.environ.get("OUI_CACHE_TTL", str(30 * 86400)))  # Vendor assignments rarely change
+OUI_CACHE_NEGATIVE_TTL = float(os.environ.get("OUI_CACHE_NEGATIVE_TTL", "86400"))
+BUSY_TIMEOUT_MS = 5000
+QUERY_CHUNK = 500  # Stay well below SQLite's bound-parameter limit
+
+UNKNOWN = "Unknown"
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS oui (
+    prefix TEXT PRIMARY KEY,
+    manufacturer TEXT,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+def normalize_prefix(value: str) -> str:
+    """'aa-bb-cc-dd...' / 'AABBCC...' -> 'AA:BB:CC'."""
+    digits = "".join(c for c in str(value).upper() if c in "0123456789ABCDEF")[:6]
+    return ":".join(digits[i:i + 2] for i in range(0, len(digits), 2))
+
+
+class OUICache:
+    """SQLite-backed manufacturer cache shared by all processes using the same file."""
+
+    def __init__(
+        self,
+        path: str = OUI_CACHE_PATH,
+        ttl: float = OUI_CACHE_TTL,
+        negative_ttl: float = OUI_CACHE_NEGATIVE_TTL,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # prefix -> (manufacturer or None for a negative entry, expires_at)
+        self._memory: Dict[str, Tuple[Optional[str], float]] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.disabled = False
+        self.hits = 0
+        self.misses = 0
+        self.resolved = 0
+
+    # --- Storage ---
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Per-thread connection (sqlite3 connections are not shared across threads)."""
+        if self.disabled:
+            return None
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            return connection
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            connection.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(_SCHEMA)
+        except (sqlite3.Error, OSError) as e:
+            # Fall back to the in-process cache only
+            logger.error(f"OUI cache database {self.path} unavailable: {e}")
+            self.disabled = True
+            return None
+        self._local.connection = connection
+        return connection
+
+    def load(self) -> int:
+        """Load every unexpired row into memory and drop expired ones."""
+        connection = self._connection()
+        self._loaded = True
+        if connection is None:
+            return 0
+        now = time.time()
+        try:
+            connection.execute("DELETE FROM oui WHERE expires_at < ?", (now,))
+            rows = connection.execute("SELECT prefix, manufacturer, expires_at FROM oui").fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to load OUI cache {self.path}: {e}")
+            return 0
+        with self._lock:
+            for prefix, manufacturer, expires_at in rows:
+                self._memory[prefix] = (manufacturer, expires_at)
+        logger.info(f"Loaded {len(rows)} OUI cache entries from {self.path}")
+        return len(rows)
+
+    def _read(self, prefixes: Iterable[str]) -> None:
+        """Pull rows other processes may have written since load()."""
+        connection = self._connection()
+        if connection is None:
+            return
+        prefixes = list(prefixes)
+        try:
+            for start in range(0, len(prefixes), QUERY_CHUNK):
+                chunk = prefixes[start:start + QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = connection.execute(
+                    f"SELECT prefix, manufacturer, expires_at FROM oui WHERE prefix IN ({placeholders})", chunk
+                ).fetchall()
+                with self._lock:
+                    for prefix, manufacturer, expires_at in rows:
+                        self._memory[prefix] = (manufacturer, expires_at)
+        except sqlite3.Error as e:
+            logger.warning(f"OUI cache read failed: {e}")
+
+    def _write(self, entries: Dict[str, Optional[str]]) -> None:
+        now = time.time()
+        rows = [
+            (prefix, manufacturer, now, now + (self.ttl if manufacturer else self.negative_ttl))
+            for prefix, manufacturer in entries.items()
+        ]
+        with self._lock:
+            for prefix, manufacturer, _fetched_at, expires_at in rows:
+                self._memory[prefix] = (manufacturer, expires_at)
+        connection = self._connection()
+        if connection is None or not rows:
+            return
+        try:
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.executemany(
+                    "INSERT OR REPLACE INTO oui (prefix, manufacturer, fetched_at, expires_at) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"OUI cache write failed: {e}")
+
+    # --- Lookups ---
+
+    def _cached(self, prefix: str) -> Tuple[bool, Optional[str]]:
+        entry = self._memory.get(prefix)
+        if entry is None or entry[1] < time.time():
+            return False, None
+        return True, entry[0]
+
+    def _resolve(self, prefix: str, resolver: Callable[[str], Optional[str]]) -> Tuple[bool, Optional[str]]:
+        """(ok, manufacturer); resolver errors are not cached."""
+        try:
+            result = resolver(prefix)
+        except Exception as e:
+            logger.debug(f"OUI lookup for {prefix} failed: {e}")
+            return False, None
+        self.resolved += 1
+        return True, (result if result and result != UNKNOWN else None)
+
+    def lookup(self, prefix: str, resolver: Callable[[str], Optional[str]]) -> str:
+        """Manufacturer for a MAC prefix, resolving and storing it on a miss."""
+        if not self._loaded:
+            self.load()
+        prefix = normalize_prefix(prefix)
+        found, manufacturer = self._cached(prefix)
+        if not found:
+            self._read([prefix])
+            found, manufacturer = self._cached(prefix)
+        if found:
+            self.hits += 1
+            get_telemetry().record_cache("oui_lookup", True)
+            return manufacturer or UNKNOWN
+
+        self.misses += 1
+        get_telemetry().record_cache("oui_lookup", False)
+        ok, manufacturer = self._resolve(prefix, resolver)
+        if ok:
+            self._write({prefix: manufacturer})
+        return manufacturer or UNKNOWN
+
+    def prefetch(self, prefixes: Iterable[str], resolver: Callable[[str], Optional[str]]) -> int:
+        """
+        Make sure every prefix is cached: one bulk read for rows written by other
+        processes, then resolve only what is still missing and store it in one
+        transaction. Returns the number of prefixes resolved.
+        """
+        if not self._loaded:
+            self.load()
+        wanted = {normalize_prefix(p) for p in prefixes if p}
+        missing = [p for p in wanted if not self._cached(p)[0]]
+        if missing:
+            self._read(missing)
+            missing = [p for p in missing if not self._cached(p)[0]]
+        if not missing:
+            return 0
+
+        started = time.perf_counter()
+        entries: Dict[str, Optional[str]] = {}
+        for prefix in missing:
+            ok, manufacturer = self._resolve(prefix, resolver)
+            if ok:
+                entries[prefix] = manufacturer
+        self._write(entries)
+        logger.info(
+            f"Prefetched {len(entries)}/{len(wanted)} OUI prefixes in {time.perf_counter() - started:.2f}s "
+            f"({sum(1 for m in entries.values() if m is None)} unknown)"
+        )
+        return len(entries)
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, None, len(self._memory))
+
+    def status(self) -> dict:
+        negative = sum(1 for manufacturer, _expires in self._memory.values() if manufacturer is None)
+        return {
+            "path": self.path,
+            "persistent": not self.disabled,
+            "entries": len(self._memory),
+            "negative_entries": negative,
+            "hits": self.hits,
+            "misses": self.misses,
+            "resolved": self.resolved,
+            "ttl": self.ttl,
+            "negative_ttl": self.negative_ttl,
+        }
+
+
+# Global OUI cache instance
+_oui_cache = None
+
+
+def get_oui_cache() -> OUICache:
+    """Get the global OUI cache instance"""
+    global _oui_cache
+    if _oui_cache is None:
+        _oui_cache = OUICache()
+    return _oui_cache
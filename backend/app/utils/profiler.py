@@ -0,0 +1,257 @@
+"""
+Low-overhead diagnostics for production.
+
+SamplingProfiler walks sys._current_frames() from a background thread every few
+milliseconds and aggregates the stacks into the collapsed format understood by
+flamegraph.pl / speedscope ("frame;frame;frame count"). Nothing is hooked into the
+interpreter, so the cost is the sampling thread alone and only while a profile runs.
+The sampler needs the GIL to take a sample, so CPU bursts shorter than
+sys.getswitchinterval() (5ms) tend to be attributed to the next point where the
+loop releases the GIL (usually the selector); longer work shows up as itself.
+
+LoopWatchdog measures event-loop lag with a heartbeat task and, from a separate
+thread, notices when the heartbeat stops: while the loop is blocked (a sync HTTP
+call inside an async handler, a long CPU loop) it samples the loop thread's stack,
+so each stall is reported together with the code that caused it.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from .telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_INTERVAL = 0.01  # 100 Hz
+MAX_PROFILE_SECONDS = 60
+LOOP_HEARTBEAT_INTERVAL = float(os.environ.get("LOOP_HEARTBEAT_INTERVAL", "0.05"))
+LOOP_STALL_THRESHOLD = float(os.environ.get("LOOP_STALL_THRESHOLD", "0.1"))  # Seconds without a heartbeat
+RECENT_STALLS = 100
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename
+    marker = "site-packages" + os.sep
+    if marker in path:
+        path = path.split(marker, 1)[1]
+    else:
+        path = os.sep.join(path.split(os.sep)[-2:])
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame, root: Optional[str] = None) -> str:
+    """Root-first 'a;b;c' rendering of a frame's stack."""
+    labels: List[str] = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    if root:
+        labels.append(root)
+    labels.reverse()
+    return ";".join(labels)
+
+
+def render_collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class SamplingProfiler:
+    """Statistical profiler over all (or selected) threads; one profile at a time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.last_profile: Optional[Dict[str, Any]] = None
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def profile(
+        self,
+        seconds: float,
+        interval: float = DEFAULT_SAMPLE_INTERVAL,
+        thread_ids: Optional[Iterable[int]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Sample for seconds (blocking the calling thread, so run it in a worker).
+        Returns collapsed stacks plus sampling statistics.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            seconds = max(0.1, min(seconds, MAX_PROFILE_SECONDS))
+            wanted = set(thread_ids) if thread_ids is not None else None
+            own = threading.get_ident()
+            stacks: Counter = Counter()
+            samples = 0
+            started = time.perf_counter()
+            deadline = started + seconds
+            next_sample = started
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own or (wanted is not None and ident not in wanted):
+                        continue
+                    stacks[collapse_stack(frame, names.get(ident, f"thread-{ident}"))] += 1
+                samples += 1
+                next_sample += interval
+                delay = next_sample - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_sample = time.perf_counter()  # Fell behind; don't burst
+            elapsed = time.perf_counter() - started
+            self.last_profile = {
+                "finished_at": time.time(),
+                "duration": round(elapsed, 3),
+                "samples": samples,
+                "interval_ms": interval * 1000,
+                "stacks": len(stacks),
+            }
+            logger.info(f"Sampling profile: {samples} samples, {len(stacks)} distinct stacks in {elapsed:.1f}s")
+            return {**self.last_profile, "collapsed": stacks}
+        finally:
+            self._lock.release()
+
+
+class LoopWatchdog:
+    """Event-loop lag histogram plus stack capture for stalls over LOOP_STALL_THRESHOLD."""
+
+    def __init__(self, interval: float = LOOP_HEARTBEAT_INTERVAL, threshold: float = LOOP_STALL_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=RECENT_STALLS)
+        self.max_lag = 0.0
+        self._beat = 0.0
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._current: Optional[Dict[str, Any]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start watching the running event loop (call from inside it)."""
+        if self.running:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Event loop watchdog started (stall threshold {self.threshold * 1000:.0f}ms)")
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 1.0)
+            self._thread = None
+
+    async def _heartbeat(self) -> None:
+        telemetry = get_telemetry()
+        while True:
+            scheduled = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self._beat = now
+            lag = max(0.0, now - scheduled - self.interval)
+            self.max_lag = max(self.max_lag, lag)
+            telemetry.observe("event_loop_lag_seconds", lag)
+
+    def _watch(self) -> None:
+        check = min(self.interval, self.threshold) / 2
+        while not self._stop.wait(check):
+            stalled = time.perf_counter() - self._beat - self.interval
+            current = self._current
+            if stalled > self.threshold:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is None:
+                    continue
+                stack = collapse_stack(frame)
+                if current is None:
+                    current = self._current = {
+                        "started_at": time.time() - stalled,
+                        "stacks": Counter(),
+                    }
+                current["stacks"][stack] += 1
+                current["duration"] = stalled
+            elif current is not None:
+                self._finish(current)
+                self._current = None
+
+    def _finish(self, stall: Dict[str, Any]) -> None:
+        stacks: Counter = stall.pop("stacks")
+        stack, _count = stacks.most_common(1)[0]
+        event = {
+            "started_at": stall["started_at"],
+            "duration_ms": round(stall["duration"] * 1000, 1),
+            # Innermost frame first: usually the blocking call itself
+            "blocking_frame": stack.rsplit(";", 1)[-1],
+            "stack": stack,
+            "samples": sum(stacks.values()),
+        }
+        self.stalls.append(event)
+        get_telemetry().increment("event_loop_stalls_total")
+        logger.warning(f"Event loop blocked for {event['duration_ms']}ms in {event['blocking_frame']}")
+
+    def status(self) -> Dict[str, Any]:
+        histogram = get_telemetry().histogram("event_loop_lag_seconds")
+        return {
+            "running": self.running,
+            "heartbeat_interval_ms": self.interval * 1000,
+            "stall_threshold_ms": self.threshold * 1000,
+            "lag": histogram.summary(),
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "blocked_now_ms": round(self._current["duration"] * 1000, 1) if self._current else 0.0,
+            "stalls": len(self.stalls),
+        }
+
+    def slow_callbacks(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return list(self.stalls)[-limit:][::-1]
+
+    def stall_flamegraph(self) -> Counter:
+        """Collapsed stacks of all recorded stalls, weighted by duration in ms."""
+        stacks: Counter = Counter()
+        for event in self.stalls:
+            stacks[event["stack"]] += max(1, int(event["duration_ms"]))
+        return stacks
+
+
+# Global instances
+_profiler = None
+_loop_watchdog = None
+
+
+def get_profiler() -> SamplingProfiler:
+    """Get the global sampling profiler instance"""
+    global _profiler
+    if _profiler is None:
+        _profiler = SamplingProfiler()
+    return _profiler
+
+
+def get_loop_watchdog() -> LoopWatchdog:
+    """Get the global event loop watchdog instance"""
+    global _loop_watchdog
+    if _loop_watchdog is None:
+        _loop_watchdog = LoopWatchdog()
+    return _loop_watchdog
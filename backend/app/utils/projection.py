@@ -0,0 +1,46 @@
+"""
+Declarative field projection for FortiOS API rows.
+
+A Projection names the fields the application reads from one endpoint and their
+defaults. params() asks FortiOS to return only those fields (format=f1|f2|...);
+project() packs each parsed row into a namedtuple right away, dropping anything
+else the firmware sent anyway. A namedtuple has no per-row dict, so a projected
+row takes a fraction of the memory of the original JSON object, and comparing
+two rows is a tuple comparison.
+"""
+from collections import namedtuple
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class Projection:
+    """Fields kept from one endpoint, packed into a namedtuple row type."""
+
+    def __init__(self, name: str, endpoint: str, fields: Dict[str, Any], computed: Optional[Dict[str, Any]] = None):
+        """
+        fields: {field: default} requested from the API (default used when a row lacks it).
+        computed: {field: default} filled in later by the application, not requested.
+        """
+        computed = computed or {}
+        self.name = name
+        self.endpoint = endpoint
+        self.fields = tuple(fields)
+        self.row_type = namedtuple(name, self.fields + tuple(computed))
+        self._items = tuple(fields.items())
+        self._computed = list(computed.values())
+
+    def params(self) -> Dict[str, str]:
+        """Query parameters selecting the projected fields."""
+        return {"format": "|".join(self.fields)}
+
+    def project(self, row: Any) -> Optional[tuple]:
+        """Row as a row_type tuple; projected rows pass through, non-dicts give None."""
+        if isinstance(row, self.row_type):
+            return row
+        if not isinstance(row, dict):
+            return None
+        get = row.get
+        return self.row_type._make([get(field, default) for field, default in self._items] + self._computed)
+
+    def project_all(self, rows: Iterable[Any]) -> List[tuple]:
+        projected = (self.project(row) for row in rows)
+        return [row for row in projected if row is not None]
@@ -0,0 +1,256 @@
+"""
+Latency metrics and lightweight tracing.
+
+Every HTTP route, outbound FortiGate endpoint and pipeline phase gets its own
+HDR-style histogram (see histogram.py). Phases are measured with span(), which
+also links nested spans into traces so the last few discovery runs can be
+inspected. render_prometheus() exports everything in Prometheus text format as
+summaries (p50/p90/p99/p99.9 plus _sum and _count).
+"""
+import time
+import logging
+import threading
+import itertools
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+
+from .histogram import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+EXPORT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+RECENT_TRACES = 50
+
+# Metric families: name -> (help text, label names)
+FAMILIES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "http_request_duration_seconds": ("HTTP request latency by route", ("method", "route")),
+    "fortigate_api_request_duration_seconds": ("Outbound FortiGate API latency by endpoint", ("endpoint",)),
+    "pipeline_phase_duration_seconds": ("Duration of pipeline phases (tracing spans)", ("pipeline", "phase")),
+    "event_loop_lag_seconds": ("Event loop scheduling delay seen by the watchdog heartbeat", ()),
+    "fortiswitch_api_request_duration_seconds": ("Direct FortiSwitch API latency by endpoint", ("endpoint",)),
+}
+COUNTER_FAMILIES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "http_responses_total": ("HTTP responses by route and status code", ("method", "route", "code")),
+    "fortigate_api_requests_total": ("Outbound FortiGate API calls by endpoint and result", ("endpoint", "result")),
+    "cache_requests_total": ("Cache lookups by cache and result (hit/miss)", ("cache", "result")),
+    "event_loop_stalls_total": ("Event loop stalls longer than the watchdog threshold", ()),
+    "event_loop_blocking_calls_total": ("Synchronous I/O calls made on the event loop thread", ("operation",)),
+    "fortiswitch_api_requests_total": ("Direct FortiSwitch API calls by endpoint and result", ("endpoint", "result")),
+    "fortigate_delta_pages_total": ("Monitor table pages fetched by delta polling", ("table", "state")),
+    "fortigate_delta_rows_total": ("Rows fed to the map builders by delta polling", ("table", "change")),
+}
+CACHE_FAMILY = "cache_requests_total"
+CACHE_RESULTS = {"hit": "hits", "miss": "misses"}
+
+
+def escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    parts = [f'{n}="{escape_label(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Span:
+    __slots__ = ("span_id", "parent", "name", "pipeline", "attributes", "start", "end", "children")
+
+    def __init__(self, span_id: int, parent: Optional["Span"], name: str, pipeline: str, attributes: Dict[str, Any]):
+        self.span_id = span_id
+        self.parent = parent
+        self.name = name
+        self.pipeline = pipeline
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.end = 0.0
+        self.children: List["Span"] = []
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "duration_ms": round(self.duration * 1000, 3),
+            **({"attributes": self.attributes} if self.attributes else {}),
+            **({"children": [c.to_dict() for c in self.children]} if self.children else {}),
+        }
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Telemetry:
+    """Registry of latency histograms, counters and recent traces."""
+
+    def __init__(self):
+        self.histograms: Dict[str, Dict[Tuple[Any, ...], LatencyHistogram]] = {name: {} for name in FAMILIES}
+        self.counters: Dict[str, Dict[Tuple[Any, ...], int]] = {name: {} for name in COUNTER_FAMILIES}
+        self.traces: Deque[Dict[str, Any]] = deque(maxlen=RECENT_TRACES)
+        # functools.lru_cache-style cache_info() callables, read at render time
+        self.cache_info: Dict[str, Callable[[], Any]] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def histogram(self, family: str, *labels: Any) -> LatencyHistogram:
+        series = self.histograms[family]
+        histogram = series.get(labels)
+        if histogram is None:
+            with self._lock:
+                histogram = series.setdefault(labels, LatencyHistogram())
+        return histogram
+
+    def observe(self, family: str, seconds: float, *labels: Any) -> None:
+        self.histogram(family, *labels).record(seconds)
+
+    def increment(self, family: str, *labels: Any, amount: int = 1) -> None:
+        with self._lock:
+            series = self.counters[family]
+            series[labels] = series.get(labels, 0) + amount
+
+    @contextmanager
+    def span(self, name: str, pipeline: Optional[str] = None, **attributes: Any):
+        """
+        Time a phase. Nested spans inherit the pipeline of their parent; each span's
+        duration feeds pipeline_phase_duration_seconds{pipeline, phase}.
+        """
+        parent = _current_span.get()
+        pipeline = pipeline or (parent.pipeline if parent is not None else name)
+        current = Span(next(self._ids), parent, name, pipeline, attributes)
+        token = _current_span.set(current)
+        try:
+            yield current
+        finally:
+            current.end = time.perf_counter()
+            _current_span.reset(token)
+            self.observe("pipeline_phase_duration_seconds", current.end - current.start, pipeline, name)
+            if parent is not None:
+                parent.children.append(current)
+            else:
+                self.traces.append({"pipeline": pipeline, "started_at": time.time() - current.duration, **current.to_dict()})
+
+    def record_fortigate_call(self, endpoint: str, seconds: float, ok: bool) -> None:
+        endpoint = endpoint.split("?", 1)[0].strip("/")
+        if endpoint.startswith("api/v2/"):
+            endpoint = endpoint[7:]
+        self.observe("fortigate_api_request_duration_seconds", seconds, endpoint)
+        self.increment("fortigate_api_requests_total", endpoint, "ok" if ok else "error")
+
+    def record_cache(self, cache: str, hit: bool) -> None:
+        self.increment(CACHE_FAMILY, cache, "hit" if hit else "miss")
+
+    def register_cache_info(self, cache: str, info: Callable[[], Any]) -> None:
+        """Report a cache that keeps its own hit/miss counters (e.g. functools.lru_cache)."""
+        self.cache_info[cache] = info
+
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hits, misses, hit ratio and (where known) size per cache."""
+        stats: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            counts = list(self.counters[CACHE_FAMILY].items())
+        for (cache, result), value in counts:
+            stats.setdefault(cache, {"hits": 0, "misses": 0})[CACHE_RESULTS[result]] = value
+        for cache, info_fn in self.cache_info.items():
+            try:
+                info = info_fn()
+            except Exception as e:
+                logger.debug(f"cache_info for {cache} failed: {e}")
+                continue
+            stats[cache] = {"hits": info.hits, "misses": info.misses, "entries": info.currsize}
+        for entry in stats.values():
+            lookups = entry["hits"] + entry["misses"]
+            entry["hit_ratio"] = round(entry["hits"] / lookups, 4) if lookups else None
+        return stats
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-friendly percentiles per family and label set."""
+        return {
+            family: {
+                "/".join(str(v) for v in labels) or "all": histogram.summary(EXPORT_QUANTILES)
+                for labels, histogram in sorted(series.items())
+            }
+            for family, series in self.histograms.items()
+        }
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        for family, (help_text, label_names) in FAMILIES.items():
+            series = self.histograms[family]
+            if not series:
+                continue
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} summary")
+            for labels, histogram in sorted(series.items()):
+                for q, value in histogram.percentiles(EXPORT_QUANTILES).items():
+                    quantile = 'quantile="' + str(q) + '"'
+                    lines.append(f"{family}{format_labels(label_names, labels, quantile)} {value:.6f}")
+                label_text = format_labels(label_names, labels)
+                lines.append(f"{family}_sum{label_text} {histogram.total_seconds:.6f}")
+                lines.append(f"{family}_count{label_text} {histogram.count}")
+        cache_stats = self.cache_stats()
+        for family, (help_text, label_names) in COUNTER_FAMILIES.items():
+            with self._lock:
+                series = dict(self.counters[family])
+            if family == CACHE_FAMILY:
+                series = {
+                    (cache, result): entry[key]
+                    for cache, entry in cache_stats.items()
+                    for result, key in CACHE_RESULTS.items()
+                }
+            if not series:
+                continue
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{family}{format_labels(label_names, labels)} {value}")
+        ratios = [(cache, entry["hit_ratio"]) for cache, entry in sorted(cache_stats.items()) if entry["hit_ratio"] is not None]
+        if ratios:
+            lines.append("# HELP cache_hit_ratio Share of cache lookups served from cache since startup")
+            lines.append("# TYPE cache_hit_ratio gauge")
+            for cache, ratio in ratios:
+                lines.append(f"cache_hit_ratio{format_labels(('cache',), (cache,))} {ratio}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+def install_http_metrics(app: FastAPI) -> None:
+    """Record per-route latency for every request handled by app."""
+
+    @app.middleware("http")
+    async def record_request_latency(request: Request, call_next):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # Use the route template (/api/devices/{id}) so label cardinality stays bounded
+            route = request.scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            telemetry = get_telemetry()
+            telemetry.observe("http_request_duration_seconds", time.perf_counter() - started, request.method, path)
+            telemetry.increment("http_responses_total", request.method, path, str(status))
+
+
+# Global telemetry instance
+_telemetry = None
+
+
+def get_telemetry() -> Telemetry:
+    """Get the global telemetry instance"""
+    global _telemetry
+    if _telemetry is None:
+        _telemetry = Telemetry()
+    return _telemetry
+
+
+def span(name: str, pipeline: Optional[str] = None, **attributes: Any):
+    """Shortcut for get_telemetry().span(...)."""
+    return get_telemetry().span(name, pipeline, **attributes)
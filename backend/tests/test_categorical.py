@@ -0,0 +1,108 @@
+import sys
+import threading
+
+import pytest
+
+from app.utils.categorical import (
+    ENCODING_NAME,
+    CategoryDictionary,
+    CategoryTable,
+    decode_rows,
+    encode_rows,
+)
+
+
+def test_codes_are_dense_and_stable():
+    dictionary = CategoryDictionary()
+    assert [dictionary.encode(v) for v in ("a", "b", "a", "c", "b")] == [0, 1, 0, 2, 1]
+    assert dictionary.values == ["a", "b", "c"]
+    assert dictionary.decode(2) == "c"
+    assert len(dictionary) == 3
+
+
+def test_equal_values_of_different_types_get_different_codes():
+    dictionary = CategoryDictionary()
+    codes = {dictionary.encode(v) for v in (1, 1.0, True, "1")}
+    assert len(codes) == 4
+    assert dictionary.values[dictionary.encode(True)] is True
+
+
+def test_intern_returns_canonical_instance():
+    dictionary = CategoryDictionary()
+    first = "".join(["Apple", " Inc."])
+    second = "".join(["Apple", " Inc."])
+    assert first is not second
+    assert dictionary.intern(first) is dictionary.intern(second)
+    assert dictionary.intern(None) is None
+
+
+def test_intern_keeps_unhashable_and_overflowing_values():
+    dictionary = CategoryDictionary(max_size=2)
+    unhashable = ["x"]
+    assert dictionary.intern(unhashable) is unhashable
+    dictionary.encode("a")
+    dictionary.encode("b")
+    overflow = "".join(["c", "d"])
+    assert dictionary.intern(overflow) is sys.intern("cd")
+    assert len(dictionary) == 2
+
+
+def test_encode_overflow_raises():
+    dictionary = CategoryDictionary(max_size=1)
+    dictionary.encode("a")
+    with pytest.raises(OverflowError):
+        dictionary.encode("b")
+
+
+def test_concurrent_encoding_assigns_one_code_per_value():
+    dictionary = CategoryDictionary()
+    values = [f"v{i % 50}" for i in range(5000)]
+
+    def worker():
+        for value in values:
+            dictionary.encode(value)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(dictionary) == 50
+    assert sorted(dictionary.encode(f"v{i}") for i in range(50)) == list(range(50))
+
+
+def test_table_keeps_one_dictionary_per_column():
+    table = CategoryTable()
+    assert table.encode("vlan", 10) == 0
+    assert table.encode("status", "up") == 0
+    assert table.encode("vlan", 20) == 1
+    assert table.to_dict() == {"vlan": [10, 20], "status": ["up"]}
+    assert table.stats() == {"vlan": 2, "status": 1}
+
+
+ROWS = [
+    {"device_mac": "00:11", "manufacturer": "Apple", "vlan": 10, "port": "port1"},
+    {"device_mac": "00:22", "manufacturer": "Cisco", "vlan": 10},
+    {"device_mac": "00:33", "manufacturer": "Apple", "vlan": None, "port": "port2"},
+    {"device_mac": "00:44"},
+]
+
+
+def test_encode_rows():
+    payload = encode_rows(ROWS, ["manufacturer", "vlan"])
+    assert payload["encoding"] == ENCODING_NAME
+    assert payload["dictionaries"] == {"manufacturer": ["Apple", "Cisco"], "vlan": [10, None]}
+    assert [row.get("manufacturer") for row in payload["rows"]] == [0, 1, 0, None]
+    assert payload["rows"][0]["port"] == "port1"  # Non-categorical fields are untouched
+    assert "manufacturer" not in payload["rows"][3]
+
+
+def test_encode_rows_does_not_modify_input():
+    rows = [dict(row) for row in ROWS]
+    encode_rows(rows, ["manufacturer", "vlan"])
+    assert rows == ROWS
+
+
+def test_decode_rows_round_trip():
+    assert decode_rows(encode_rows(ROWS, ["manufacturer", "vlan"])) == ROWS
+    assert decode_rows({}) == []
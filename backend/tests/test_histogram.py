@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+from app.utils.histogram import (
+    LatencyHistogram,
+    MAX_TRACKABLE_US,
+    SIGNIFICANT_BITS,
+    bucket_index,
+    bucket_upper_bound,
+)
+
+LINEAR = 1 << SIGNIFICANT_BITS
+
+
+def test_linear_range_has_one_bucket_per_value():
+    for value in range(LINEAR):
+        assert bucket_index(value) == value
+        assert bucket_upper_bound(value) == value
+
+
+def test_bucket_indexes_are_contiguous_and_monotonic():
+    previous = bucket_index(0)
+    for value in range(1, 1 << 16):
+        index = bucket_index(value)
+        assert index in (previous, previous + 1), value
+        previous = index
+
+
+@pytest.mark.parametrize("value", [LINEAR, LINEAR + 1, 255, 256, 1000, 65_535, 1_000_000, MAX_TRACKABLE_US])
+def test_value_lies_within_its_bucket(value):
+    index = bucket_index(value)
+    assert bucket_upper_bound(index - 1) < value <= bucket_upper_bound(index)
+
+
+def test_bucket_upper_bound_is_last_value_of_bucket():
+    for index in range(LINEAR - 1, bucket_index(1 << 20)):
+        upper = bucket_upper_bound(index)
+        assert bucket_index(upper) == index
+        assert bucket_index(upper + 1) == index + 1
+
+
+def test_relative_error_bound():
+    limit = 2.0 ** -(SIGNIFICANT_BITS - 1)
+    rng = random.Random(1)
+    for _ in range(10_000):
+        value = rng.randrange(1, MAX_TRACKABLE_US)
+        upper = bucket_upper_bound(bucket_index(value))
+        assert (upper - value) / value < limit
+
+
+def test_percentiles_within_error_bound():
+    rng = random.Random(2)
+    samples = sorted(rng.lognormvariate(-4, 1.5) for _ in range(20_000))
+    histogram = LatencyHistogram()
+    for seconds in samples:
+        histogram.record(seconds)
+
+    limit = 2.0 ** -(SIGNIFICANT_BITS - 1)
+    for q, value in histogram.percentiles([0.5, 0.9, 0.99, 0.999]).items():
+        exact = int(samples[max(1, int(q * len(samples) + 0.5)) - 1] * 1_000_000) / 1_000_000
+        assert exact <= value <= exact * (1 + limit) + 1e-6, q
+
+
+def test_empty_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(0.99) == 0.0
+    assert histogram.summary()["count"] == 0
+
+
+def test_min_max_and_clamping():
+    histogram = LatencyHistogram()
+    histogram.record(0.002)
+    histogram.record(-1)
+    histogram.record(10 * 3600)
+    assert histogram.min_us == 0
+    assert histogram.max_us == MAX_TRACKABLE_US
+    assert histogram.percentile(1.0) == MAX_TRACKABLE_US / 1_000_000
+
+
+def test_percentile_never_exceeds_max():
+    histogram = LatencyHistogram()
+    histogram.record(0.0015)
+    assert histogram.percentile(0.5) == 0.0015
+
+
+def test_merge():
+    a, b, combined = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    rng = random.Random(3)
+    for i in range(2000):
+        seconds = rng.expovariate(50)
+        (a if i % 2 else b).record(seconds)
+        combined.record(seconds)
+    a.merge(b)
+    assert list(a.counts) == list(combined.counts)
+    assert (a.count, a.total_us, a.min_us, a.max_us) == (
+        combined.count, combined.total_us, combined.min_us, combined.max_us
+    )
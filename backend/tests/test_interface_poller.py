@@ -0,0 +1,129 @@
+import time
+from array import array
+
+import pytest
+
+from app.services.interface_poller import (
+    InterfacePoller,
+    InterfaceRingBuffer,
+    counter_rates,
+    moving_average,
+)
+
+
+def _fill(buffer, count, start=1000.0):
+    for i in range(count):
+        buffer.append(start + i * 10, {"rx_bytes": i * 100, "link": 1})
+
+
+def test_window_before_wraparound():
+    buffer = InterfaceRingBuffer("wan1", capacity=5)
+    _fill(buffer, 3)
+    timestamps, columns = buffer.window()
+    assert list(timestamps) == [1000, 1010, 1020]
+    assert list(columns["rx_bytes"]) == [0, 100, 200]
+    assert len(buffer) == 3
+
+
+@pytest.mark.parametrize("count", [5, 6, 7, 12, 13])
+def test_window_after_wraparound_is_chronological(count):
+    buffer = InterfaceRingBuffer("wan1", capacity=5)
+    _fill(buffer, count)
+    timestamps, columns = buffer.window()
+    expected = list(range(count - 5, count))
+    assert list(timestamps) == [1000 + i * 10 for i in expected]
+    assert list(columns["rx_bytes"]) == [i * 100 for i in expected]
+    assert len(buffer) == 5
+
+
+@pytest.mark.parametrize("count", [3, 5, 8])
+def test_window_since_across_wraparound(count):
+    buffer = InterfaceRingBuffer("wan1", capacity=5)
+    _fill(buffer, count)
+    all_timestamps, _ = buffer.window()
+    for cutoff in [0, 1000, 1015, all_timestamps[-1], all_timestamps[-1] + 1]:
+        timestamps, columns = buffer.window(since=cutoff)
+        assert list(timestamps) == [t for t in all_timestamps if t >= cutoff]
+        assert len(columns["rx_bytes"]) == len(timestamps)
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 5, 7])
+def test_tail_matches_end_of_window(count):
+    buffer = InterfaceRingBuffer("wan1", capacity=5)
+    _fill(buffer, count)
+    all_timestamps, all_columns = buffer.window()
+    timestamps, columns = buffer.tail(2)
+    assert list(timestamps) == list(all_timestamps[-2:])
+    assert list(columns["rx_bytes"]) == list(all_columns["rx_bytes"][-2:])
+
+
+def test_latest_and_empty_buffer():
+    buffer = InterfaceRingBuffer("wan1", capacity=3)
+    assert buffer.latest() is None
+    assert len(buffer.window()[0]) == 0
+    _fill(buffer, 4)
+    assert buffer.latest()["timestamp"] == 1030
+    assert buffer.latest()["rx_bytes"] == 300
+
+
+def test_counter_rates():
+    timestamps = array("d", [0, 10, 20, 20, 30])
+    values = array("d", [0, 1000, 3000, 3500, 3600])
+    assert counter_rates(timestamps, values) == [100.0, 200.0, None, 10.0]
+
+
+def test_counter_reset_yields_none():
+    timestamps = array("d", [0, 10, 20, 30])
+    values = array("d", [5000, 6000, 100, 600])  # Counter wrapped / device rebooted
+    assert counter_rates(timestamps, values) == [100.0, None, 50.0]
+
+
+def test_counter_rates_short_series():
+    assert counter_rates(array("d", [1.0]), array("d", [1.0])) == []
+
+
+def test_moving_average_skips_missing_points():
+    assert moving_average([1.0, None, 3.0, 5.0], 2) == [1.0, 1.0, 3.0, 4.0]
+    assert moving_average([None, None], 3) == [None, None]
+
+
+def _interfaces(rx_bytes, link="up"):
+    return {"results": {"wan1": {"name": "wan1", "rx_bytes": rx_bytes, "tx_bytes": 0, "link": link}}}
+
+
+def test_query_range_and_rates():
+    poller = InterfacePoller(capacity=100)
+    now = float(int(time.time()))  # Whole seconds keep the timestamp arithmetic exact
+    for i, rx in enumerate([0, 1000, 3000, 500, 1500]):
+        poller.ingest(_interfaces(rx, "up" if i != 3 else "down"), timestamp=now - 40 + i * 10)
+
+    result = poller.query("wan1", minutes=1, smooth=2)
+    assert result["samples"] == 5
+    assert result["rx_bps"] == [800.0, 1600.0, None, 800.0]
+    assert result["rx_bps_avg"] == [800.0, 1200.0, 1600.0, 800.0]
+    assert result["link"] == [1, 1, 0, 1]
+    assert result["timestamps"] == [now - 30, now - 20, now - 10, now]
+
+    recent = poller.query("wan1", minutes=0.25)  # Last 15 seconds
+    assert recent["samples"] == 2
+    assert recent["rx_bps"] == [800.0]
+    assert poller.query("missing") is None
+
+
+def test_current_rates_uses_last_two_samples():
+    poller = InterfacePoller(capacity=3)
+    for i in range(5):
+        poller.ingest(_interfaces(i * 1000), timestamp=1000.0 + i * 10)
+    rates = poller.current_rates()["wan1"]
+    assert rates["timestamp"] == 1040.0
+    assert rates["rx_bytes_per_s"] == 100.0
+    assert rates["link"] is True
+
+
+def test_listeners_receive_samples_and_failures_are_isolated():
+    poller = InterfacePoller()
+    seen = []
+    poller.add_listener(lambda ts, name, sample: 1 / 0)
+    poller.add_listener(lambda ts, name, sample: seen.append((ts, name, sample["rx_bytes"])))
+    assert poller.ingest(_interfaces(42), timestamp=5.0) == 1
+    assert seen == [(5.0, "wan1", 42)]
@@ -0,0 +1,98 @@
+import json
+import random
+
+import pytest
+
+from app.utils.json_stream import ResultsParser
+
+
+def _body(rows):
+    return json.dumps(
+        {"http_method": "GET", "results": rows, "vdom": "root", "status": "success", "build": 1575}
+    ).encode()
+
+
+ROWS = [
+    {"mac": "00:11:22:33:44:55", "vlan_id": 10, "last_seen": 1725.25, "ratio": 2.5e3, "up": True, "port": None},
+    {"mac": "aa:bb:cc:dd:ee:ff", "vlan_id": -1, "last_seen": 0, "ratio": -0.125, "up": False, "port": "port7"},
+    12,
+    3.75,
+    "string row",
+    [1, 2.5, 1e-3],
+]
+
+
+def _parse_chunks(body, cut_points):
+    parser = ResultsParser()
+    rows = []
+    start = 0
+    for cut in cut_points + [len(body)]:
+        rows.extend(parser.feed(body[start:cut]))
+        start = cut
+    rows.extend(parser.close())
+    return parser, rows
+
+
+def test_whole_body():
+    parser, rows = _parse_chunks(_body(ROWS), [])
+    assert rows == ROWS
+    assert parser.meta == {"http_method": "GET", "vdom": "root", "status": "success", "build": 1575}
+    assert parser.rows_parsed == len(ROWS)
+
+
+def test_chunk_ends_inside_number():
+    parser = ResultsParser()
+    assert parser.feed(b'{"results":[1.') == []
+    assert parser.feed(b"25,2.5e") == [1.25]
+    assert parser.feed(b"3],\"n\":1") == [2500.0]
+    assert parser.feed(b"7}") == []
+    assert parser.close() == []
+    assert parser.meta == {"n": 17}
+
+
+def test_chunk_ends_inside_literal():
+    parser = ResultsParser()
+    assert parser.feed(b'{"results":[tr') == []
+    assert parser.feed(b"ue,nul") == [True]
+    assert parser.feed(b"l]}") == [None]
+    parser.close()
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_random_chunk_boundaries(seed):
+    rng = random.Random(seed)
+    rows = ROWS * 20
+    body = _body(rows)
+    cuts = sorted(rng.sample(range(1, len(body)), 60))
+    parser, parsed = _parse_chunks(body, cuts)
+    assert parsed == rows
+    assert parser.meta["build"] == 1575
+
+
+def test_every_single_byte_boundary():
+    body = _body(ROWS)
+    for cut in range(1, len(body)):
+        _, parsed = _parse_chunks(body, [cut])
+        assert parsed == ROWS, cut
+
+
+def test_multibyte_utf8_split():
+    body = json.dumps({"results": [{"name": "Küche-Display"}]}, ensure_ascii=False).encode()
+    cut = body.index("ü".encode()) + 1
+    _, parsed = _parse_chunks(body, [cut])
+    assert parsed == [{"name": "Küche-Display"}]
+
+
+def test_truncated_body_raises():
+    parser = ResultsParser()
+    parser.feed(b'{"results":[{"a":1},')
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_trailing_number_at_end_of_body():
+    parser = ResultsParser()
+    parser.feed(b'{"results":[],"build":15')
+    parser.feed(b"75}")
+    parser.close()
+    assert parser.meta == {"build": 1575}
@@ -0,0 +1,129 @@
+import math
+import time
+
+import pytest
+
+from app.services.metrics_store import (
+    RAW,
+    TS_COLUMN,
+    MetricsRecorder,
+    TimeSeriesStore,
+    series_key,
+)
+
+BASE = 1_700_000_000 - 1_700_000_000 % 3600  # Hour-aligned
+SERIES = "port.S108.port1"
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TimeSeriesStore(root=str(tmp_path))
+
+
+def _fill(store, seconds, step=10):
+    for offset in range(0, seconds, step):
+        store.append(SERIES, BASE + offset, {"rx_bps": offset, "tx_bps": 2 * offset})
+
+
+def test_series_key_is_filesystem_safe():
+    assert series_key("port", "S108/1", "port 1", None, "") == "port.S108_1.port_1"
+
+
+def test_raw_rows_round_trip(store):
+    _fill(store, 120)
+    store.flush()
+    result = store.query(SERIES, BASE + 20, BASE + 50, resolution=RAW)
+    assert result["rows"] == 4
+    assert result["columns"][TS_COLUMN] == [BASE + 20, BASE + 30, BASE + 40, BASE + 50]
+    assert result["columns"]["rx_bps"] == [20, 30, 40, 50]
+
+
+def test_minute_rollups(store):
+    _fill(store, 180)  # Three complete minutes, the third still open
+    store.flush()
+    columns = store.query(SERIES, BASE, BASE + 3600, resolution="1m")["columns"]
+    # Only buckets that were closed by a later sample are written without close_buckets
+    assert columns[TS_COLUMN] == [BASE, BASE + 60]
+    assert columns["rx_bps_avg"] == [25.0, 85.0]  # mean(0..50), mean(60..110)
+    assert columns["rx_bps_max"] == [50.0, 110.0]
+    assert columns["rx_bps_last"] == [50.0, 110.0]
+    assert columns["tx_bps_max"] == [100.0, 220.0]
+
+
+def test_close_buckets_writes_partial_rollups(store):
+    _fill(store, 30)
+    store.flush(close_buckets=True)
+    for resolution in ("1m", "5m", "1h"):
+        columns = store.query(SERIES, BASE, BASE + 3600, resolution=resolution)["columns"]
+        assert columns[TS_COLUMN] == [BASE]
+        assert columns["rx_bps_avg"] == [10.0]
+        assert columns["rx_bps_max"] == [20.0]
+
+
+def test_superseded_partial_bucket_is_deduped(store):
+    store.append(SERIES, BASE, {"rx_bps": 10})
+    store.flush(close_buckets=True)  # Partial hour written on shutdown
+    store.append(SERIES, BASE + 60, {"rx_bps": 30})
+    store.flush(close_buckets=True)
+    columns = store.query(SERIES, BASE, BASE + 3600, resolution="1h")["columns"]
+    assert columns[TS_COLUMN] == [BASE]
+    assert columns["rx_bps_avg"] == [30.0]  # The later row for the same bucket wins
+
+
+def test_new_field_is_backfilled_with_nan(store):
+    store.append(SERIES, BASE, {"rx_bps": 1})
+    store.flush()
+    store.append(SERIES, BASE + 10, {"rx_bps": 2, "link": 1})
+    store.flush()
+    columns = store.query(SERIES, BASE, BASE + 10, resolution=RAW)["columns"]
+    assert columns["rx_bps"] == [1, 2]
+    assert math.isnan(columns["link"][0]) and columns["link"][1] == 1
+
+
+def test_none_values_are_skipped(store):
+    store.append(SERIES, BASE, {"rx_bps": None})
+    assert store.flush() == 0
+
+
+def test_compact_removes_expired_days(store):
+    store.retention_days[RAW] = 1
+    store.append(SERIES, BASE, {"rx_bps": 1})
+    store.flush(close_buckets=True)
+    assert store.compact(now=BASE + 3 * 86400) == 1  # Only the raw day expired
+    assert store.query(SERIES, BASE, BASE + 60, resolution=RAW)["rows"] == 0
+    assert store.query(SERIES, BASE, BASE + 3600, resolution="1h")["rows"] == 1
+
+
+def test_pick_resolution(store):
+    end = time.time()
+    assert store.pick_resolution(end - 3600, end) == RAW
+    assert store.pick_resolution(end - 86400, end) == "1m"
+    assert store.pick_resolution(end - 7 * 86400, end) == "5m"
+    assert store.pick_resolution(end - 90 * 86400, end) == "1h"
+    # Raw data is only kept for RETENTION_DAYS[raw]; older short spans use rollups
+    assert store.pick_resolution(end - 5 * 86400, end - 5 * 86400 + 60) == "1m"
+
+
+def test_recorder_converts_counters_to_rates(store):
+    recorder = MetricsRecorder(store)
+    recorder.record_counters(SERIES, BASE, {"rx_bytes": 1000, "tx-bytes": 0})
+    recorder.record_counters(SERIES, BASE + 10, {"rx_bytes": 2000, "tx-bytes": 500}, {"link": 1.0})
+    recorder.record_counters(SERIES, BASE + 20, {"rx_bytes": 100, "tx-bytes": 600})  # rx counter reset
+    store.flush()
+    columns = store.query(SERIES, BASE, BASE + 60, resolution=RAW)["columns"]
+    assert columns[TS_COLUMN] == [BASE + 10, BASE + 20]  # First sample only primes the state
+    assert columns["rx_bps"][0] == 800.0
+    assert math.isnan(columns["rx_bps"][1])
+    assert columns["tx_bps"] == [400.0, 80.0]
+    assert columns["link"][0] == 1.0
+
+
+def test_ingest_port_stats(store):
+    recorder = MetricsRecorder(store)
+    data = {"results": [
+        {"serial": "S108", "ports": {"port1": {"rx_bytes": 0}, "port2": {"rx_bytes": 0}}},
+        {"switch-id": "S124", "ports": [{"interface": "port1", "rx_bytes": 0}]},
+        "garbage",
+    ]}
+    assert recorder.ingest_port_stats(data, BASE) == 3
+    assert recorder.ingest_port_stats({"error": "x"}, BASE) == 0
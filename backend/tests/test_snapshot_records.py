@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from app.models.snapshot import CATEGORIES, DeviceRecord, SwitchRecord, compact_switches
+
+
+def _switch(serial="S108ABC", devices=2):
+    return {
+        "name": "sw1",
+        "serial": serial,
+        "model": "FS-108E",
+        "status": "Authorized",
+        "ports": [
+            {
+                "name": "port1",
+                "status": "up",
+                "vlan": "default",
+                "connected_devices": [
+                    {
+                        "device_mac": f"00:11:22:33:44:{i:02x}",
+                        "manufacturer": "Apple Inc.",
+                        "vlan": 10,
+                        "restaurant_category": "pos",  # Not a DeviceRecord field
+                    }
+                    for i in range(devices)
+                ],
+            }
+        ],
+        "custom": {"nested": [1, 2]},
+    }
+
+
+def test_round_trip_preserves_dict():
+    source = _switch()
+    record = SwitchRecord.from_mapping(source)
+    assert record.to_dict() == source
+    assert json.dumps(record.to_dict(), sort_keys=True) == json.dumps(source, sort_keys=True)
+
+
+def test_records_have_no_instance_dict():
+    record = SwitchRecord.from_mapping(_switch())
+    device = record["ports"][0]["connected_devices"][0]
+    assert not hasattr(record, "__dict__")
+    assert not hasattr(device, "__dict__")
+    assert isinstance(device, DeviceRecord)
+
+
+def test_mapping_protocol():
+    record = SwitchRecord.from_mapping(_switch())
+    assert record["serial"] == "S108ABC"
+    assert record.get("custom") == {"nested": [1, 2]}
+    assert record.get("uptime") is None  # Known field missing from the source row
+    assert "uptime" not in record
+    assert list(record) == ["name", "serial", "model", "status", "ports", "custom"]
+    assert len(record) == 6
+    with pytest.raises(KeyError):
+        record["missing"]
+    assert dict(record["ports"][0]["connected_devices"][1])["restaurant_category"] == "pos"
+
+
+def test_records_are_read_only():
+    record = SwitchRecord.from_mapping(_switch())
+    with pytest.raises(TypeError):
+        record["serial"] = "other"
+
+
+def test_categorical_values_are_shared():
+    first = SwitchRecord.from_mapping(_switch(serial="A"))
+    second = SwitchRecord.from_mapping(json.loads(json.dumps(_switch(serial="B"))))
+    a = first["ports"][0]["connected_devices"][0]
+    b = second["ports"][0]["connected_devices"][1]
+    assert a["manufacturer"] is b["manufacturer"]
+    assert first["model"] is second["model"]
+    assert CATEGORIES.column("manufacturer").encode("Apple Inc.") == CATEGORIES.column("manufacturer").encode(
+        b["manufacturer"]
+    )
+
+
+def test_extra_key_layout_is_shared():
+    record = SwitchRecord.from_mapping(_switch(devices=3))
+    devices = record["ports"][0]["connected_devices"]
+    assert devices[0]._extra_keys is devices[2]._extra_keys
+
+
+def test_records_pass_through_unchanged():
+    record = SwitchRecord.from_mapping(_switch())
+    assert SwitchRecord.from_mapping(record) is record
+    assert compact_switches([record])[0] is record
+
+
+def test_compact_switches_drops_non_mappings():
+    compacted = compact_switches([_switch(), "garbage", None, 3])
+    assert len(compacted) == 1
+    assert compact_switches(None) == []
+
+
+def test_non_mapping_children_are_dropped():
+    source = _switch()
+    source["ports"].append("not a port")
+    record = SwitchRecord.from_mapping(source)
+    assert len(record["ports"]) == 1
@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from app.services import switch_snapshot  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    monkeypatch.setattr(switch_snapshot, "_snapshot", None)
+    monkeypatch.setattr(switch_snapshot, "_snapshot_source", [])
+    monkeypatch.setattr(switch_snapshot, "_snapshot_lock", None)
+    monkeypatch.setattr(switch_snapshot, "_last_attempt", 0.0)
+    monkeypatch.setattr(switch_snapshot, "_refresh_failures", 0)
+    monkeypatch.setattr(switch_snapshot, "_enrichers", [])
+
+
+SWITCHES = [{"name": "sw1", "serial": "S1", "ports": []}]
+
+
+def test_republish_keeps_source_age():
+    built = switch_snapshot.build_snapshot(SWITCHES, created_at=time.time() - 50)
+    republished = switch_snapshot.republish_snapshot()
+    assert republished.version == built.version + 1
+    assert republished.created_at == built.created_at
+
+
+def test_republish_does_not_postpone_refresh():
+    fetches = []
+
+    async def fetch():
+        fetches.append(time.time())
+        return SWITCHES
+
+    async def scenario():
+        await switch_snapshot.get_switch_snapshot(ttl=60, fetch_function=fetch)
+        switch_snapshot._snapshot.created_at -= 61  # Controller data is now past its TTL
+        switch_snapshot.republish_snapshot()  # e.g. a direct poll re-applying enrichers
+        await switch_snapshot.get_switch_snapshot(ttl=60, fetch_function=fetch)
+
+    asyncio.run(scenario())
+    assert len(fetches) == 2
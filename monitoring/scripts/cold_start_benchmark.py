@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Cold-Start Benchmark for the FortiSwitch Monitor backend
+Measures module import time and time until a fresh uvicorn process is live,
+ready and warm, against a FortiGate address that never answers
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "backend"))
+
+# Modules whose import cost lands on every worker start
+IMPORT_MODULES = [
+    "app.services.fortiswitch_service",
+    "app.services.fortigate_service",
+    "app.services.fortiswitch_service_optimized",
+    "app.main",
+    "app.main_optimized",
+]
+
+# Non-routable address: connections hang until they time out, like an unreachable FortiGate
+BLACKHOLE_FORTIGATE = "https://10.255.255.1"
+READY_TARGET_SECONDS = 1.0
+
+
+def benchmark_env(fortigate_host: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "FORTIGATE_HOST": fortigate_host,
+        "PYTHONPATH": BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+    })
+    return env
+
+
+def measure_import(module: str, env: Dict[str, str], runs: int) -> Dict[str, Any]:
+    """Best and median wall time of `import module` in a fresh interpreter."""
+    code = (
+        "import time; started = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - started)"
+    )
+    samples: List[float] = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+            capture_output=True, text=True, timeout=120,
+        )
+        if result.returncode != 0:
+            return {"error": result.stderr.strip().splitlines()[-1] if result.stderr else "import failed"}
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return {"best_ms": round(min(samples) * 1000, 1), "median_ms": round(statistics.median(samples) * 1000, 1)}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def probe(url: str) -> Optional[Dict[str, Any]]:
+    """{"status", "body"} of a GET, or None while the server is not accepting connections."""
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return {"status": response.status, "body": json.loads(response.read() or b"{}")}
+    except urllib.error.HTTPError as e:
+        return {"status": e.code, "body": json.loads(e.read() or b"{}")}
+    except (urllib.error.URLError, ConnectionError, socket.timeout, ValueError):
+        return None
+
+
+def measure_startup(app: str, env: Dict[str, str], warm_timeout: float, interval: float) -> Dict[str, Any]:
+    """Spawn uvicorn and time live / ready / warm from process start."""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    result: Dict[str, Any] = {"live_s": None, "ready_s": None, "warm_s": None, "warm_error": None}
+    try:
+        deadline = started + warm_timeout
+        while time.perf_counter() < deadline:
+            if process.poll() is not None:
+                result["error"] = (process.stderr.read() or b"").decode(errors="replace").strip()[-500:]
+                break
+            elapsed = time.perf_counter() - started
+            if result["live_s"] is None and (probe(base + "/health/live") or {}).get("status") == 200:
+                result["live_s"] = round(elapsed, 3)
+            ready = probe(base + "/health/ready")
+            if ready is not None:
+                if result["ready_s"] is None and ready["status"] == 200:
+                    result["ready_s"] = round(elapsed, 3)
+                body = ready["body"]
+                if body.get("warm"):
+                    result["warm_s"] = round(elapsed, 3)
+                    break
+                if body.get("warm_error") and not body.get("warming"):
+                    result["warm_error"] = body["warm_error"]
+                    break
+            time.sleep(interval)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return result
+
+
+def run(app: str, runs: int, fortigate_host: str, warm_timeout: float, interval: float, skip_imports: bool) -> Dict[str, Any]:
+    env = benchmark_env(fortigate_host)
+    results: Dict[str, Any] = {"app": app, "fortigate_host": fortigate_host, "imports": {}, "startup": []}
+    if not skip_imports:
+        for module in IMPORT_MODULES:
+            results["imports"][module] = measure_import(module, env, runs)
+    for _ in range(runs):
+        results["startup"].append(measure_startup(app, env, warm_timeout, interval))
+
+    ready = [r["ready_s"] for r in results["startup"] if r["ready_s"] is not None]
+    results["ready_median_s"] = round(statistics.median(ready), 3) if ready else None
+    results["meets_target"] = bool(ready) and results["ready_median_s"] < READY_TARGET_SECONDS
+    return results
+
+
+def format_report(results: Dict[str, Any]) -> str:
+    lines = [
+        "=" * 80,
+        "BACKEND COLD-START BENCHMARK",
+        "=" * 80,
+        f"App: {results['app']}   FortiGate: {results['fortigate_host']}",
+        "",
+    ]
+    if results["imports"]:
+        lines.append(f"{'module import':<50}{'best ms':>12}{'median ms':>12}")
+        lines.append("-" * 74)
+        for module, r in results["imports"].items():
+            if "error" in r:
+                lines.append(f"{module:<50}  error: {r['error']}")
+            else:
+                lines.append(f"{module:<50}{r['best_ms']:>12.1f}{r['median_ms']:>12.1f}")
+        lines.append("")
+
+    def fmt(value: Optional[float]) -> str:
+        return f"{value:.3f}s" if value is not None else "-"
+
+    lines.append(f"{'run':<6}{'live':>10}{'ready':>10}{'warm':>10}  notes")
+    lines.append("-" * 74)
+    for i, r in enumerate(results["startup"], 1):
+        note = r.get("error") or (f"warm-up failed: {r['warm_error']}" if r["warm_error"] else "")
+        lines.append(f"{i:<6}{fmt(r['live_s']):>10}{fmt(r['ready_s']):>10}{fmt(r['warm_s']):>10}  {note}")
+    verdict = "PASS" if results["meets_target"] else "FAIL"
+    lines.append("")
+    lines.append(f"Median time to ready: {fmt(results['ready_median_s'])} (target < {READY_TARGET_SECONDS:.1f}s): {verdict}")
+    lines.append("=" * 80)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend import and startup time")
+    parser.add_argument("--app", default="app.main_optimized:app", help="uvicorn application path")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--fortigate-host", default=BLACKHOLE_FORTIGATE,
+                        help="FortiGate URL for the run (default: unreachable address)")
+    parser.add_argument("--warm-timeout", type=float, default=30.0, help="Stop waiting for warm-up after N seconds")
+    parser.add_argument("--interval", type=float, default=0.02, help="Probe interval in seconds")
+    parser.add_argument("--skip-imports", action="store_true", help="Only measure process startup")
+    parser.add_argument("--json", action="store_true", help="Print raw results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.app, args.runs, args.fortigate_host, args.warm_timeout, args.interval, args.skip_imports)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(format_report(results))
+    sys.exit(0 if results["meets_target"] else 1)
+
+
+if __name__ == "__main__":
+    main()
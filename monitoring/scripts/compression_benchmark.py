@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Compression Benchmark for FortiSwitch Snapshot Payloads
+Measures payload size and CPU cost per codec on generated large-site data
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "backend"))
+
+from app.utils.compression import CODECS, _gzip  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MANUFACTURERS = [
+    "Apple Inc.", "Dell Inc.", "Hewlett Packard", "Cisco Systems, Inc",
+    "Micros Systems, Inc.", "Zebra Technologies Inc.", "Ingenico", "Verifone, Inc.",
+    "Samsung Electronics Co.,Ltd", "Intel Corporate", "Unknown",
+]
+VLANS = ["10", "20", "30", "40", "100", "999"]
+DHCP_INTERFACES = ["internal", "pos-vlan", "guest-vlan", "mgmt"]
+
+
+def generate_site(num_switches: int, ports_per_switch: int, devices_per_port: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Generate a switch list shaped like get_fortiswitches_optimized() output."""
+    rng = random.Random(seed)
+    switches = []
+    for s in range(num_switches):
+        serial = f"S248EP{s:010d}"
+        ports = []
+        for p in range(1, ports_per_switch + 1):
+            port_name = f"port{p}"
+            devices = []
+            for d in range(rng.randint(0, devices_per_port * 2)):
+                mac = ":".join(f"{rng.randint(0, 255):02X}" for _ in range(6))
+                hostname = f"Device-{p:02d}-{mac[-5:].replace(':', '')}"
+                devices.append({
+                    "device_mac": mac,
+                    "device_ip": f"10.{s % 255}.{p}.{d + 10}",
+                    "device_name": hostname,
+                    "device_type": hostname,
+                    "manufacturer": rng.choice(MANUFACTURERS),
+                    "source": "switch_controller_detected",
+                    "vlan": rng.choice(VLANS),
+                    "last_seen": rng.randint(0, 3600),
+                    "port_id": p,
+                    "dhcp_status": "leased",
+                    "dhcp_interface": rng.choice(DHCP_INTERFACES),
+                    "vci": "",
+                })
+            ports.append({
+                "name": port_name,
+                "status": "up" if devices else rng.choice(["up", "down"]),
+                "speed": 1000,
+                "duplex": "full",
+                "vlan": rng.choice(VLANS),
+                "poe_capable": True,
+                "poe_status": "enabled",
+                "fortilink_port": p == ports_per_switch,
+                "connected_devices": devices,
+            })
+        switches.append({
+            "name": f"SW-{s:03d}",
+            "serial": serial,
+            "model": "FS-248E-POE",
+            "status": "Authorized",
+            "version": "7.2.5",
+            "ip": f"10.255.0.{s % 255}",
+            "uptime": rng.randint(0, 10**7),
+            "ports": ports,
+            "total_ports": len(ports),
+            "active_ports": len([x for x in ports if x["status"] == "up"]),
+            "connected_devices_count": sum(len(x["connected_devices"]) for x in ports),
+        })
+    return switches
+
+
+def serialize(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def codec_matrix() -> Dict[str, Callable[[bytes], bytes]]:
+    """Codec/level combinations to compare."""
+    matrix: Dict[str, Callable[[bytes], bytes]] = {
+        "gzip-1": lambda b: _gzip(b, 1),
+        "gzip-6": lambda b: _gzip(b, 6),
+        "gzip-9": lambda b: _gzip(b, 9),
+    }
+    if brotli is not None:
+        for quality in (1, 5, 9, 11):
+            matrix[f"br-{quality}"] = lambda b, q=quality: brotli.compress(b, quality=q)
+    if zstandard is not None:
+        for level in (1, 3, 9, 19):
+            matrix[f"zstd-{level}"] = lambda b, lv=level: zstandard.ZstdCompressor(level=lv).compress(b)
+    return matrix
+
+
+def decompressor(name: str) -> Callable[[bytes], bytes]:
+    if name.startswith("gzip"):
+        import gzip
+        return gzip.decompress
+    if name.startswith("br"):
+        return brotli.decompress
+    return zstandard.ZstdDecompressor().decompress
+
+
+def bench(func: Callable[[], Any], iterations: int) -> float:
+    """Best-of-N wall time in milliseconds (CPU-bound, single thread)."""
+    best = float("inf")
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(num_switches: int, ports_per_switch: int, devices_per_port: int, iterations: int) -> Dict[str, Any]:
+    switches = generate_site(num_switches, ports_per_switch, devices_per_port)
+    total_devices = sum(s["connected_devices_count"] for s in switches)
+
+    serialize_ms = bench(lambda: serialize(switches), iterations)
+    body = serialize(switches)
+
+    results = {
+        "site": {
+            "switches": num_switches,
+            "ports": num_switches * ports_per_switch,
+            "devices": total_devices,
+            "raw_bytes": len(body),
+            "serialize_ms": round(serialize_ms, 2),
+            "encoder": "orjson" if orjson is not None else "json",
+        },
+        "codecs": {},
+        "precompression_codecs": list(CODECS.keys()),
+    }
+
+    for name, compress in codec_matrix().items():
+        compress_ms = bench(lambda: compress(body), iterations)
+        compressed = compress(body)
+        decompress = decompressor(name)
+        decompress_ms = bench(lambda: decompress(compressed), iterations)
+        results["codecs"][name] = {
+            "bytes": len(compressed),
+            "ratio": round(len(body) / len(compressed), 2),
+            "compress_ms": round(compress_ms, 2),
+            "decompress_ms": round(decompress_ms, 2),
+            "compress_mb_s": round(len(body) / 1e6 / (compress_ms / 1000), 1) if compress_ms else None,
+        }
+    return results
+
+
+def format_report(results: Dict[str, Any], clients: int) -> str:
+    site = results["site"]
+    lines = [
+        "=" * 80,
+        "FORTISWITCH SNAPSHOT COMPRESSION BENCHMARK",
+        "=" * 80,
+        f"Site: {site['switches']} switches, {site['ports']} ports, {site['devices']} devices",
+        f"Raw payload: {site['raw_bytes'] / 1e6:.2f} MB ({site['encoder']} serialize {site['serialize_ms']:.1f}ms)",
+        f"Precompression codecs available: {', '.join(results['precompression_codecs'])}",
+        "",
+        f"{'codec':<10}{'size (KB)':>12}{'ratio':>8}{'compress ms':>14}{'decomp ms':>12}"
+        f"{'per-req CPU x' + str(clients):>18}{'precompressed':>16}",
+        "-" * 90,
+    ]
+    for name, r in results["codecs"].items():
+        # Per-request compression: every client pays; precompressed: paid once per refresh
+        lines.append(
+            f"{name:<10}{r['bytes'] / 1024:>12.1f}{r['ratio']:>8.1f}{r['compress_ms']:>14.2f}"
+            f"{r['decompress_ms']:>12.2f}{r['compress_ms'] * clients:>16.1f}ms{r['compress_ms']:>14.1f}ms"
+        )
+    lines.append("=" * 80)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark snapshot compression codecs")
+    parser.add_argument("--switches", type=int, default=50)
+    parser.add_argument("--ports", type=int, default=48)
+    parser.add_argument("--devices-per-port", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--clients", type=int, default=20, help="NOC screens polling per refresh")
+    parser.add_argument("--json", action="store_true", help="Print raw results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.switches, args.ports, args.devices_per_port, args.iterations)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(format_report(results, args.clients))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+WAN Outage Detection Benchmark
+Simulates a FortiGate fleet with injected WAN outages and measures how long the
+WAN monitor takes to confirm them (fixed vs adaptive polling), plus the API
+request cost of each mode. Time is compressed by --speedup so a 10 minute
+scenario runs in seconds; all reported figures are in simulated seconds.
+
+The SLO is split by what the monitor can see. Outages preceded by warning signs
+(rising errors, SD-WAN probe loss) escalate the device to fast polling and must
+be confirmed within --slo-seconds at p95. An outage with no warning is only seen
+at the next slow poll, so its bound is one poll interval plus confirmation
+(--slo-unwarned-seconds, default interval + slo-seconds). Bringing unannounced
+outages under 10s would need a slow poll of about 8s, several times the fixed
+mode's request cost.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+import wan_monitor
+from wan_monitor import DOWN, SLA_PREFIX, Device, DigestNotifier, WanMonitor
+
+logging.getLogger("wan_monitor").setLevel(logging.ERROR)
+
+
+class SimulatedDevice:
+    """
+    One FortiGate whose wan1 fails at outage_at (wall clock). Devices with a
+    precursor show rising interface errors and SD-WAN probe loss for `lead`
+    seconds before the link drops.
+    """
+
+    def __init__(self, name: str, outage_at: Optional[float], precursor: bool, lead: float, sdwan: bool):
+        self.name = name
+        self.outage_at = outage_at
+        self.precursor = precursor
+        self.lead = lead
+        self.sdwan = sdwan
+        self.errors = 0
+        self.requests = 0
+
+    def _phase(self, now: float) -> str:
+        if self.outage_at is None:
+            return "ok"
+        if now >= self.outage_at:
+            return "down"
+        if self.precursor and now >= self.outage_at - self.lead:
+            return "degraded"
+        return "ok"
+
+    def interfaces(self, now: float) -> Dict[str, Any]:
+        phase = self._phase(now)
+        if phase == "degraded":
+            self.errors += 50
+        return {"results": {
+            "wan1": {"name": "wan1", "link": phase != "down", "rx_errors": self.errors, "tx_errors": 0},
+            "wan2": {"name": "wan2", "link": True, "rx_errors": 0, "tx_errors": 0},
+        }}
+
+    def health_checks(self, now: float) -> Dict[str, Any]:
+        phase = self._phase(now)
+        loss = {"ok": 0.0, "degraded": 15.0, "down": 100.0}[phase]
+        return {"results": {"internet": {
+            "wan1": {"status": "down" if phase == "down" else "up", "packet_loss": loss, "latency": 20.0},
+            "wan2": {"status": "up", "packet_loss": 0.0, "latency": 22.0},
+        }}}
+
+
+class SimulatedMonitor(WanMonitor):
+    """WanMonitor answering from simulated devices instead of HTTP."""
+
+    def __init__(self, fleet: Dict[str, SimulatedDevice], *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fleet = fleet
+
+    async def __aenter__(self) -> "SimulatedMonitor":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+    async def fetch(self, device: Device, endpoint: str) -> Dict[str, Any]:
+        simulated = self.fleet[device.name]
+        simulated.requests += 1
+        await asyncio.sleep(0)
+        if endpoint == wan_monitor.SDWAN_HEALTH_ENDPOINT:
+            if not simulated.sdwan:
+                return {"results": {}}
+            return simulated.health_checks(time.time())
+        return simulated.interfaces(time.time())
+
+
+async def run_scenario(args: argparse.Namespace, adaptive: bool) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    scale = 1.0 / args.speedup
+    start = time.time()
+
+    fleet: Dict[str, SimulatedDevice] = {}
+    for i in range(args.devices):
+        name = f"fgt-{i:04d}"
+        outage_at = None
+        if rng.random() < args.outage_fraction:
+            outage_at = start + rng.uniform(args.interval * 1.5, args.duration * 0.8) * scale
+        fleet[name] = SimulatedDevice(
+            name, outage_at, rng.random() < args.precursor_fraction, args.precursor_lead * scale,
+            rng.random() < args.sdwan_fraction,
+        )
+
+    devices = [Device(name=name, host="sim", token="") for name in fleet]
+    notifier = DigestNotifier(pool=None)
+    monitor = SimulatedMonitor(
+        fleet, devices, notifier,
+        interval=args.interval * scale,
+        fast_interval=(args.fast_interval if adaptive else args.interval) * scale,
+        fast_hold=args.fast_hold * scale,
+        fast_budget=args.budget * args.speedup,
+    )
+    async with monitor:
+        runner = asyncio.create_task(monitor.run())
+        await asyncio.sleep(args.duration * scale)
+        runner.cancel()
+        try:
+            await runner
+        except asyncio.CancelledError:
+            pass
+
+    # Detection latency: first confirmed DOWN (link or SLA probe) on wan1 after the outage began
+    detected: Dict[str, float] = {}
+    while not notifier.queue.empty():
+        event = notifier.queue.get_nowait()
+        if event.new_state != DOWN:
+            continue
+        if event.interface == "wan1" or (event.interface.startswith(SLA_PREFIX) and event.interface.endswith("/wan1")):
+            detected.setdefault(event.device, event.timestamp)
+
+    latencies: List[float] = []
+    warned: List[float] = []
+    unwarned: List[float] = []
+    missed = 0
+    for name, simulated in fleet.items():
+        if simulated.outage_at is None:
+            continue
+        if name in detected:
+            latency = max(0.0, detected[name] - simulated.outage_at) * args.speedup
+            latencies.append(latency)
+            (warned if simulated.precursor else unwarned).append(latency)
+        else:
+            missed += 1
+
+    requests = sum(d.requests for d in fleet.values())
+    return {
+        "mode": "adaptive" if adaptive else "fixed",
+        "outages": len(latencies) + missed,
+        "detected": len(latencies),
+        "missed": missed,
+        "latency_p50": round(statistics.median(latencies), 2) if latencies else None,
+        "latency_p95": round(_percentile(latencies, 95), 2) if latencies else None,
+        "latency_max": round(max(latencies), 2) if latencies else None,
+        "warned_p95": round(_percentile(warned, 95), 2) if warned else None,
+        "unwarned_p95": round(_percentile(unwarned, 95), 2) if unwarned else None,
+        "api_requests": requests,
+        "requests_per_device_min": round(requests / max(1, args.devices) / (args.duration / 60), 2),
+        "escalations": sum(s.escalations for s in monitor.schedules.values()),
+        "budget_denied": monitor.budget.denied,
+    }
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def _slo_met(result: Dict[str, Any], args: argparse.Namespace) -> bool:
+    """No missed outages, and each group's p95 within its bound (an empty group passes)."""
+    if result["missed"]:
+        return False
+    for key, bound in (("warned_p95", args.slo_seconds), ("unwarned_p95", args.slo_unwarned_seconds)):
+        if result[key] is not None and result[key] > bound:
+            return False
+    return True
+
+
+def format_report(results: List[Dict[str, Any]], args: argparse.Namespace) -> str:
+    lines = [
+        "=" * 93,
+        "WAN OUTAGE DETECTION BENCHMARK",
+        "=" * 93,
+        f"Fleet: {args.devices} devices, {args.duration:.0f}s simulated, slow poll {args.interval}s, "
+        f"fast poll {args.fast_interval}s",
+        f"Outages: {args.outage_fraction:.0%} of devices, {args.precursor_fraction:.0%} with precursors, "
+        f"{args.sdwan_fraction:.0%} with SD-WAN health checks",
+        f"SLO: p95 detection latency <= {args.slo_seconds:g}s after warning signs, "
+        f"<= {args.slo_unwarned_seconds:g}s without",
+        "",
+        f"{'mode':<10}{'detected':>10}{'p50 s':>9}{'p95 s':>9}{'max s':>9}"
+        f"{'warned p95':>12}{'unwarned p95':>14}{'req/dev/min':>13}{'SLO':>7}",
+        "-" * 93,
+    ]
+    for r in results:
+        r["slo_met"] = _slo_met(r, args)
+        slo = "PASS" if r["slo_met"] else "FAIL"
+        lines.append(
+            f"{r['mode']:<10}{r['detected']:>5}/{r['outages']:<4}{_fmt(r['latency_p50']):>9}"
+            f"{_fmt(r['latency_p95']):>9}{_fmt(r['latency_max']):>9}{_fmt(r['warned_p95']):>12}"
+            f"{_fmt(r['unwarned_p95']):>14}{r['requests_per_device_min']:>13.2f}{slo:>7}"
+        )
+    lines.append("=" * 93)
+    return "\n".join(lines)
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    results = [await run_scenario(args, adaptive=False), await run_scenario(args, adaptive=True)]
+    report = format_report(results, args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure WAN outage detection latency")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=900, help="Simulated seconds")
+    parser.add_argument("--interval", type=float, default=wan_monitor.POLL_INTERVAL)
+    parser.add_argument("--fast-interval", type=float, default=wan_monitor.FAST_POLL_INTERVAL)
+    parser.add_argument("--fast-hold", type=float, default=wan_monitor.FAST_POLL_HOLD)
+    parser.add_argument("--budget", type=float, default=wan_monitor.FAST_POLL_BUDGET, help="Fast polls per second")
+    parser.add_argument("--outage-fraction", type=float, default=0.3)
+    parser.add_argument("--precursor-fraction", type=float, default=0.7)
+    parser.add_argument("--precursor-lead", type=float, default=90, help="Seconds of degradation before the drop")
+    parser.add_argument("--sdwan-fraction", type=float, default=0.5)
+    parser.add_argument("--slo-seconds", type=float, default=10, help="p95 bound for outages with warning signs")
+    parser.add_argument("--slo-unwarned-seconds", type=float, default=None,
+                        help="p95 bound for outages without warning signs (default: interval + slo-seconds)")
+    parser.add_argument("--speedup", type=float, default=60, help="Simulated seconds per wall-clock second")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="Print raw results as JSON")
+    args = parser.parse_args()
+    if args.slo_unwarned_seconds is None:
+        args.slo_unwarned_seconds = args.interval + args.slo_seconds
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
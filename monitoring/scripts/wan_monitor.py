@@ -1,47 +1,623 @@
-import time
+#!/usr/bin/env python3
+"""
+WAN Link Monitor for FortiGate Fleets
+Polls monitor/system/interface (and SD-WAN health checks where configured) on
+many FortiGates concurrently, debounces link state per WAN interface and sends
+one email digest per batch of transitions. Devices showing flaps, rising errors
+or degrading SLA probes are polled fast until they have been quiet for a while.
+
+Devices are read from a JSON file (--config or WAN_MONITOR_CONFIG):
+
+    {
+      "devices": [
+        {"name": "store-001", "host": "https://10.0.0.1", "token": "...",
+         "interfaces": ["wan1", "wan2"], "verify_ssl": false}
+      ]
+    }
+
+Without a config file the single FORTIGATE_HOST / API_TOKEN device is monitored.
+Requires aiohttp.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
 import smtplib
 import ssl
-import requests
+import threading
+import time
+from dataclasses import dataclass, field
+from email.message import EmailMessage
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
 
-# FortiGate API details
-FORTIGATE_HOST = 'https://your-fortigate-ip'
-API_TOKEN = 'your-api-token'
+# FortiGate API details (single-device fallback)
+FORTIGATE_HOST = os.environ.get("FORTIGATE_HOST", "https://your-fortigate-ip")
+API_TOKEN = os.environ.get("FORTIGATE_API_TOKEN", "your-api-token")
+WAN_INTERFACES = ["wan1", "wan2"]
 
 # Email settings
-SMTP_SERVER = 'smtp.yourprovider.com'
-SMTP_PORT = 587
-EMAIL_FROM = 'your-email@example.com'
-EMAIL_TO = 'recipient@example.com'
-EMAIL_PASSWORD = 'your-email-password'
-
-def send_email_alert(subject, body):
-    context = ssl.create_default_context()
-    with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-        server.starttls(context=context)
-        server.login(EMAIL_FROM, EMAIL_PASSWORD)
-        message = f"Subject: {subject}\n\n{body}"
-        server.sendmail(EMAIL_FROM, EMAIL_TO, message)
-
-def check_wan():
-    headers = {
-        'Authorization': f'Bearer {API_TOKEN}'
-    }
+SMTP_SERVER = os.environ.get("SMTP_SERVER", "smtp.yourprovider.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "true").lower() == "true"
+EMAIL_FROM = os.environ.get("EMAIL_FROM", "your-email@example.com")
+EMAIL_TO = os.environ.get("EMAIL_TO", "recipient@example.com")
+EMAIL_PASSWORD = os.environ.get("EMAIL_PASSWORD", "your-email-password")
+
+# Polling
+POLL_INTERVAL = float(os.environ.get("WAN_POLL_INTERVAL", "60"))
+MAX_CONCURRENT_POLLS = int(os.environ.get("WAN_MAX_CONCURRENT_POLLS", "50"))
+REQUEST_TIMEOUT = float(os.environ.get("WAN_REQUEST_TIMEOUT", "10"))
+
+# Adaptive polling: escalate to FAST_POLL_INTERVAL on suspicious signals, stay fast
+# for FAST_POLL_HOLD seconds after the last one, then double the interval back to
+# POLL_INTERVAL. Fast polls across the fleet are capped at FAST_POLL_BUDGET per second.
+FAST_POLL_INTERVAL = float(os.environ.get("WAN_FAST_POLL_INTERVAL", "2"))
+FAST_POLL_HOLD = float(os.environ.get("WAN_FAST_POLL_HOLD", "60"))
+FAST_POLL_BUDGET = float(os.environ.get("WAN_FAST_POLL_BUDGET", "20"))
+ERROR_DELTA_THRESHOLD = int(os.environ.get("WAN_ERROR_DELTA_THRESHOLD", "10"))  # New errors between polls
+SLA_LOSS_THRESHOLD = float(os.environ.get("WAN_SLA_LOSS_THRESHOLD", "2.0"))  # Percent
+SLA_LATENCY_THRESHOLD = float(os.environ.get("WAN_SLA_LATENCY_THRESHOLD", "250"))  # Milliseconds
+
+# Debounce / hysteresis: failing is confirmed faster than recovering
+DOWN_THRESHOLD = int(os.environ.get("WAN_DOWN_THRESHOLD", "2"))  # Consecutive down polls
+UP_THRESHOLD = int(os.environ.get("WAN_UP_THRESHOLD", "3"))  # Consecutive up polls
+
+# Alert batching
+DIGEST_WINDOW = float(os.environ.get("WAN_DIGEST_WINDOW", "30"))  # Seconds to collect events
+DIGEST_MAX_EVENTS = int(os.environ.get("WAN_DIGEST_MAX_EVENTS", "200"))
+SMTP_IDLE_TIMEOUT = float(os.environ.get("SMTP_IDLE_TIMEOUT", "240"))  # Close before servers do
+
+UNKNOWN = "unknown"
+UP = "up"
+DOWN = "down"
+REACHABILITY = "_api"  # Pseudo-interface tracking whether the FortiGate answers at all
+SLA_PREFIX = "sla:"  # Targets named sla:<health-check>/<member> track SD-WAN probe status
+
+INTERFACE_ENDPOINT = "monitor/system/interface"
+SDWAN_HEALTH_ENDPOINT = "monitor/virtual-wan/health-check"
+
+
+@dataclass
+class Device:
+    name: str
+    host: str
+    token: str
+    interfaces: List[str] = field(default_factory=lambda: list(WAN_INTERFACES))
+    verify_ssl: bool = False
+    sdwan: Optional[bool] = None  # None until we know whether health checks exist
+
+
+def _target_label(interface: str) -> str:
+    return "API" if interface == REACHABILITY else interface
+
+
+@dataclass
+class LinkEvent:
+    device: str
+    interface: str
+    old_state: str
+    new_state: str
+    timestamp: float
+    detail: str = ""
+
+    def describe(self) -> str:
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.timestamp))
+        target = _target_label(self.interface)
+        text = f"{when} {self.device} {target}: {self.old_state} -> {self.new_state}"
+        return f"{text} ({self.detail})" if self.detail else text
+
+
+class LinkStateMachine:
+    """
+    Debounced link state. An observation only changes the confirmed state after
+    DOWN_THRESHOLD consecutive down (or UP_THRESHOLD consecutive up) observations,
+    so a single lost poll or a link bouncing once does not alert.
+    """
+
+    def __init__(self, down_threshold: int = DOWN_THRESHOLD, up_threshold: int = UP_THRESHOLD):
+        self.down_threshold = max(1, down_threshold)
+        self.up_threshold = max(1, up_threshold)
+        self.state = UNKNOWN
+        self.changed_at = 0.0
+        self._candidate: Optional[str] = None
+        self._streak = 0
+        self.observations = 0
+        self.flaps = 0  # Raw observations that disagreed with the confirmed state
+
+    @property
+    def pending(self) -> bool:
+        """An unconfirmed change is being debounced."""
+        return self._candidate is not None
+
+    def observe(self, is_up: bool, timestamp: float) -> Optional[Tuple[str, str]]:
+        """Feed one observation; returns (old, new) when the confirmed state changes."""
+        self.observations += 1
+        observed = UP if is_up else DOWN
+
+        if observed == self.state:
+            self._candidate = None
+            self._streak = 0
+            return None
+
+        if self.state != UNKNOWN:
+            self.flaps += 1
+        if observed != self._candidate:
+            self._candidate = observed
+            self._streak = 0
+        self._streak += 1
+
+        threshold = self.down_threshold if observed == DOWN else self.up_threshold
+        # A link already up at startup is accepted immediately
+        if self.state == UNKNOWN and observed == UP:
+            threshold = 1
+        if self._streak < threshold:
+            return None
+
+        old, self.state = self.state, observed
+        self.changed_at = timestamp
+        self._candidate = None
+        self._streak = 0
+        return old, observed
+
+
+class SMTPConnectionPool:
+    """
+    A single reused SMTP connection (login once). The connection is checked with
+    NOOP before reuse, re-established on failure, and closed after SMTP_IDLE_TIMEOUT.
+    smtplib is blocking, so callers run send() in a worker thread.
+    """
+
+    def __init__(self, server: str = SMTP_SERVER, port: int = SMTP_PORT, username: str = EMAIL_FROM,
+                 password: str = EMAIL_PASSWORD, starttls: bool = SMTP_STARTTLS):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self._conn: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.messages_sent = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        conn = smtplib.SMTP(self.server, self.port, timeout=30)
+        if self.starttls:
+            conn.starttls(context=ssl.create_default_context())
+        if self.username and self.password:
+            conn.login(self.username, self.password)
+        self.connections_opened += 1
+        return conn
+
+    def _drop(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._conn = None
+
+    def send(self, message: EmailMessage) -> None:
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._conn is None:
+                        self._conn = self._connect()
+                    elif self._conn.noop()[0] != 250:
+                        self._drop()
+                        self._conn = self._connect()
+                    self._conn.send_message(message)
+                    self._last_used = time.monotonic()
+                    self.messages_sent += 1
+                    return
+                except (smtplib.SMTPServerDisconnected, smtplib.SMTPException, OSError):
+                    self._drop()
+                    if attempt == 2:
+                        raise
+
+    def close_if_idle(self) -> None:
+        with self._lock:
+            if self._conn is not None and time.monotonic() - self._last_used > SMTP_IDLE_TIMEOUT:
+                self._drop()
+
+    def close(self) -> None:
+        with self._lock:
+            self._drop()
+
+
+class DigestNotifier:
+    """
+    Collects link events and sends them as one email per DIGEST_WINDOW. The window
+    starts at the first event, so a single outage still alerts within DIGEST_WINDOW.
+    """
+
+    def __init__(self, pool: SMTPConnectionPool, window: float = DIGEST_WINDOW,
+                 max_events: int = DIGEST_MAX_EVENTS, email_from: str = EMAIL_FROM, email_to: str = EMAIL_TO):
+        self.pool = pool
+        self.window = window
+        self.max_events = max_events
+        self.email_from = email_from
+        self.email_to = email_to
+        self.queue: "asyncio.Queue[LinkEvent]" = asyncio.Queue()
+        self._collecting: List[LinkEvent] = []  # Batch taken off the queue but not yet sent
+        self.digests_sent = 0
+
+    def publish(self, event: LinkEvent) -> None:
+        self.queue.put_nowait(event)
+
+    def build_message(self, events: List[LinkEvent]) -> EmailMessage:
+        down = sum(1 for e in events if e.new_state == DOWN)
+        up = sum(1 for e in events if e.new_state == UP)
+        devices = sorted({e.device for e in events})
+        if len(events) == 1:
+            event = events[0]
+            target = _target_label(event.interface)
+            subject = f"WAN {event.new_state.upper()} ALERT: {event.device} {target}"
+        else:
+            subject = f"WAN alerts: {down} down, {up} recovered across {len(devices)} device(s)"
+
+        message = EmailMessage()
+        message["Subject"] = subject
+        message["From"] = self.email_from
+        message["To"] = self.email_to
+        message.set_content("\n".join(event.describe() for event in events) + "\n")
+        return message
+
+    async def _send(self, events: List[LinkEvent]) -> None:
+        try:
+            await asyncio.to_thread(self.pool.send, self.build_message(events))
+            self.digests_sent += 1
+            logger.info(f"Sent alert digest with {len(events)} event(s)")
+        except Exception as e:
+            logger.error(f"Error sending alert digest ({len(events)} events): {e}")
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                first = await asyncio.wait_for(self.queue.get(), timeout=SMTP_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                await asyncio.to_thread(self.pool.close_if_idle)
+                continue
+            batch = self._collecting = [first]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_events:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            self._collecting = []
+            await self._send(batch)
+
+    async def drain(self) -> None:
+        """Send whatever is queued or was being collected when run() stopped (used on shutdown)."""
+        batch, self._collecting = self._collecting, []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            await self._send(batch)
+
+
+def _iter_interfaces(data: Any):
+    """monitor/system/interface returns results keyed by name (or a list on some builds)."""
+    results = data.get("results") if isinstance(data, dict) else None
+    if isinstance(results, dict):
+        for name, interface in results.items():
+            if isinstance(interface, dict):
+                yield interface.get("name", name), interface
+    elif isinstance(results, list):
+        for interface in results:
+            if isinstance(interface, dict) and interface.get("name"):
+                yield interface["name"], interface
+
+
+def _link_up(interface: Dict[str, Any]) -> bool:
+    link = interface.get("link")
+    if isinstance(link, str):
+        return link.lower() in ("up", "true", "1")
+    return bool(link)
+
+
+class RateBudget:
+    """Token bucket shared by all devices so escalations cannot hammer the fleet."""
+
+    def __init__(self, rate: float = FAST_POLL_BUDGET, burst: Optional[float] = None):
+        self.rate = max(0.0, rate)
+        self.capacity = burst if burst is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self.denied = 0
+
+    def try_acquire(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        self.denied += 1
+        return False
+
+
+class AdaptiveSchedule:
+    """Per-device poll interval: fast while suspicious, then exponential decay to slow."""
+
+    def __init__(self, slow: float = POLL_INTERVAL, fast: float = FAST_POLL_INTERVAL, hold: float = FAST_POLL_HOLD):
+        self.slow = slow
+        self.fast = min(fast, slow)
+        self.hold = hold
+        self.interval = slow
+        self.fast_until = 0.0
+        self.reason = ""
+        self.escalations = 0
+
+    def escalate(self, now: float, reason: str) -> None:
+        if self.interval > self.fast:
+            self.escalations += 1
+            logger.info(f"Fast polling ({self.fast}s): {reason}")
+        self.interval = self.fast
+        self.fast_until = now + self.hold
+        self.reason = reason
+
+    def next_interval(self, now: float) -> float:
+        if now >= self.fast_until and self.interval < self.slow:
+            self.interval = min(self.slow, self.interval * 2)
+        return self.interval
+
+    def backoff(self) -> float:
+        """Used when the fast-poll budget is exhausted."""
+        self.interval = min(self.slow, self.interval * 2)
+        return self.interval
+
+
+def _iter_health_checks(data: Any):
+    """monitor/virtual-wan/health-check: {health-check: {member interface: probe stats}}."""
+    results = data.get("results") if isinstance(data, dict) else None
+    if not isinstance(results, dict):
+        return
+    for check_name, members in results.items():
+        if not isinstance(members, dict):
+            continue
+        for member, stats in members.items():
+            if isinstance(stats, dict):
+                yield check_name, member, stats
+
+
+class WanMonitor:
+    """Polls every device on its own adaptive schedule and turns observations into events."""
+
+    def __init__(self, devices: List[Device], notifier: DigestNotifier, interval: float = POLL_INTERVAL,
+                 max_concurrent: int = MAX_CONCURRENT_POLLS, fast_interval: float = FAST_POLL_INTERVAL,
+                 fast_hold: float = FAST_POLL_HOLD, fast_budget: float = FAST_POLL_BUDGET):
+        self.devices = devices
+        self.notifier = notifier
+        self.interval = interval
+        self.states: Dict[Tuple[str, str], LinkStateMachine] = {}
+        self.schedules: Dict[str, AdaptiveSchedule] = {
+            device.name: AdaptiveSchedule(interval, fast_interval, fast_hold) for device in devices
+        }
+        self.budget = RateBudget(fast_budget)
+        self._error_counters: Dict[Tuple[str, str], float] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.polls = 0
+        self.poll_errors = 0
+
+    async def __aenter__(self) -> "WanMonitor":
+        connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT_POLLS, ttl_dns_cache=300, keepalive_timeout=120)
+        self._session = aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        )
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _machine(self, device: str, interface: str) -> LinkStateMachine:
+        key = (device, interface)
+        machine = self.states.get(key)
+        if machine is None:
+            machine = self.states[key] = LinkStateMachine()
+        return machine
+
+    def _observe(self, device: Device, interface: str, is_up: bool, timestamp: float, detail: str = "") -> bool:
+        """Feed a state machine; returns True when the target looks unstable."""
+        machine = self._machine(device.name, interface)
+        transition = machine.observe(is_up, timestamp)
+        if transition is None:
+            return machine.pending
+        old, new = transition
+        # Links seen up at startup are not news
+        if old == UNKNOWN and new == UP:
+            return False
+        event = LinkEvent(device.name, interface, old, new, timestamp, detail)
+        if new == DOWN:
+            logger.warning(f"[ALERT] {event.describe()}")
+        else:
+            logger.info(f"[RECOVERED] {event.describe()}")
+        self.notifier.publish(event)
+        return True
+
+    async def fetch(self, device: Device, endpoint: str) -> Dict[str, Any]:
+        url = f"{device.host.rstrip('/')}/api/v2/{endpoint}"
+        headers = {"Authorization": f"Bearer {device.token}"}
+        async with self._semaphore:
+            async with self._session.get(url, headers=headers, ssl=None if device.verify_ssl else False) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+    async def fetch_interfaces(self, device: Device) -> Dict[str, Any]:
+        return await self.fetch(device, INTERFACE_ENDPOINT)
+
+    async def fetch_health_checks(self, device: Device) -> Optional[Dict[str, Any]]:
+        """SD-WAN probe results, or None when the device has no health checks configured."""
+        if device.sdwan is False:
+            return None
+        try:
+            data = await self.fetch(device, SDWAN_HEALTH_ENDPOINT)
+        except aiohttp.ClientResponseError as e:
+            if e.status in (404, 405):
+                device.sdwan = False
+                logger.info(f"{device.name}: no SD-WAN health-check monitor, using interface polling only")
+            return None
+        if device.sdwan is None:
+            device.sdwan = bool(list(_iter_health_checks(data)))
+        return data
+
+    def _check_errors(self, device: Device, name: str, interface: Dict[str, Any]) -> bool:
+        """True when the interface error counters grew by ERROR_DELTA_THRESHOLD since the last poll."""
+        total = float(interface.get("rx_errors", 0) or 0) + float(interface.get("tx_errors", 0) or 0)
+        key = (device.name, name)
+        previous = self._error_counters.get(key)
+        self._error_counters[key] = total
+        return previous is not None and total - previous >= ERROR_DELTA_THRESHOLD
+
+    async def poll_device(self, device: Device) -> List[str]:
+        """Poll one device once; returns the reasons (if any) to poll it fast."""
+        timestamp = time.time()
+        self.polls += 1
+        reasons: List[str] = []
+        interfaces, health = await asyncio.gather(
+            self.fetch_interfaces(device), self.fetch_health_checks(device), return_exceptions=True
+        )
+        if isinstance(interfaces, BaseException):
+            self.poll_errors += 1
+            logger.debug(f"Poll failed for {device.name}: {interfaces}")
+            self._observe(device, REACHABILITY, False, timestamp,
+                          detail=str(interfaces) or type(interfaces).__name__)
+            return ["API unreachable"]
+
+        self._observe(device, REACHABILITY, True, timestamp)
+        seen = dict(_iter_interfaces(interfaces))
+        for name in device.interfaces:
+            interface = seen.get(name)
+            if interface is None:
+                continue
+            if self._observe(device, name, _link_up(interface), timestamp):
+                reasons.append(f"{name} link flapping")
+            if self._check_errors(device, name, interface):
+                reasons.append(f"{name} errors rising")
+
+        if isinstance(health, dict):
+            for check_name, member, stats in _iter_health_checks(health):
+                if device.interfaces and member not in device.interfaces:
+                    continue
+                target = f"{SLA_PREFIX}{check_name}/{member}"
+                status_up = str(stats.get("status", "up")).lower() == "up"
+                detail = ""
+                if "packet_loss" in stats or "latency" in stats:
+                    detail = f"loss {stats.get('packet_loss', 0)}%, latency {stats.get('latency', 0)}ms"
+                if self._observe(device, target, status_up, timestamp, detail=detail):
+                    reasons.append(f"{target} status changing")
+                elif status_up and (
+                    float(stats.get("packet_loss", 0) or 0) >= SLA_LOSS_THRESHOLD
+                    or float(stats.get("latency", 0) or 0) >= SLA_LATENCY_THRESHOLD
+                ):
+                    reasons.append(f"{target} degraded ({detail})")
+        return reasons
+
+    async def _device_loop(self, device: Device, offset: float) -> None:
+        schedule = self.schedules[device.name]
+        # Spread devices across the interval instead of polling the whole fleet at once
+        await asyncio.sleep(offset)
+        while True:
+            started = time.monotonic()
+            try:
+                reasons = await self.poll_device(device)
+            except Exception as e:
+                # A malformed reply must not end this device's loop (or, via run(), the fleet's)
+                self.poll_errors += 1
+                logger.error(f"Error processing poll of {device.name}: {e!r}")
+                reasons = []
+            if reasons:
+                schedule.escalate(started, f"{device.name}: {', '.join(reasons)}")
+            interval = schedule.next_interval(time.monotonic())
+            if interval < schedule.slow and not self.budget.try_acquire():
+                interval = schedule.backoff()
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    async def run(self) -> None:
+        step = self.interval / max(1, len(self.devices))
+        tasks = [
+            asyncio.create_task(self._device_loop(device, i * step), name=f"wan-poll-{device.name}")
+            for i, device in enumerate(self.devices)
+        ]
+        logger.info(f"Monitoring {len(self.devices)} FortiGate(s) every {self.interval}s "
+                    f"(fast {FAST_POLL_INTERVAL}s on suspicion)")
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            f"{device}/{interface}": machine.state
+            for (device, interface), machine in sorted(self.states.items())
+        }
+
+
+def load_devices(path: Optional[str]) -> List[Device]:
+    if not path:
+        return [Device(name=FORTIGATE_HOST, host=FORTIGATE_HOST, token=API_TOKEN)]
+    with open(path) as f:
+        config = json.load(f)
+    return [
+        Device(
+            name=entry.get("name") or entry["host"],
+            host=entry["host"],
+            token=entry["token"],
+            interfaces=entry.get("interfaces", list(WAN_INTERFACES)),
+            verify_ssl=entry.get("verify_ssl", False),
+        )
+        for entry in config.get("devices", [])
+    ]
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    devices = load_devices(args.config)
+    pool = SMTPConnectionPool()
+    notifier = DigestNotifier(pool, window=args.digest_window)
+
+    async with WanMonitor(devices, notifier, interval=args.interval) as monitor:
+        if args.once:
+            await asyncio.gather(*(monitor.poll_device(device) for device in devices))
+            print(json.dumps(monitor.summary(), indent=2))
+            return
+
+        notifier_task = asyncio.create_task(notifier.run(), name="wan-digest")
+        try:
+            await monitor.run()
+        finally:
+            notifier_task.cancel()
+            await notifier.drain()
+            pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor WAN links across FortiGates")
+    parser.add_argument("--config", default=os.environ.get("WAN_MONITOR_CONFIG"), help="JSON device list")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="Seconds between polls per device")
+    parser.add_argument("--digest-window", type=float, default=DIGEST_WINDOW, help="Seconds to batch alerts")
+    parser.add_argument("--once", action="store_true", help="Poll every device once and print link states")
+    args = parser.parse_args()
     try:
-        response = requests.get(f"{FORTIGATE_HOST}/api/v2/monitor/system/interface", headers=headers, verify=False)
-        interfaces = response.json()['results']
-        wan_links = [iface for iface in interfaces if iface['name'] in ['wan1', 'wan2']]
-
-        for wan in wan_links:
-            if not wan['link']:
-                print(f"[ALERT] {wan['name']} is DOWN!")
-                send_email_alert(
-                    f"WAN DOWN ALERT: {wan['name']}",
-                    f"The WAN interface {wan['name']} is DOWN at FortiGate."
-                )
-    except Exception as e:
-        print(f"Error checking WAN links: {e}")
+        asyncio.run(main_async(args))
+    except KeyboardInterrupt:
+        logger.info("WAN monitor stopped")
+
 
 if __name__ == "__main__":
-    while True:
-        check_wan()
-        time.sleep(60)  # Check every 60 seconds
+    main()
@@ -0,0 +1,269 @@
+import asyncio
+import os
+import socketserver
+import sys
+import threading
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+import wan_monitor  # noqa: E402
+from wan_monitor import (  # noqa: E402
+    DOWN,
+    UNKNOWN,
+    UP,
+    Device,
+    DigestNotifier,
+    LinkEvent,
+    LinkStateMachine,
+    SMTPConnectionPool,
+    WanMonitor,
+)
+
+
+# --- Debounce / hysteresis ---
+
+
+def test_link_up_at_startup_is_accepted_immediately():
+    machine = LinkStateMachine(down_threshold=2, up_threshold=3)
+    assert machine.observe(True, 1) == (UNKNOWN, UP)
+
+
+def test_single_down_poll_does_not_alert():
+    machine = LinkStateMachine(down_threshold=2, up_threshold=3)
+    machine.observe(True, 1)
+    assert machine.observe(False, 2) is None
+    assert machine.pending
+    assert machine.observe(True, 3) is None
+    assert not machine.pending
+    assert machine.state == UP
+
+
+def test_link_staying_down_alerts_once():
+    machine = LinkStateMachine(down_threshold=2, up_threshold=3)
+    machine.observe(True, 1)
+    transitions = [machine.observe(False, t) for t in range(2, 12)]
+    assert [t for t in transitions if t] == [(UP, DOWN)]
+    assert machine.changed_at == 3
+
+
+def test_recovery_needs_more_polls_than_failure():
+    machine = LinkStateMachine(down_threshold=2, up_threshold=3)
+    machine.observe(True, 1)
+    machine.observe(False, 2)
+    machine.observe(False, 3)
+    assert machine.observe(True, 4) is None
+    assert machine.observe(True, 5) is None
+    assert machine.observe(True, 6) == (DOWN, UP)
+
+
+def test_flapping_link_restarts_the_streak():
+    machine = LinkStateMachine(down_threshold=2, up_threshold=3)
+    machine.observe(True, 1)
+    machine.observe(False, 2)
+    machine.observe(False, 3)
+    for t, is_up in enumerate([True, True, False, True, True], start=4):
+        assert machine.observe(is_up, t) is None
+    assert machine.state == DOWN
+    assert machine.observe(True, 9) == (DOWN, UP)
+
+
+# --- Monitor ---
+
+
+class _RecordingNotifier:
+    def __init__(self):
+        self.events = []
+
+    def publish(self, event):
+        self.events.append(event)
+
+
+class _FixtureMonitor(WanMonitor):
+    """WanMonitor answering from canned responses instead of HTTP."""
+
+    def __init__(self, responses, **kwargs):
+        self.notifier_events = _RecordingNotifier()
+        super().__init__([Device(name="fgt-1", host="fixture", token="", sdwan=False)],
+                         self.notifier_events, **kwargs)
+        self.responses = responses
+
+    async def fetch(self, device, endpoint):
+        return self.responses(endpoint)
+
+
+def _interfaces(wan1_up):
+    return {"results": {"wan1": {"name": "wan1", "link": wan1_up}, "wan2": {"name": "wan2", "link": True}}}
+
+
+def test_monitor_publishes_one_event_for_a_long_outage():
+    state = {"up": True}
+    monitor = _FixtureMonitor(lambda endpoint: _interfaces(state["up"]))
+    device = monitor.devices[0]
+
+    async def scenario():
+        await monitor.poll_device(device)
+        state["up"] = False
+        for _ in range(10):
+            await monitor.poll_device(device)
+
+    asyncio.run(scenario())
+    assert [(e.interface, e.old_state, e.new_state) for e in monitor.notifier_events.events] == [
+        ("wan1", UP, DOWN)
+    ]
+
+
+def test_device_loop_survives_malformed_replies():
+    def responses(endpoint):
+        if endpoint == wan_monitor.SDWAN_HEALTH_ENDPOINT:
+            return {"results": {"internet": {"wan1": {"status": "up", "packet_loss": "n/a"}}}}
+        return _interfaces(True)
+
+    monitor = _FixtureMonitor(responses, interval=0.01, fast_interval=0.01)
+    monitor.devices[0].sdwan = True
+
+    async def scenario():
+        task = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0.1)
+        assert not task.done()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert monitor.polls > 1
+    assert monitor.poll_errors == monitor.polls
+
+
+# --- Digest batching ---
+
+
+class _RecordingPool:
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+
+def _event(device, new_state):
+    return LinkEvent(device, "wan1", UP if new_state == DOWN else DOWN, new_state, 1_700_000_000.0)
+
+
+def test_digest_batches_events_into_one_message():
+    pool = _RecordingPool()
+    notifier = DigestNotifier(pool, window=0.05, email_from="a@example.com", email_to="b@example.com")
+
+    async def scenario():
+        task = asyncio.create_task(notifier.run())
+        notifier.publish(_event("fgt-1", DOWN))
+        await asyncio.sleep(0.01)
+        notifier.publish(_event("fgt-2", DOWN))
+        notifier.publish(_event("fgt-3", UP))
+        await asyncio.sleep(0.15)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert notifier.digests_sent == 1
+    [message] = pool.messages
+    assert message["Subject"] == "WAN alerts: 2 down, 1 recovered across 3 device(s)"
+    assert len(message.get_content().strip().splitlines()) == 3
+
+
+def test_digest_respects_max_events():
+    pool = _RecordingPool()
+    notifier = DigestNotifier(pool, window=10, max_events=2)
+
+    async def scenario():
+        for i in range(3):
+            notifier.publish(_event(f"fgt-{i}", DOWN))
+        task = asyncio.create_task(notifier.run())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await notifier.drain()
+
+    asyncio.run(scenario())
+    assert [len(m.get_content().strip().splitlines()) for m in pool.messages] == [2, 1]
+    assert pool.messages[1]["Subject"] == "WAN DOWN ALERT: fgt-2 wan1"
+
+
+# --- SMTP connection reuse (in-process SMTP stub) ---
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        stats = self.server.stats
+        stats["connections"] += 1
+        self._reply("220 stub ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            stats["commands"].append(command.split(" ")[0])
+            if command.startswith("EHLO"):
+                self._reply("250-stub")
+                self._reply("250 AUTH PLAIN")
+            elif command.startswith("AUTH"):
+                stats["logins"] += 1
+                self._reply("235 2.7.0 Authentication successful")
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                stats["messages"] += 1
+                self._reply("250 OK queued")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:  # MAIL, RCPT, NOOP, RSET
+                self._reply("250 OK")
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+    server.daemon_threads = True
+    server.stats = {"connections": 0, "logins": 0, "messages": 0, "commands": []}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_smtp_pool_logs_in_once_and_reuses_connection(smtp_server):
+    host, port = smtp_server.server_address
+    pool = SMTPConnectionPool(server=host, port=port, username="alerts@example.com",
+                              password="secret", starttls=False)
+    notifier = DigestNotifier(pool, email_from="alerts@example.com", email_to="noc@example.com")
+    for i in range(3):
+        pool.send(notifier.build_message([_event(f"fgt-{i}", DOWN)]))
+    pool.close()
+
+    stats = smtp_server.stats
+    assert stats["connections"] == 1
+    assert stats["logins"] == 1
+    assert stats["messages"] == 3
+    assert stats["commands"].count("NOOP") == 2  # Reused connections are checked first
+    assert pool.connections_opened == 1
+    assert pool.messages_sent == 3
+
+
+def test_smtp_pool_reconnects_after_close(smtp_server):
+    host, port = smtp_server.server_address
+    pool = SMTPConnectionPool(server=host, port=port, username="", password="", starttls=False)
+    message = DigestNotifier(pool).build_message([_event("fgt-1", DOWN)])
+    pool.send(message)
+    pool.close()
+    pool.send(message)
+    pool.close()
+    assert smtp_server.stats["connections"] == 2
+    assert smtp_server.stats["logins"] == 0
+    assert pool.connections_opened == 2